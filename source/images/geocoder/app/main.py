@@ -8,10 +8,10 @@ import time
 
 from pathlib import Path
 
-from openpyxl import load_workbook
-
 import geocoder
 
+from registry import ingest_dumpsters
+
 
 def get_coordinates(address, prefix):
     '''
@@ -152,32 +152,39 @@ def handle_dom(meta, data):
                 print(f"[ERROR] {err}", flush=True)
 
 
-def geocode_dumpsters(filename, force=False):
-    '''
+def geocode_dumpsters(filename, output_filename, force=False, cache_filename=None):
+    ''' Геокодирует адреса контейнерных площадок без координат
+         - реестр читается потоково, книга не перезаписывается
+         - геокодируются только новые и изменённые строки реестра (все - при force)
+         - координаты сохраняются в JSON-файл {идентификатор площадки: "широта, долгота"}
     '''
-    wb = load_workbook(filename=filename)
-    for sheet_name in ("4.1.1.1 Автозаводский", "4.1.1.2 Канавинский",
-                       "4.1.1.3 Ленинский", "4.1.1.4 Московский",
-                       "4.1.1.5 Нижегородский", "4.1.1.6 Приокский",
-                       "4.1.1.7 Советский", "4.1.1.8 Сормовский"):
-        ws = wb[sheet_name]
-        for row in ws.iter_rows(min_col=4, max_col=4, min_row=8):
-            cell = row[0]
-            address = cell.value
-            row_number = cell.row
-            coords = ws[f'N{row_number}'].value
-            if address and (force or not coords):
-                coords = get_coordinates(
-                    address.strip(), prefix="Нижний Новгород")
-                if coords:
-                    latitude = round(coords["latitude"], 5)
-                    longitude = round(coords["longitude"], 5)
-                    ws[f'N{row_number}'] = f"{latitude}, {longitude}"
-                else:
-                    ws[f'N{row_number}'] = f"Координаты не заданы"
-            else:
-                print(f"Skipping for {address}", flush=True)
-    wb.save(filename)
+    ingestion = ingest_dumpsters(filename, cache_filename=cache_filename)
+    output = Path(output_filename)
+    coordinates = dict()
+    if output.exists():
+        coordinates = json.loads(output.read_text(encoding="utf-8"))
+    for dumpster_uid in ingestion.removed:
+        coordinates.pop(dumpster_uid, None)
+
+    for dumpster_uid, dumpster in ingestion.records.items():
+        address = dumpster["Адрес"]
+        if not address or (dumpster["Координаты дома"] and not force):
+            print(f"Skipping for {address}", flush=True)
+            continue
+        if dumpster_uid in coordinates and dumpster_uid not in ingestion.changed and not force:
+            continue
+        coords = get_coordinates(str(address).strip(), prefix="Нижний Новгород")
+        if coords:
+            latitude = round(coords["latitude"], 5)
+            longitude = round(coords["longitude"], 5)
+            coordinates[dumpster_uid] = f"{latitude}, {longitude}"
+        else:
+            # Координаты не заданы
+            coordinates[dumpster_uid] = None
+
+    output.write_text(json.dumps(coordinates, ensure_ascii=False, indent=4), encoding="utf-8")
+    # Строки реестра считаются обработанными только после записи координат
+    ingestion.commit()
 
 
 def main():
@@ -186,7 +193,9 @@ def main():
     force = False
     # geocode_dumpsters(
     #     filename="/data/Реестр контейнерных площадок.xlsx",
-    #     force=force
+    #     output_filename="/data/Координаты контейнерных площадок.json",
+    #     force=force,
+    #     cache_filename="/data/cache/registry.dumpsters.geocoder.json"
     # )
     geocode_houses(
         input_filename="/data/Реестр жилых домов.json",
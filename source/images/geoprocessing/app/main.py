@@ -1,63 +1,68 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import os
 import json
+import hashlib
+import threading
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
-import requests
-from openpyxl import load_workbook
+import numpy as np
 
+from registry import ingest_dumpsters
+from osrm import OSM_FILE, URLS, create_clients
+from spatial import GridIndex, haversine
+from snapping import NearestCache, snap_to_road
+from pipeline import Pipeline
 
-def load_dumpsters(filename):
-    '''
+
+def load_dumpsters(filename, cache_filename=None, coordinates=None):
+    ''' Загружает реестр контейнерных площадок
+         - книга читается потоково, разобранные строки кешируются по отпечаткам строк
+         - coordinates: координаты площадок, найденные геокодером ({идентификатор: "широта, долгота"}),
+           используются для площадок без координат в реестре
     '''
-    dumpsters = dict()
-    wb = load_workbook(filename=filename)
-    for sheet_name in ("4.1.1.1 Автозаводский", "4.1.1.2 Канавинский",
-                       "4.1.1.3 Ленинский", "4.1.1.4 Московский",
-                       "4.1.1.5 Нижегородский", "4.1.1.6 Приокский",
-                       "4.1.1.7 Советский", "4.1.1.8 Сормовский"):
-        ws = wb[sheet_name]
-        area_name = sheet_name.split()[-1]
-        for row in ws.iter_rows(min_col=1, max_col=14, min_row=8):
-            dumpster_number = row[0].value
-            dumpster = {
-                "Округ": area_name,
-                "Номер контейнерной площадки": row[1].value,
-                "Адрес": row[3].value,
-                "Наименование": row[4].value,
-                "Владелец": row[5].value,
-                "Транспортировщик": row[6].value,
-                "Материал": row[7].value,
-                "Количество": row[8].value,
-                "Вместимомть": row[9].value,
-                "Покрытие": row[10].value,
-                "Навес": row[11].value,
-                "Координаты дома": row[13].value
-            }
-            dumpsters[f"{area_name}_{dumpster_number}"] = dumpster
-    return dumpsters
+    ingestion = ingest_dumpsters(filename, cache_filename=cache_filename)
+    print(f"Реестр контейнерных площадок: {len(ingestion.records)}, "
+          f"новых и изменённых: {len(ingestion.changed)}, удалённых: {len(ingestion.removed)}", flush=True)
+    for dumpster_uid, dumpster in ingestion.records.items():
+        if not dumpster.get("Координаты дома") and coordinates and coordinates.get(dumpster_uid):
+            dumpster["Координаты дома"] = coordinates[dumpster_uid]
+    return ingestion
 
 
-def link_to_road(dumpsters):
-    '''
+def link_to_road(dumpsters, osrm, cache_filename=None, workers=8):
+    ''' Привязывает контейнерные площадки к дорогам
+         - результаты сохраняются в кеш по исходной строке координат: при повторном запуске
+           запрашиваются только новые и перемещённые площадки
     '''
+    points = dict()
     for dumpster_uid, dumpster in dumpsters.items():
         coordinates = dumpster.get("Координаты дома", "")
         if not coordinates:
             print(f"Нет координат для: {dumpster_uid}", flush=True)
             continue
-        coordinates = ",".join(coordinates.split(", ")[::-1])
-        url = f"http://osrm.vehicle:5000/nearest/v1/car/{coordinates}"
-
-        response = requests.get(url)
-        nearest_point = response.json()
-        status = nearest_point["code"]
-        if status == "Ok":
-            points = nearest_point.get("waypoints")
+        try:
+            latitude, longitude = [float(value.strip()) for value in str(coordinates).split(",")]
+        except ValueError:
+            print(f"Неверные координаты для {dumpster_uid}: {coordinates}", flush=True)
+            continue
+        points[coordinates] = (longitude, latitude)
+
+    cache = NearestCache(cache_filename)
+    try:
+        snapped, errors = snap_to_road(points, osrm, cache=cache, workers=workers)
+    finally:
+        cache.save()
+    print(f"Привязка к дорогам: из кеша {cache.hits}, запрошено {cache.misses}", flush=True)
+    for nearest_point in errors.values():
+        print(nearest_point, flush=True)
+
+    for dumpster in dumpsters.values():
+        points = snapped.get(dumpster.get("Координаты дома", ""))
+        if points is not None:
             dumpster.update({"Расположение": points})
-        else:
-            print(nearest_point, flush=True)
     return dumpsters
 
 
@@ -77,85 +82,250 @@ def load_from_json(filename):
     return data
 
 
-def link_to_nearest_dumpster(coords, dumpsters):
+def build_dumpster_index(dumpsters):
+    ''' Пространственный индекс контейнерных площадок, привязанных к дорогам
+         - возвращает идентификаторы площадок в порядке индекса и индекс
+    '''
+    uids, longitudes, latitudes = list(), list(), list()
+    for dumpster_uid, dumpster in dumpsters.items():
+        try:
+            longitude, latitude = dumpster["Расположение"][0]["location"]
+        except (KeyError, IndexError):
+            # print(f"Нет координат для площадки {dumpster_uid}", flush=True)
+            continue
+        uids.append(dumpster_uid)
+        longitudes.append(longitude)
+        latitudes.append(latitude)
+    return uids, GridIndex(longitudes, latitudes)
+
+
+def rank_candidates(index, longitudes, latitudes, k, search_radius, max_distance):
+    ''' Номера k ближайших по прямой контейнерных площадок для каждого дома
+         - расстояния большого круга от всех домов до площадок в окрестности search_radius метров
+           вычисляются одним векторным проходом
+         - для домов, у которых в окрестности меньше k площадок, выполняется точный поиск
+           k ближайших на расстоянии не более max_distance метров
     '''
+    indexes, distances = index.top_k(longitudes, latitudes, k, search_radius)
+    ranked = list()
+    for n, (house_indexes, house_distances) in enumerate(zip(indexes, distances)):
+        found = house_indexes[np.isfinite(house_distances)]
+        if len(found) < k:
+            found, _ = index.nearest(longitudes[n], latitudes[n], k)
+            found = found[haversine(longitudes[n], latitudes[n],
+                                    index.longitudes[found], index.latitudes[found]) <= max_distance]
+        ranked.append(found.tolist())
+    return ranked
+
+
+def table_batches(houses, max_table_size):
+    ''' Группирует дома тайла в запросы table с числом точек не более max_table_size
+         - houses: [(адрес, долгота, широта, площадки-кандидаты)]
+         - возвращает пары (дома, площадки запроса)
     '''
-    nearest_dumpsters = dict()
-    total = 0
-    for address, coord in coords.items():
-        # Контейнерные площадки, доступные для дома
-        available_dumpsters = list()
-        for coord_threshold in (0.005, 0.01, 0.015, 0.02, 0.03, 0.04, 0.05, 0.1):
-            latitude = float(coord["lat"])
-            longitude = float(coord["lng"])
-
-            for dumpster_uid, dumpster in dumpsters.items():
-                try:
-                    dumster_location = dumpster["Расположение"][0]["location"]
-                    dumpster_longitude, dumpster_latitude = dumster_location
-                    if dumpster_latitude > latitude + coord_threshold:
-                        continue
-                    if dumpster_latitude < latitude - coord_threshold:
-                        continue
-                    if dumpster_longitude > longitude + coord_threshold:
-                        continue
-                    if dumpster_longitude < longitude - coord_threshold:
-                        continue
-                except KeyError:
-                    # print(f"Нет координат для площадки {dumpster_uid}", flush=True)
-                    continue
-                dumpster.update(uid=dumpster_uid)
-                available_dumpsters.append(dumpster)
-            if len(available_dumpsters) >= 3:
-                break
-
-        dumpster_coords = list()
-        for dumpster in available_dumpsters:
-            dumster_location = dumpster["Расположение"][0]["location"]
-            dumpster_longitude, dumpster_latitude = dumster_location
-            dumpster_coords.append(f"{dumpster_longitude},{dumpster_latitude}")
-        coordinates = ";".join([f"{longitude},{latitude}"] + dumpster_coords)
-        
-        url = f"http://osrm.human:5000/table/v1/foot/{coordinates}"
-        params = dict(
-            sources="0",
-            destinations=";".join([str(n) for n, d in enumerate(available_dumpsters, 1)])
-        )
-        min_duration = None
+    batch, destinations = list(), dict()
+    for house in houses:
+        candidates = house[3]
+        new = [uid for uid in candidates if uid not in destinations]
+        if batch and len(batch) + len(destinations) + len(new) + 1 > max_table_size:
+            yield batch, list(destinations)
+            batch, destinations = list(), dict()
+            new = candidates
+        batch.append(house)
+        destinations.update((uid, None) for uid in new)
+    if batch:
+        yield batch, list(destinations)
 
-        response = requests.get(url, params=params)
-        data = response.json()
-        status = data["code"]
-        if status == "Ok":
-            durations = data.get("durations")[0]
-            for n, duration in enumerate(durations):
-                if min_duration is None or duration < min_duration[1]:
-                    min_duration = (n, duration)
-        else:
-            print(data, flush=True)
 
+def nearest_by_table(batch, destinations, dumpsters, osrm):
+    ''' Ближайшие по времени движения площадки для домов запроса
+         - для каждого дома выбирается площадка из его кандидатов
+    '''
+    coordinates = [(longitude, latitude) for _, longitude, latitude, _ in batch]
+    for dumpster_uid in destinations:
+        coordinates.append(tuple(dumpsters[dumpster_uid]["Расположение"][0]["location"]))
+    data = osrm.table(
+        coordinates,
+        sources=";".join([str(n) for n in range(len(batch))]),
+        destinations=";".join([str(n) for n in range(len(batch), len(coordinates))])
+    )
+    status = data["code"]
+    if status != "Ok":
+        print(data, flush=True)
+        return dict()
+
+    columns = {dumpster_uid: n for n, dumpster_uid in enumerate(destinations)}
+    nearest_dumpsters = dict()
+    for durations, (address, _, _, candidates) in zip(data.get("durations"), batch):
+        min_duration = None
+        for dumpster_uid in candidates:
+            duration = durations[columns[dumpster_uid]]
+            if duration is None:
+                continue
+            if min_duration is None or duration < min_duration[1]:
+                min_duration = (dumpster_uid, duration)
         if min_duration:
-            dumpster_index, duration_value = min_duration
-            dumpster = available_dumpsters[dumpster_index]
-            dumpster.update(duration=duration_value)
-            nearest_dumpsters[address] = dumpster
-
-        total += 1
-        if total % 100 == 0:
-            print(f"Обработано домов: {total}", flush=True)
+            dumpster_uid, duration_value = min_duration
+            # Копия записи площадки: записи реестра не изменяются
+            nearest_dumpsters[address] = dict(dumpsters[dumpster_uid], uid=dumpster_uid, duration=duration_value)
     return nearest_dumpsters
 
 
-def main():
+def link_to_nearest_dumpster(coords, dumpsters, osrm, candidates=5, search_radius=1000.0, max_distance=10000.0,
+                             tile_size=1000.0, max_table_size=100, workers=4):
+    ''' Привязывает дома к ближайшим по времени движения контейнерным площадкам
+         - кандидаты дома: candidates ближайших площадок по расстоянию большого круга
+           (не далее max_distance метров)
+         - дома группируются по тайлам со стороной tile_size метров
+         - для тайла выполняются запросы table "много домов x площадки-кандидаты тайла"
+           с числом точек не более max_table_size (ограничение OSRM --max-table-size)
+         - запросы выполняются параллельно в workers потоках
     '''
+    uids, index = build_dumpster_index(dumpsters)
+    addresses = list(coords)
+    longitudes = np.array([float(coords[address]["lng"]) for address in addresses])
+    latitudes = np.array([float(coords[address]["lat"]) for address in addresses])
+    if not addresses:
+        return dict()
+    # В запрос должны поместиться дом и все его кандидаты
+    k = min(candidates, max_table_size - 1)
+
+    # Площадки-кандидаты домов и запросы по тайлам
+    tiles = GridIndex(longitudes, latitudes, cell_size=tile_size)
+    batches = list()
+    count = 0
+    for tile in tiles.cells():
+        ranked = rank_candidates(index, longitudes[tile], latitudes[tile], k, search_radius, max_distance)
+        houses = list()
+        for n, house_candidates in zip(tile.tolist(), ranked):
+            if not house_candidates:
+                print(f"Нет контейнерных площадок рядом с домом: {addresses[n]}", flush=True)
+                continue
+            houses.append((addresses[n], float(longitudes[n]), float(latitudes[n]),
+                           [uids[i] for i in house_candidates]))
+        count += len(houses)
+        batches.extend(table_batches(houses, max_table_size))
+    print(f"Домов: {count}, тайлов: {len(tiles.keys)}, запросов: {len(batches)}", flush=True)
+
+    nearest_dumpsters = dict()
+    total = 0
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(nearest_by_table, batch, destinations, dumpsters, osrm)
+                   for batch, destinations in batches]
+        for future in as_completed(futures):
+            nearest_dumpsters.update(future.result())
+            total += 1
+            if total % 10 == 0:
+                print(f"Выполнено запросов: {total} из {len(batches)}", flush=True)
+    # Порядок домов как в исходном реестре
+    return {address: nearest_dumpsters[address] for address in coords if address in nearest_dumpsters}
+
+
+def reuse_locations(dumpsters, previous, changed):
+    ''' Переносит привязку к дорогам из предыдущего результата для неизменённых площадок
+         - возвращает площадки, которые нужно привязать к дорогам
+    '''
+    pending = dict()
+    for dumpster_uid, dumpster in dumpsters.items():
+        old = previous.get(dumpster_uid, dict())
+        located = old.get("Расположение")
+        if (dumpster_uid in changed or located is None or
+                old.get("Координаты дома") != dumpster.get("Координаты дома")):
+            pending[dumpster_uid] = dumpster
+        else:
+            dumpster["Расположение"] = located
+    return pending
+
+
+# Файлы данных
+DUMPSTERS_REGISTRY = "/data/Реестр контейнерных площадок.xlsx"
+DUMPSTERS_GEOCODED = "/data/Координаты контейнерных площадок.json"
+DUMPSTERS = "/data/Реестр контейнерных площадок.json"
+HOUSES_COORDINATES = "/data/Координаты жилых домов.json"
+NEAREST_DUMPSTERS = "/data/Ближайшие контейнерные площадки.json"
+# Хеш параметров маршрутизации, с которыми площадки привязаны к дорогам
+# (выходной файл этапа: восстанавливается из кеша вместе с реестром)
+DUMPSTERS_ROUTING = "/data/cache/dumpsters.routing"
+
+
+def process_dumpsters(osrm, routing):
+    ''' Загрузка реестра контейнерных площадок и привязка площадок к дорогам
+         - routing: параметры маршрутизации; привязка из предыдущего результата и кеш привязки
+           используются только при тех же параметрах
     '''
-    dumpsters = load_dumpsters(filename="/data/Реестр контейнерных площадок.xlsx")
-    # Привязка контейнеров к дорогам
-    dumpsters = link_to_road(dumpsters)
-    save_to_json("/data/Реестр контейнерных площадок.json", dumpsters)
+    # Координаты площадок, найденные геокодером
+    geocoded = Path(DUMPSTERS_GEOCODED)
+    ingestion = load_dumpsters(
+        filename=DUMPSTERS_REGISTRY,
+        cache_filename="/data/cache/registry.dumpsters.json",
+        coordinates=load_from_json(geocoded) if geocoded.exists() else None
+    )
+    dumpsters = ingestion.records
+
+    # Привязка контейнеров к дорогам: только новые и изменённые площадки
+    digest = hashlib.sha256(json.dumps(routing, sort_keys=True).encode()).hexdigest()[:16]
+    output = Path(DUMPSTERS)
+    marker = Path(DUMPSTERS_ROUTING)
+    previous = dict()
+    if output.exists() and marker.exists() and marker.read_text(encoding="utf-8") == digest:
+        previous = load_from_json(output)
+    pending = reuse_locations(dumpsters, previous, ingestion.changed)
+    link_to_road(pending, osrm, cache_filename=f"/data/cache/nearest.{osrm.profile}.{digest}.json")
+    save_to_json(output, dumpsters)
+    marker.parent.mkdir(parents=True, exist_ok=True)
+    marker.write_text(digest, encoding="utf-8")
+    # Строки реестра считаются обработанными только после записи результата
+    ingestion.commit()
     print(len(dumpsters), flush=True)
 
-    # Првязка домов к контейнерным площадкам
-    coords = load_from_json("/data/Координаты жилых домов.json")
-    nearest_dumpsters = link_to_nearest_dumpster(coords, dumpsters)
-    save_to_json("/data/Ближайшие контейнерные площадки.json", nearest_dumpsters)
+
+def process_houses(osrm):
+    ''' Привязка домов к ближайшим контейнерным площадкам
+    '''
+    dumpsters = load_from_json(DUMPSTERS)
+    coords = load_from_json(HOUSES_COORDINATES)
+    nearest_dumpsters = link_to_nearest_dumpster(coords, dumpsters, osrm)
+    save_to_json(NEAREST_DUMPSTERS, nearest_dumpsters)
+
+
+def main():
+    ''' Этапы обработки выполняются только при изменении их входных файлов
+    '''
+    # Клиенты маршрутизации создаются при первом выполняемом этапе
+    lock = threading.Lock()
+    clients = list()
+
+    def client(n):
+        with lock:
+            if not clients:
+                clients.extend(create_clients())
+        return clients[n]
+
+    # Параметры маршрутизации, влияющие на результаты этапов: сервер OSRM или встроенный
+    # маршрутизатор и выгрузка OSM, по которой построены их дорожные графы
+    backend = os.getenv("ROUTING_BACKEND", "osrm")
+    osm = os.getenv("OSM_FILE", OSM_FILE)
+
+    def routing(profile):
+        params = dict(backend=backend, profile=profile)
+        if backend != "local":
+            params["url"] = URLS[profile]
+        return params
+
+    pipeline = Pipeline("/data/cache/pipeline")
+    pipeline.add(
+        "dumpsters",
+        lambda hashes: process_dumpsters(client(0), dict(routing("car"), osm=hashes[osm])),
+        inputs=[DUMPSTERS_REGISTRY, DUMPSTERS_GEOCODED, osm],
+        outputs=[DUMPSTERS, DUMPSTERS_ROUTING],
+        params=routing("car")
+    )
+    pipeline.add(
+        "houses",
+        lambda hashes: process_houses(client(1)),
+        inputs=[DUMPSTERS, HOUSES_COORDINATES, osm],
+        outputs=[NEAREST_DUMPSTERS],
+        params=routing("foot")
+    )
+    pipeline.run()
+    print(f"Выполнено этапов: {pipeline.executed}, пропущено: {pipeline.skipped}", flush=True)
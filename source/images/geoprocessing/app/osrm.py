@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+# Коды ответа HTTP, после которых запрос повторяется
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+# Адреса сервисов OSRM по профилям
+URLS = {
+    "car": "http://osrm.vehicle:5000",
+    "foot": "http://osrm.human:5000",
+}
+
+# Выгрузка OSM: данные встроенного маршрутизатора и сервисов OSRM
+OSM_FILE = "/data/osm/nn-latest.osm.pbf"
+
+
+class OSRM():
+    ''' Клиент сервиса OSRM
+         - если задан встроенный маршрутизатор (osmrouting.Router), запросы выполняются без HTTP
+    '''
+
+    def __init__(self, url, profile, router=None, pool_size=8, retries=3, backoff=0.5, timeout=60):
+        # Адрес сервиса OSRM
+        self.url = url.rstrip("/")
+        # Профиль маршрутизации
+        self.profile = profile
+        # Встроенный маршрутизатор
+        self.router = router
+        # Сессия HTTP с пулом соединений для параллельных запросов
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        # Количество повторов запроса, начальная задержка между повторами и тайм-аут запроса, секунд
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+
+    def request(self, service, coordinates, **params):
+        ''' Выполняет запрос к сервису
+             - coordinates: список точек (долгота, широта)
+        '''
+        if self.router is not None:
+            return self.router.query(service, coordinates, params)
+        points = ";".join([f"{longitude},{latitude}" for longitude, latitude in coordinates])
+        url = f"{self.url}/{service}/v1/{self.profile}/{points}"
+        for attempt in range(self.retries + 1):
+            try:
+                response = self.session.get(url, params=params, timeout=self.timeout)
+                if response.status_code not in RETRY_STATUSES:
+                    return response.json()
+                response.raise_for_status()
+            except (requests.ConnectionError, requests.Timeout, requests.HTTPError) as err:
+                if attempt == self.retries:
+                    raise
+                print(f"OSRM request failed ({err}), retrying", flush=True)
+            # Экспоненциальное увеличение задержки между повторами
+            time.sleep(self.backoff * 2 ** attempt)
+
+    def nearest(self, longitude, latitude, **params):
+        ''' Ближайшая к точке дорога
+        '''
+        return self.request("nearest", [(longitude, latitude)], **params)
+
+    def table(self, coordinates, **params):
+        ''' Матрица времени движения между точками
+        '''
+        return self.request("table", coordinates, **params)
+
+
+def create_clients():
+    ''' Создаёт клиентов для автомобильного и пешеходного профилей
+         - ROUTING_BACKEND=local: встроенный маршрутизатор по выгрузке OSM (OSM_FILE)
+    '''
+    if os.getenv("ROUTING_BACKEND", "osrm") != "local":
+        return (OSRM(URLS["car"], "car"),
+                OSRM(URLS["foot"], "foot"))
+
+    from osmrouting import Router
+    filename = os.getenv("OSM_FILE", OSM_FILE)
+    print(f"Loading road graphs from {filename}", flush=True)
+    return (OSRM("", "car", router=Router.from_osm(filename, "car", cache="/data/cache/graphs")),
+            OSRM("", "foot", router=Router.from_osm(filename, "foot", cache="/data/cache/graphs")))
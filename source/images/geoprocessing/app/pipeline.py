@@ -0,0 +1,206 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import json
+import shutil
+import hashlib
+import threading
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+
+# Хеши содержимого файлов: {путь: [размер, время изменения, SHA-256]}
+_hashes = dict()
+_hashes_lock = threading.Lock()
+
+
+def file_hash(filename, block_size=1 << 20):
+    ''' Хеш SHA-256 содержимого файла (None, если файла нет)
+         - хеш пересчитывается, только если размер или время изменения файла изменились
+    '''
+    path = Path(filename)
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return None
+    name = str(path.resolve())
+    with _hashes_lock:
+        known = _hashes.get(name)
+    if known and known[:2] == [stat.st_size, stat.st_mtime_ns]:
+        return known[2]
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    with _hashes_lock:
+        _hashes[name] = [stat.st_size, stat.st_mtime_ns, digest.hexdigest()]
+    return digest.hexdigest()
+
+
+def load_hashes(filename):
+    ''' Загружает хеши файлов, сохранённые предыдущим запуском
+    '''
+    path = Path(filename)
+    if not path.exists():
+        return
+    known = json.loads(path.read_text(encoding="utf-8"))
+    with _hashes_lock:
+        for name, value in known.items():
+            _hashes.setdefault(name, value)
+
+
+def save_hashes(filename):
+    ''' Сохраняет хеши файлов для следующих запусков
+    '''
+    path = Path(filename)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with _hashes_lock:
+        data = json.dumps(_hashes, ensure_ascii=False, indent=4)
+    tmp_path = path.with_suffix(".tmp")
+    tmp_path.write_text(data, encoding="utf-8")
+    tmp_path.replace(path)
+
+
+class Stage():
+    ''' Этап обработки
+         - function(hashes): функция этапа, получает хеши входных файлов {файл: SHA-256}
+         - inputs, outputs: входные и выходные файлы
+         - params: параметры, влияющие на результат (входят в ключ этапа)
+    '''
+
+    def __init__(self, name, function, inputs=(), outputs=(), params=None):
+        self.name = name
+        self.function = function
+        self.inputs = [str(filename) for filename in inputs]
+        self.outputs = [str(filename) for filename in outputs]
+        self.params = params or dict()
+
+    def input_hashes(self):
+        ''' Хеши содержимого входных файлов
+        '''
+        return {filename: file_hash(filename) for filename in self.inputs}
+
+    def key(self, hashes=None):
+        ''' Ключ этапа: хеш названия, параметров и содержимого входных файлов
+        '''
+        data = dict(
+            name=self.name,
+            params=self.params,
+            inputs=self.input_hashes() if hashes is None else hashes
+        )
+        return hashlib.sha256(json.dumps(data, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class Pipeline():
+    ''' Выполнение этапов обработки с кешированием результатов
+         - этап выполняется, только если изменились его входные файлы или параметры
+         - результаты этапов сохраняются в кеше по ключу этапа и восстанавливаются при совпадении ключа;
+           для каждого этапа хранятся результаты keep последних использованных ключей
+         - этап зависит от этапов, выходные файлы которых являются его входными;
+           независимые этапы выполняются параллельно
+         - хеши файлов сохраняются в каталоге кеша и пересчитываются только для изменённых файлов
+    '''
+
+    def __init__(self, directory, workers=4, keep=3):
+        # Каталог кеша результатов
+        self.directory = Path(directory)
+        self.workers = workers
+        # Количество хранимых результатов каждого этапа (последние использованные ключи)
+        self.keep = keep
+        self.stages = dict()
+        # Этапы, выполненные и пропущенные при последнем запуске
+        self.executed = list()
+        self.skipped = list()
+
+    def add(self, name, function, inputs=(), outputs=(), params=None):
+        ''' Добавляет этап
+        '''
+        assert name not in self.stages, f"stage: {name}"
+        self.stages[name] = Stage(name, function, inputs, outputs, params)
+
+    def dependencies(self, stage):
+        ''' Этапы, выходные файлы которых являются входными для этапа
+        '''
+        return {other.name for other in self.stages.values()
+                if other is not stage and set(other.outputs) & set(stage.inputs)}
+
+    def _cache_path(self, stage, key):
+        return self.directory / stage.name / key
+
+    def _restore(self, stage, key):
+        ''' Восстанавливает выходные файлы этапа из кеша
+             - возвращает False, если результатов с таким ключом нет
+        '''
+        path = self._cache_path(stage, key)
+        manifest = path / "manifest.json"
+        if not manifest.exists():
+            return False
+        hashes = json.loads(manifest.read_text(encoding="utf-8"))
+        for n, filename in enumerate(stage.outputs):
+            if file_hash(filename) != hashes.get(filename):
+                Path(filename).parent.mkdir(parents=True, exist_ok=True)
+                shutil.copyfile(path / str(n), filename)
+        # Время изменения манифеста - время последнего использования результатов
+        manifest.touch()
+        return True
+
+    def _store(self, stage, key):
+        ''' Сохраняет выходные файлы этапа в кеш
+        '''
+        path = self._cache_path(stage, key)
+        path.mkdir(parents=True, exist_ok=True)
+        hashes = dict()
+        for n, filename in enumerate(stage.outputs):
+            shutil.copyfile(filename, path / str(n))
+            hashes[filename] = file_hash(filename)
+        # Манифест записывается последним: его наличие означает полный набор результатов
+        (path / "manifest.json").write_text(json.dumps(hashes, ensure_ascii=False, indent=4), encoding="utf-8")
+        self._evict(stage)
+
+    def _evict(self, stage):
+        ''' Удаляет результаты этапа, кроме keep последних использованных
+        '''
+        entries = list()
+        for path in (self.directory / stage.name).iterdir():
+            manifest = path / "manifest.json"
+            used = manifest.stat().st_mtime if manifest.exists() else 0.0
+            entries.append((used, path))
+        entries.sort(key=lambda entry: entry[0], reverse=True)
+        for _, path in entries[self.keep:]:
+            shutil.rmtree(path, ignore_errors=True)
+
+    def _run_stage(self, stage):
+        ''' Выполняет этап или восстанавливает его результаты из кеша
+        '''
+        hashes = stage.input_hashes()
+        key = stage.key(hashes)
+        if self._restore(stage, key):
+            print(f"[{stage.name}] inputs unchanged, skipped", flush=True)
+            self.skipped.append(stage.name)
+            return
+        print(f"[{stage.name}] running", flush=True)
+        stage.function(hashes)
+        self._store(stage, key)
+        self.executed.append(stage.name)
+
+    def run(self):
+        ''' Выполняет этапы в порядке зависимостей
+        '''
+        self.executed, self.skipped = list(), list()
+        load_hashes(self.directory / "hashes.json")
+        waiting = {name: self.dependencies(stage) for name, stage in self.stages.items()}
+        done = set()
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            running = dict()
+            while waiting or running:
+                for name in [name for name, dependencies in waiting.items() if dependencies <= done]:
+                    del waiting[name]
+                    running[executor.submit(self._run_stage, self.stages[name])] = name
+                if not running:
+                    raise RuntimeError(f"Cyclic stage dependencies: {', '.join(waiting)}")
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    name = running.pop(future)
+                    future.result()
+                    done.add(name)
+        save_hashes(self.directory / "hashes.json")
@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import json
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+
+class NearestCache():
+    ''' Постоянный кеш привязки точек к дорогам
+         - ключ: исходная строка координат, значение: точки ответа сервиса nearest
+    '''
+
+    def __init__(self, filename=None):
+        self.filename = Path(filename) if filename else None
+        self.items = dict()
+        if self.filename is not None and self.filename.exists():
+            self.items = json.loads(self.filename.read_text(encoding="utf-8"))
+        # Количество найденных в кеше и запрошенных точек
+        self.hits = 0
+        self.misses = 0
+
+    def __contains__(self, key):
+        return key in self.items
+
+    def get(self, key):
+        '''
+        '''
+        return self.items.get(key)
+
+    def put(self, key, waypoints):
+        '''
+        '''
+        self.items[key] = waypoints
+
+    def save(self):
+        ''' Сохраняет кеш в файл
+        '''
+        if self.filename is None:
+            return
+        self.filename.parent.mkdir(parents=True, exist_ok=True)
+        tmp_filename = self.filename.with_suffix(".tmp")
+        tmp_filename.write_text(json.dumps(self.items, ensure_ascii=False), encoding="utf-8")
+        tmp_filename.replace(self.filename)
+
+
+def snap_to_road(points, osrm, cache=None, workers=8):
+    ''' Привязывает точки к дорогам
+         - points: {строка координат: (долгота, широта)}
+         - запросы к сервису выполняются параллельно в workers потоках, только для точек не из кеша
+         - возвращает {строка координат: точки ответа} и ответы с ошибками
+           (ошибка запроса к сервису не прерывает привязку остальных точек)
+    '''
+    cache = cache if cache is not None else NearestCache()
+    snapped = dict()
+    errors = dict()
+    missing = list()
+    for key in points:
+        if key in cache:
+            snapped[key] = cache.get(key)
+            cache.hits += 1
+        else:
+            missing.append(key)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(osrm.nearest, *points[key]): key for key in missing}
+        for future in as_completed(futures):
+            key = futures[future]
+            cache.misses += 1
+            try:
+                nearest_point = future.result()
+            except Exception as e:
+                errors[key] = dict(code="Error", message=str(e))
+                continue
+            if nearest_point["code"] == "Ok":
+                snapped[key] = nearest_point.get("waypoints")
+                cache.put(key, snapped[key])
+            else:
+                errors[key] = nearest_point
+    return snapped, errors
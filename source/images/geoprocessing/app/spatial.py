@@ -0,0 +1,195 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import math
+
+import numpy as np
+
+
+EARTH_RADIUS = 6371000.0
+
+
+def haversine(longitudes1, latitudes1, longitudes2, latitudes2):
+    ''' Расстояние по дуге большого круга, метров (массивы NumPy с поддержкой broadcasting)
+    '''
+    longitudes1, latitudes1, longitudes2, latitudes2 = map(
+        np.radians, (longitudes1, latitudes1, longitudes2, latitudes2))
+    h = (np.sin((latitudes2 - latitudes1) / 2) ** 2 +
+         np.cos(latitudes1) * np.cos(latitudes2) * np.sin((longitudes2 - longitudes1) / 2) ** 2)
+    return 2 * EARTH_RADIUS * np.arcsin(np.sqrt(np.minimum(h, 1.0)))
+
+
+class GridIndex():
+    ''' Сеточный пространственный индекс точек
+         - координаты проецируются в метры (равнопромежуточная проекция около средней широты)
+         - номера точек упорядочены по ячейкам сетки со стороной cell_size метров
+    '''
+
+    def __init__(self, longitudes, latitudes, cell_size=500.0):
+        longitudes = np.asarray(longitudes, dtype=float)
+        latitudes = np.asarray(latitudes, dtype=float)
+        assert longitudes.shape == latitudes.shape
+        # Размер ячейки сетки, метров
+        self.cell_size = float(cell_size)
+        # Координаты точек
+        self.longitudes = longitudes
+        self.latitudes = latitudes
+        # Широта, около которой выполняется проекция
+        self.latitude = float(latitudes.mean()) if len(latitudes) else 0.0
+        # Координаты точек в проекции, метров
+        self.x, self.y = self.project(longitudes, latitudes)
+
+        columns, rows = self._cells(self.x, self.y)
+        keys = self._keys(columns, rows)
+        # Номера точек, упорядоченные по ячейкам, и границы непустых ячеек в этом порядке
+        self.order = np.argsort(keys, kind="stable")
+        self.keys, starts = np.unique(keys[self.order], return_index=True)
+        self.indptr = np.append(starts, len(keys)).astype(np.int64)
+        # Границы сетки: (столбец, строка) минимальные и максимальные
+        if len(keys):
+            self.bounds = (int(columns.min()), int(rows.min()), int(columns.max()), int(rows.max()))
+        else:
+            self.bounds = None
+
+    def __len__(self):
+        return len(self.x)
+
+    def cells(self):
+        ''' Перебирает номера точек по непустым ячейкам сетки
+        '''
+        for n in range(len(self.keys)):
+            yield self.order[self.indptr[n]:self.indptr[n + 1]]
+
+    def project(self, longitudes, latitudes):
+        ''' Проекция координат в метры
+        '''
+        scale = math.radians(1) * EARTH_RADIUS
+        x = np.asarray(longitudes, dtype=float) * scale * math.cos(math.radians(self.latitude))
+        y = np.asarray(latitudes, dtype=float) * scale
+        return x, y
+
+    def _cells(self, x, y):
+        ''' Столбцы и строки ячеек сетки
+        '''
+        return (np.floor(np.asarray(x) / self.cell_size).astype(np.int64),
+                np.floor(np.asarray(y) / self.cell_size).astype(np.int64))
+
+    @staticmethod
+    def _keys(columns, rows):
+        ''' Ключи ячеек сетки
+        '''
+        return (np.asarray(columns, dtype=np.int64) << 32) + (np.asarray(rows, dtype=np.int64) & 0xFFFFFFFF)
+
+    def _points(self, columns, rows):
+        ''' Номера точек в ячейках с заданными столбцами и строками
+        '''
+        keys = self._keys(columns, rows).ravel()
+        positions = np.searchsorted(self.keys, keys)
+        found = positions < len(self.keys)
+        found[found] = self.keys[positions[found]] == keys[found]
+        parts = [self.order[self.indptr[n]:self.indptr[n + 1]] for n in positions[found].tolist()]
+        if not parts:
+            return np.zeros(0, dtype=np.int64)
+        return np.concatenate(parts)
+
+    def _ring(self, column, row, ring):
+        ''' Номера точек в ячейках на границе квадрата вокруг ячейки
+        '''
+        if ring == 0:
+            return self._points([column], [row])
+        side = np.arange(-ring, ring + 1)
+        inner = np.arange(-ring + 1, ring)
+        columns = np.concatenate([side, side, np.full(len(inner), -ring), np.full(len(inner), ring)])
+        rows = np.concatenate([np.full(len(side), -ring), np.full(len(side), ring), inner, inner])
+        return self._points(columns + column, rows + row)
+
+    def _distances(self, indexes, x, y):
+        ''' Расстояния от точки (x, y) до точек индекса, метров
+        '''
+        return np.hypot(self.x[indexes] - x, self.y[indexes] - y)
+
+    def nearest(self, longitude, latitude, k=1):
+        ''' k ближайших точек
+             - поиск по расширяющимся кольцам ячеек вокруг точки запроса
+             - возвращает номера точек и расстояния до них, упорядоченные по расстоянию
+        '''
+        if not len(self):
+            return np.zeros(0, dtype=np.int64), np.zeros(0)
+        k = min(k, len(self))
+        x, y = self.project(longitude, latitude)
+        column, row = self._cells(x, y)
+        column, row = int(column), int(row)
+        # Кольцо, за которым гарантированно нет точек индекса
+        min_column, min_row, max_column, max_row = self.bounds
+        last = max(abs(column - min_column), abs(column - max_column), abs(row - min_row), abs(row - max_row))
+
+        candidates = list()
+        count = 0
+        for ring in range(last + 1):
+            if (2 * ring + 1) ** 2 > len(self):
+                # Просмотренных ячеек больше, чем точек: проверяются все точки
+                indexes = np.arange(len(self))
+                distances = self._distances(indexes, x, y)
+                break
+            points = self._ring(column, row, ring)
+            if len(points):
+                candidates.append(points)
+                count += len(points)
+            if count < k:
+                continue
+            indexes = np.concatenate(candidates)
+            distances = self._distances(indexes, x, y)
+            # Точки вне просмотренного квадрата удалены не менее чем на ring * cell_size
+            if np.partition(distances, k - 1)[k - 1] <= ring * self.cell_size:
+                break
+        else:
+            indexes = np.concatenate(candidates)
+            distances = self._distances(indexes, x, y)
+        order = np.argsort(distances, kind="stable")[:k]
+        return indexes[order], distances[order]
+
+    def around(self, longitudes, latitudes, radius):
+        ''' Номера точек в ячейках, покрывающих окрестность radius метров вокруг заданных точек
+        '''
+        if not len(self) or not len(longitudes):
+            return np.zeros(0, dtype=np.int64)
+        x, y = self.project(longitudes, latitudes)
+        min_column, min_row = self._cells(x.min() - radius, y.min() - radius)
+        max_column, max_row = self._cells(x.max() + radius, y.max() + radius)
+        if (max_column - min_column + 1) * (max_row - min_row + 1) > len(self.keys):
+            # Окрестность больше числа непустых ячеек
+            return np.arange(len(self))
+        columns, rows = np.meshgrid(np.arange(min_column, max_column + 1), np.arange(min_row, max_row + 1))
+        return self._points(columns, rows)
+
+    def top_k(self, longitudes, latitudes, k, radius):
+        ''' k ближайших точек индекса по расстоянию большого круга для каждой из заданных точек
+             - расстояния до всех точек окрестности radius метров вычисляются одной матрицей
+             - возвращает матрицы номеров точек и расстояний (точки x k), упорядоченные по расстоянию;
+               недостающие позиции: номер -1 и расстояние inf
+        '''
+        longitudes = np.asarray(longitudes, dtype=float)
+        latitudes = np.asarray(latitudes, dtype=float)
+        indexes = np.full((len(longitudes), k), -1, dtype=np.int64)
+        distances = np.full((len(longitudes), k), np.inf)
+        # Запас на расхождение проекции и расстояния большого круга
+        candidates = self.around(longitudes, latitudes, radius * 1.01 + self.cell_size)
+        if not len(candidates) or not k:
+            return indexes, distances
+
+        matrix = haversine(longitudes[:, None], latitudes[:, None],
+                           self.longitudes[candidates][None, :], self.latitudes[candidates][None, :])
+        matrix[matrix > radius] = np.inf
+        count = min(k, len(candidates))
+        if count < len(candidates):
+            columns = np.argpartition(matrix, count - 1, axis=1)[:, :count]
+        else:
+            columns = np.tile(np.arange(count), (len(longitudes), 1))
+        values = np.take_along_axis(matrix, columns, axis=1)
+        order = np.argsort(values, axis=1, kind="stable")
+        columns = np.take_along_axis(columns, order, axis=1)
+        values = np.take_along_axis(values, order, axis=1)
+        found = np.isfinite(values)
+        indexes[:, :count] = np.where(found, candidates[columns], -1)
+        distances[:, :count] = values
+        return indexes, distances
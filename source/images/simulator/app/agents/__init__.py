@@ -3,7 +3,11 @@
 
 
 from .clock import Clock  # noqa
+from .checkpoint import Checkpoint, latest_snapshot, load_snapshot  # noqa
 
 from .dispatcher import Dispatcher  # noqa
 from .vehicle import Vehicle  # noqa
-from .house import House  # noqa
\ No newline at end of file
+from .house import House  # noqa
+from .emission import HouseEmission  # noqa
+from .calendar import EmissionCalendar  # noqa
+from .telemetry import FixedInterval, StepChange, DistanceTolerance, POLICIES  # noqa
@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from datetime import datetime
+
+
+class EmissionCalendar():
+    ''' Календарь генерации мусора
+         - вероятность генерации по часам суток, коэффициенты по дням недели и праздничные дни
+         - значения вычисляются один раз на каждые 15 минут времени симуляции и кэшируются,
+           что корректно для любых часовых поясов
+         - позволяет пропускать периоды с нулевой вероятностью генерации
+    '''
+
+    # Шаг кэширования, секунд
+    step = 900
+
+    def __init__(self, hours, weekdays=None, holidays=None, horizon=31 * 24 * 3600):
+        # Вероятность генерации мусора по часам суток
+        self.hours = dict(hours)
+        # Коэффициенты по дням недели (0 - понедельник)
+        self.weekdays = dict(weekdays) if weekdays else dict()
+        # Праздничные дни, в которые мусор не генерируется
+        self.holidays = set(holidays) if holidays else set()
+        # Максимальный интервал поиска следующего периода генерации, секунд
+        self.horizon = horizon
+        self._rates = dict()
+
+    def _rate(self, key):
+        ''' Вычисляет вероятность генерации для интервала кэширования
+        '''
+        dt = datetime.fromtimestamp(key * self.step)
+        if dt.date() in self.holidays:
+            return 0
+        return self.hours.get(dt.hour, 0) * self.weekdays.get(dt.weekday(), 1)
+
+    def rate(self, timestamp):
+        ''' Возвращает вероятность генерации мусора за час в момент времени
+        '''
+        key = int(timestamp) // self.step
+        rate = self._rates.get(key)
+        if rate is None:
+            rate = self._rates[key] = self._rate(key)
+        return rate
+
+    def next_active(self, timestamp):
+        ''' Возвращает ближайший момент не ранее timestamp с ненулевой вероятностью генерации
+             (или None, если такого момента нет в пределах горизонта поиска)
+        '''
+        if self.rate(timestamp):
+            return timestamp
+        start = (int(timestamp) // self.step + 1) * self.step
+        for moment in range(start, start + self.horizon, self.step):
+            if self.rate(moment):
+                return moment
+        return None
@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import gzip
+import os
+import pickle
+from pathlib import Path
+
+
+def save_snapshot(filename, snapshot):
+    ''' Сохраняет контрольную точку (запись через временный файл)
+    '''
+    filename = Path(filename)
+    filename.parent.mkdir(parents=True, exist_ok=True)
+    tmp = filename.with_name(filename.name + ".tmp")
+    with gzip.open(tmp, "wb", compresslevel=1) as f:
+        pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, filename)
+
+
+def load_snapshot(filename):
+    ''' Загружает контрольную точку
+    '''
+    with gzip.open(filename, "rb") as f:
+        return pickle.load(f)
+
+
+def snapshots(directory):
+    ''' Возвращает контрольные точки в каталоге в порядке времени симуляции
+    '''
+    return sorted(
+        Path(directory).glob("checkpoint-*.pkl.gz"),
+        key=lambda filename: int(filename.name[len("checkpoint-"):-len(".pkl.gz")])
+    )
+
+
+def latest_snapshot(directory):
+    ''' Возвращает путь к последней контрольной точке в каталоге (или None)
+    '''
+    filenames = snapshots(directory)
+    return filenames[-1] if filenames else None
+
+
+class Checkpoint():
+    ''' Периодическое сохранение контрольных точек симуляции
+         - контрольная точка сохраняется после обработки всех событий текущего момента,
+           поэтому состояние агентов в ней согласовано
+         - хранится не более keep последних контрольных точек
+    '''
+
+    def __init__(self, env, directory, interval=3600, keep=3):
+        self.env = env
+        # Каталог контрольных точек
+        self.directory = Path(directory)
+        # Интервал сохранения, секунд
+        self.interval = interval
+        # Количество хранимых контрольных точек
+        self.keep = keep
+        self.action = env.process(self.run())
+
+    def save(self):
+        ''' Сохраняет контрольную точку и удаляет устаревшие
+        '''
+        filename = self.directory / f"checkpoint-{self.env.now}.pkl.gz"
+        save_snapshot(filename, self.env.snapshot())
+        print(f"Saved checkpoint {filename}", flush=True)
+        for filename in snapshots(self.directory)[:-self.keep]:
+            filename.unlink()
+
+    def run(self):
+        '''
+        '''
+        while True:
+            yield self.env.timeout(self.interval)
+            # Ожидание обработки всех остальных событий текущего момента времени
+            while self.env.peek() == self.env.now:
+                yield self.env.timeout(0)
+            self.save()
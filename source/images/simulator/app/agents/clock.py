@@ -8,9 +8,11 @@ class Clock():
     '''
     '''
 
-    def __init__(self, env, timeout):
+    def __init__(self, env, timeout, profile_filename=None):
         self.env = env
         self.timeout = timeout
+        # Файл для периодической выгрузки отчёта профилирования
+        self.profile_filename = profile_filename
         self.action = env.process(self.run())
 
     def run(self):
@@ -18,5 +20,18 @@ class Clock():
         '''
         while True:
             now = datetime.fromtimestamp(self.env.now)
-            print(f"[{now:%H:%M}] {self.env.status}", flush=True)
+            status = self.env.status
+            routes = status["routes"]
+            print(f"[{now:%H:%M}] "
+                  f"dumpsters: {status['total_dumpster_load']} "
+                  f"(over threshold: {status['dumpsters_over_threshold']}, "
+                  f"overflowing: {status['dumpsters_overflowing']}), "
+                  f"vehicles: {status['total_vehicle_load']}, "
+                  f"orders: {status['orders_open']}, "
+                  f"routes: {routes['hits'] + routes['disk_hits']}/{routes['misses']}", flush=True)
+            profiler = self.env.profiler
+            if profiler is not None:
+                print(f"[{now:%H:%M}] {profiler.summary()}", flush=True)
+                if self.profile_filename:
+                    profiler.save(self.profile_filename)
             yield self.env.timeout(self.timeout)
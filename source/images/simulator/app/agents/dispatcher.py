@@ -2,7 +2,7 @@
 # -*- coding: utf-8 -*-
 
 import uuid
-import random
+from collections import OrderedDict, deque
 from datetime import datetime
 
 from resources import Order
@@ -11,9 +11,17 @@ from resources import Order
 class Dispatcher():
     ''' Диспетчер
          - формирует наряд на вывоз мусора
+         - ведёт очереди нарядов: ожидающие назначения (в порядке создания), назначенные
+           и последние выполненные; более ранние выполненные наряды учитываются только в сводке
     '''
 
-    def __init__(self, env, uid, name, timeout):
+    # Схема состояния диспетчера
+    state_schema = (
+        ("timestamp", "i8"),
+        ("uid", "U"),
+    )
+
+    def __init__(self, env, uid, name, timeout, completed_size=100):
         self.env = env
         # Уникальный идентификатор дома
         self.uid = uid
@@ -23,11 +31,35 @@ class Dispatcher():
         self.dumpster_threshold = 0.7
         # Таймаут
         self.timeout = timeout
-        # Наряды
-        self.orders = dict()
+        # Наряды, ожидающие назначения, и назначенные наряды
+        self.pending = OrderedDict()
+        self.assigned = dict()
+        # Последние выполненные наряды и сводка по всем выполненным нарядам
+        self.completed = deque(maxlen=completed_size)
+        self.summary = dict(
+            created=0,
+            completed=0,
+            dumpsters=0,
+            wait_time=0,
+            service_time=0
+        )
+        # Контейнерные площадки, заполненные выше порогового уровня и не включённые в наряд
+        self.ready = dict()
+        # Время следующего формирования нарядов
+        self.wakeup = None
+        for dumpster in env._dumpsters.values():
+            self.update_dumpster(dumpster)
 
         self.action = env.process(self.run())
 
+    @property
+    def orders(self):
+        ''' Невыполненные наряды
+        '''
+        orders = dict(self.pending)
+        orders.update(self.assigned)
+        return orders
+
     @property
     def state(self):
         '''
@@ -43,31 +75,107 @@ class Dispatcher():
         while True:
             # Начинаем работу с 06-00 и завершаем работу в 16-00
             # Формирование нарядов
-            yield self.env.timeout(self.timeout)
-            dumpsters = dict()
-            for dumpster_uid, dumpster in self.env._dumpsters.items():
-                if dumpster.percent_level > self.dumpster_threshold and dumpster.order_uid is None:
-                    dumpsters[dumpster_uid] = dumpster
-
-            if len(dumpsters) >= 16:
-                order_uid = uuid.uuid4()
-                self.orders[order_uid] = Order(
+            if self.wakeup is None:
+                self.wakeup = self.env.now + self.timeout
+            yield self.env.timeout(self.wakeup - self.env.now)
+            self.wakeup = None
+            if len(self.ready) >= 16:
+                # Площадки в порядке убывания заполненности
+                dumpsters = dict(sorted(
+                    self.ready.items(),
+                    key=lambda item: item[1].percent_level,
+                    reverse=True
+                ))
+                # Идентификатор из генератора симуляции: прогоны с одним зерном воспроизводимы
+                order_uid = uuid.UUID(int=self.env.random.getrandbits(128), version=4)
+                order = Order(
                     self.env,
                     order_uid,
                     dumpsters,
                     target=dict(
                         latitude=56.322486,
                         longitude=43.560934
-                    )
+                    ),
+                    dispatcher_uid=self.uid
                 )
+                self.pending[order_uid] = order
+                self.summary["created"] += 1
                 for _, dumpster in dumpsters.items():
                     dumpster.set_order(order_uid)
+                self.env.update_orders(1)
                 print(f"Generating order '{order_uid}'", flush=True)
+                self.env.assign_orders()
+
+    def update_dumpster(self, dumpster):
+        ''' Учитывает изменение уровня заполненности или наряда контейнерной площадки
+        '''
+        if dumpster.order_uid is None and dumpster.percent_level > self.dumpster_threshold:
+            self.ready[dumpster.uid] = dumpster
+        else:
+            self.ready.pop(dumpster.uid, None)
+
+    @property
+    def next_order(self):
+        ''' Наряд, ожидающий назначения дольше остальных (или None)
+        '''
+        return next(iter(self.pending.values()), None)
+
+    def assign(self, order, vehicle_uid):
+        ''' Назначает наряд автомобилю
+        '''
+        del self.pending[order.uid]
+        order.set_vehicle(vehicle_uid)
+        self.assigned[order.uid] = order
+
+    def complete(self, order):
+        ''' Отмечает наряд выполненным и переносит его в сводку
+        '''
+        del self.assigned[order.uid]
+        order.complete()
+        summary = self.summary
+        summary["completed"] += 1
+        summary["dumpsters"] += len(order.dumpsters)
+        summary["wait_time"] += order.assigned_at - order.created_at
+        summary["service_time"] += order.completed_at - order.assigned_at
+        self.completed.append(order.record)
+        self.env.update_orders(-1)
+
+    def snapshot(self):
+        ''' Возвращает состояние для контрольной точки
+        '''
+        return dict(
+            wakeup=self.wakeup,
+            orders=[order.record for order in self.orders.values()],
+            completed=list(self.completed),
+            summary=dict(self.summary)
+        )
 
-    def get_order(self, vehicle_uid, latitude, longitude):
-        ''' Возвращает свободный наряд
+    def restore(self, snapshot):
+        ''' Восстанавливает состояние из контрольной точки
+             - контейнерные площадки должны быть восстановлены заранее
         '''
-        for order_uid, order in self.orders.items():
-            if order.vehicle_uid is None:
-                order.set_vehicle(vehicle_uid)
-                return order
\ No newline at end of file
+        self.wakeup = snapshot["wakeup"]
+        self.pending = OrderedDict()
+        self.assigned = dict()
+        for record in snapshot["orders"]:
+            order_uid = uuid.UUID(record["uid"])
+            order = Order(
+                self.env,
+                order_uid,
+                {uid: self.env.get_dumpster(uid) for uid in record["dumpsters"]},
+                target=record["target"],
+                dispatcher_uid=self.uid
+            )
+            order.created_at = record["created_at"]
+            if record["status"] == "assigned":
+                order.set_vehicle(record["vehicle_uid"])
+                order.assigned_at = record["assigned_at"]
+                self.assigned[order_uid] = order
+            else:
+                self.pending[order_uid] = order
+        self.completed.clear()
+        self.completed.extend(snapshot["completed"])
+        self.summary = dict(snapshot["summary"])
+        self.ready = dict()
+        for dumpster in self.env._dumpsters.values():
+            self.update_dumpster(dumpster)
@@ -0,0 +1,172 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import numpy as np
+
+
+class HouseEmission():
+    ''' Агрегированная модель генерации мусора жилыми домами
+         - дома группируются по контейнерным площадкам
+         - объём мусора за такт вычисляется для всех домов одной операцией NumPy
+         - на каждую площадку за такт приходится не более одного процесса добавления мусора
+    '''
+
+    def __init__(self, env, timeout=600, sample=0.0, seed=None):
+        self.env = env
+        # Длительность такта, секунд
+        self.timeout = timeout
+        # Доля домов, состояние которых сохраняется на каждом такте
+        self.sample = sample
+        # Генератор случайных чисел
+        if seed is None:
+            seed = env.random.getrandbits(64)
+        self.random = np.random.default_rng(seed)
+
+        # Реестр домов
+        self.uids = list()
+        self._latitudes = list()
+        self._longitudes = list()
+        self._dumpster_uids = list()
+        self._daily_emissions = list()
+        # Массивы, построенные по реестру домов
+        self._arrays = None
+        # Текущий и суммарный объём сгенерированного мусора по домам
+        self.current_emission = np.zeros(0)
+        self.total_emission = np.zeros(0)
+        # Время следующего такта
+        self.wakeup = None
+
+        self.action = env.process(self.run())
+
+    def add(self, uid, latitude, longitude, dumpster_uid, daily_emission):
+        ''' Добавляет дом
+        '''
+        self.uids.append(uid)
+        self._latitudes.append(latitude)
+        self._longitudes.append(longitude)
+        self._dumpster_uids.append(dumpster_uid)
+        self._daily_emissions.append(daily_emission)
+        self._arrays = None
+
+    def _build(self):
+        ''' Строит массивы по реестру домов
+        '''
+        # Контейнерные площадки, известные симуляции
+        dumpsters = list()
+        indexes = dict()
+        index = list()
+        for dumpster_uid in self._dumpster_uids:
+            n = indexes.get(dumpster_uid)
+            if n is None:
+                try:
+                    dumpsters.append(self.env.get_dumpster(dumpster_uid))
+                except KeyError:
+                    if self.env.debug:
+                        print(f"Container '{dumpster_uid}' not found", flush=True)
+                    n = -1
+                else:
+                    n = len(dumpsters) - 1
+                indexes[dumpster_uid] = n
+            index.append(n)
+
+        count = len(self.uids)
+        total_emission = np.zeros(count)
+        total_emission[:len(self.total_emission)] = self.total_emission
+        self.total_emission = total_emission
+        self.current_emission = np.zeros(count)
+        self._arrays = dict(
+            dumpsters=dumpsters,
+            index=np.array(index, dtype=np.int64),
+            daily_emission=np.array(self._daily_emissions, dtype=float)
+        )
+
+    @property
+    def totals(self):
+        ''' Суммарный объём сгенерированного мусора по домам
+        '''
+        return dict(zip(self.uids, self.total_emission.tolist()))
+
+    def state(self, n):
+        ''' Возвращает текущее состояние дома
+        '''
+        return dict(
+            timestamp=self.env.now,
+            uid=self.uids[n],
+            latitude=self._latitudes[n],
+            longitude=self._longitudes[n],
+            dumpster_uid=self._dumpster_uids[n],
+            current_emission=round(float(self.current_emission[n]), 2),
+            total_emission=round(float(self.total_emission[n]), 2),
+        )
+
+    def emit(self):
+        ''' Генерирует мусор за один такт
+        '''
+        if self._arrays is None:
+            self._build()
+        arrays = self._arrays
+        dumpsters = arrays["dumpsters"]
+
+        probability = self.env.calendar.rate(self.env.now) / (3600.0 / self.timeout)
+        if not probability or not len(self.uids):
+            self.current_emission[:] = 0
+            return
+
+        # Объём мусора по домам и по контейнерным площадкам
+        emission = arrays["daily_emission"] * probability * self.random.uniform(0.8, 1.2, len(self.uids))
+        emission = np.round(emission, 2)
+        emission[arrays["index"] < 0] = 0
+        self.current_emission = emission
+        self.total_emission += emission
+        known = arrays["index"] >= 0
+        inflow = np.bincount(arrays["index"][known], weights=emission[known], minlength=len(dumpsters))
+
+        for n in np.flatnonzero(inflow).tolist():
+            self.env.process(dumpsters[n].add(float(inflow[n])))
+
+        # Сохранение состояний выборки домов
+        if self.sample:
+            selected = np.flatnonzero(self.random.random(len(self.uids)) < self.sample)
+            for n in selected.tolist():
+                self.env.set_house_state(self.state(n))
+
+    def run(self):
+        '''
+        '''
+        while True:
+            if self.wakeup is None:
+                wakeup = self.env.now + self.timeout
+                # Такты в периоде без генерации мусора пропускаются
+                if not self.env.calendar.rate(wakeup):
+                    active = self.env.calendar.next_active(wakeup)
+                    if active is None:
+                        return
+                    wakeup += -(-(active - wakeup) // self.timeout) * self.timeout
+                self.wakeup = wakeup
+            yield self.env.timeout(self.wakeup - self.env.now)
+            self.wakeup = None
+            self.emit()
+
+    def snapshot(self):
+        ''' Возвращает состояние для контрольной точки
+        '''
+        if self._arrays is None:
+            self._build()
+        return dict(
+            uids=list(self.uids),
+            current_emission=self.current_emission.copy(),
+            total_emission=self.total_emission.copy(),
+            wakeup=self.wakeup,
+            random=self.random.bit_generator.state
+        )
+
+    def restore(self, snapshot):
+        ''' Восстанавливает состояние из контрольной точки
+             - реестр домов должен совпадать с реестром на момент сохранения
+        '''
+        assert snapshot["uids"] == self.uids, "house registry differs from snapshot"
+        self._build()
+        self.current_emission = snapshot["current_emission"].copy()
+        self.total_emission = snapshot["total_emission"].copy()
+        self.wakeup = snapshot["wakeup"]
+        self.random.bit_generator.state = snapshot["random"]
@@ -1,9 +1,6 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
-import random
-from datetime import datetime
-
 
 class House():
     ''' Дом
@@ -16,6 +13,23 @@ class House():
         18: 0.1, 19: 0.07, 20: 0.05, 21: 0.03, 22: 0, 23: 0
     }
 
+    # Атрибуты экземпляра (без словаря атрибутов)
+    __slots__ = (
+        "env", "uid", "latitude", "longitude", "dumpster_uid", "daily_emission",
+        "current_emission", "total_emission", "wakeup", "wakeup_timeout", "action"
+    )
+
+    # Схема состояния дома
+    state_schema = (
+        ("timestamp", "i8"),
+        ("uid", "U"),
+        ("latitude", "f8"),
+        ("longitude", "f8"),
+        ("dumpster_uid", "U"),
+        ("current_emission", "f8"),
+        ("total_emission", "f8"),
+    )
+
     def __init__(self, env, uid, latitude, longitude, dumpster_uid, daily_emission):
         self.env = env
         # Уникальный идентификатор дома
@@ -31,7 +45,10 @@ class House():
         # Текущий объем сгенерированного мусора
         self.current_emission = 0
         # Суммарный объём сгенерированного мусора
-        self.total_emission = 0
+        self.total_emission = 0.0
+        # Время следующей генерации мусора и длительность ожидания
+        self.wakeup = None
+        self.wakeup_timeout = None
 
         assert round(sum([v for k, v in self.emission_probabilty_by_hours.items()]), 1) == 1.0
 
@@ -60,16 +77,26 @@ class House():
         '''
         '''
         while True:
-            timeout = int(random.uniform(min_timeout, max_timeout))
-            yield self.env.timeout(timeout)
+            if self.wakeup is None:
+                timeout = int(self.env.random.uniform(min_timeout, max_timeout))
+                wakeup = self.env.now + timeout
+                # Период без генерации мусора пропускается целиком
+                if not self.env.calendar.rate(wakeup):
+                    active = self.env.calendar.next_active(wakeup)
+                    if active is None:
+                        return
+                    wakeup = active + timeout
+                self.wakeup, self.wakeup_timeout = wakeup, timeout
+            timeout = self.wakeup_timeout
+            yield self.env.timeout(self.wakeup - self.env.now)
+            self.wakeup = None
 
             # Закидывание мусора в контейнер
             try:
-                dt = datetime.fromtimestamp(self.env.now)
-                probability = self.emission_probabilty_by_hours.get(dt.hour, 0) / (3600.0 / timeout)
+                probability = self.env.calendar.rate(self.env.now) / (3600.0 / timeout)
                 self.current_emission = round(
-                    random.uniform(self.daily_emission * probability * 0.8,
-                                   self.daily_emission * probability * 1.2), 2)
+                    self.env.random.uniform(self.daily_emission * probability * 0.8,
+                                            self.daily_emission * probability * 1.2), 2)
                 if self.current_emission:
                     dumpster = self.env.get_dumpster(self.dumpster_uid)
                     # if self.env.debug:
@@ -82,3 +109,13 @@ class House():
             except KeyError:
                 if self.env.debug:
                     print(f"Container '{self.dumpster_uid}' not found", flush=True)
+
+    def snapshot(self):
+        ''' Возвращает состояние для контрольной точки
+        '''
+        return (self.current_emission, self.total_emission, self.wakeup, self.wakeup_timeout)
+
+    def restore(self, snapshot):
+        ''' Восстанавливает состояние из контрольной точки
+        '''
+        self.current_emission, self.total_emission, self.wakeup, self.wakeup_timeout = snapshot
@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import math
+
+import numpy as np
+
+
+def simplify(latitudes, longitudes, tolerance):
+    ''' Упрощение ломаной алгоритмом Дугласа-Пекера
+         - tolerance: допустимое отклонение, метров
+         - возвращает номера сохраняемых точек (первая и последняя сохраняются всегда)
+    '''
+    count = len(latitudes)
+    if count < 3:
+        return list(range(count))
+    # Проекция на плоскость в окрестности первой точки, метров
+    scale = math.radians(1) * 6371000
+    y = np.asarray(latitudes, dtype=float) * scale
+    x = np.asarray(longitudes, dtype=float) * scale * math.cos(math.radians(latitudes[0]))
+
+    keep = np.zeros(count, dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, count - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        dx, dy = x[last] - x[first], y[last] - y[first]
+        px, py = x[first + 1:last] - x[first], y[first + 1:last] - y[first]
+        length = math.hypot(dx, dy)
+        if length:
+            deviation = np.abs(px * dy - py * dx) / length
+        else:
+            deviation = np.hypot(px, py)
+        n = int(np.argmax(deviation))
+        if deviation[n] > tolerance:
+            index = first + 1 + n
+            keep[index] = True
+            stack.append((first, index))
+            stack.append((index, last))
+    return np.flatnonzero(keep).tolist()
+
+
+class FixedInterval():
+    ''' Запись положения автомобиля в моменты, кратные интервалу
+    '''
+
+    # Точки записываются сразу, без накопления трека
+    buffered = False
+
+    def __init__(self, interval=10):
+        # Интервал записи, секунд
+        self.interval = interval
+
+    def sample(self, segment, start):
+        ''' Возвращает моменты времени, широты и долготы записываемых точек участка
+        '''
+        interval = self.interval
+        first = start + 1 + (-(start + 1)) % interval
+        timestamps = np.arange(first, start + segment.duration + 1, interval)
+        if not len(timestamps):
+            return list(), list(), list()
+        latitudes, longitudes = segment.positions(timestamps - start - 1)
+        return timestamps.tolist(), latitudes, longitudes
+
+
+class StepChange():
+    ''' Запись положения автомобиля только в конце каждого шага маршрута
+    '''
+
+    buffered = False
+
+    def sample(self, segment, start):
+        '''
+        '''
+        latitude, longitude = segment.position(segment.duration - 1)
+        return [start + segment.duration], [latitude], [longitude]
+
+
+class DistanceTolerance():
+    ''' Запись трека автомобиля с заданной точностью
+         - кандидаты: моменты прохождения вершин ломаной каждого шага маршрута
+         - трек накапливается до конца плеча маршрута и упрощается алгоритмом Дугласа-Пекера
+    '''
+
+    # Точки накапливаются и записываются после упрощения
+    buffered = True
+
+    def __init__(self, tolerance=10.0):
+        # Допустимое отклонение трека, метров
+        self.tolerance = tolerance
+
+    def sample(self, segment, start):
+        '''
+        '''
+        duration = segment.duration
+        if segment.length:
+            ticks = np.floor(segment.distances[1:-1] / segment.length * duration).astype(np.int64)
+        else:
+            ticks = np.zeros(0, dtype=np.int64)
+        ticks = np.unique(np.clip(np.append(ticks, duration - 1), 0, duration - 1))
+        latitudes, longitudes = segment.positions(ticks)
+        return (ticks + start + 1).tolist(), latitudes, longitudes
+
+    def simplify(self, timestamps, latitudes, longitudes):
+        ''' Номера точек трека, сохраняемых после упрощения
+        '''
+        return simplify(latitudes, longitudes, self.tolerance)
+
+
+# Политики записи положения автомобилей по названиям
+POLICIES = {
+    "interval": FixedInterval,
+    "step": StepChange,
+    "tolerance": DistanceTolerance
+}
@@ -3,9 +3,7 @@
 
 import math
 
-import requests
-
-from shapely.geometry import shape
+from routing import Trajectory
 
 
 AVAILABLE_OWNERS = {
@@ -18,6 +16,13 @@ AVAILABLE_OWNERS = {
 }
 
 
+# Автобаза (общая для всех автомобилей)
+GARAGE = {
+    "latitude": 56.303987,
+    "longitude": 44.019998
+}
+
+
 TARGETS = {
     "SRM": {
         "name": "Сормовская МПС",
@@ -39,6 +44,32 @@ TARGETS = {
 class Vehicle():
     ''' Мусороуборочный автомобиль
     '''
+
+    # Атрибуты экземпляра (без словаря атрибутов)
+    __slots__ = (
+        "env", "uid", "number", "owner", "latitude", "longitude", "velocity", "direction",
+        "capacity", "value", "order", "distance", "orders_served", "segment", "segment_start",
+        "route", "phase", "leg_index", "step_index", "activity", "resume_activity", "trace", "action"
+    )
+
+    # Автобаза
+    garage = GARAGE
+
+    # Схема состояния автомобиля
+    state_schema = (
+        ("timestamp", "i8"),
+        ("uid", "U"),
+        ("latitude", "f8"),
+        ("longitude", "f8"),
+        ("velocity", "i8"),
+        ("direction", "i8"),
+        ("number", "U"),
+        ("owner", "U"),
+        ("capacity", "i8"),
+        ("value", "i8"),
+        ("percent_level", "f8"),
+    )
+
     def __init__(self, env, uid, number, owner, capacity, value=0):
         self.env = env
         # Уникальный идентификатор
@@ -48,14 +79,9 @@ class Vehicle():
         # Владелец автомобиля
         self.owner = owner
         # Текущая широта
-        self.latitude = 56.303987
+        self.latitude = self.garage["latitude"]
         # Текущая долгота
-        self.longitude = 44.019998
-        # Автобаза
-        self.garage = {
-            "latitude": 56.303987,
-            "longitude": 44.019998
-        }
+        self.longitude = self.garage["longitude"]
         # Текущая скорость
         self.velocity = 40
         # Текущее направление
@@ -66,6 +92,24 @@ class Vehicle():
         self.value = value
         # Наряд
         self.order = None
+        # Пройденное расстояние, метров
+        self.distance = 0
+        # Количество выполненных нарядов
+        self.orders_served = 0
+        # Участок траектории, по которому движется автомобиль, и время начала движения
+        self.segment = None
+        self.segment_start = None
+        # Выполняемый маршрут, этап наряда и позиция на маршруте (плечо, шаг)
+        self.route = None
+        self.phase = None
+        self.leg_index = 0
+        self.step_index = 0
+        # Текущее действие: (вид, время окончания, идентификатор площадки)
+        self.activity = None
+        # Действие, восстановленное из контрольной точки
+        self.resume_activity = None
+        # Накопленный трек (момент времени, широта, долгота) до упрощения
+        self.trace = list()
         # Start the run process everytime an instance is created.
         self.action = env.process(self.run())
 
@@ -92,39 +136,101 @@ class Vehicle():
         '''
         self.env.set_vehicle_state(self.state)
 
+    @property
+    def position(self):
+        ''' Возвращает текущее местоположение (широта, долгота)
+        '''
+        if self.segment is None:
+            return self.latitude, self.longitude
+        tick = min(self.env.now - self.segment_start, self.segment.duration) - 1
+        if tick < 0:
+            return self.latitude, self.longitude
+        return self.segment.position(tick)
+
+    @property
+    def next_position(self):
+        ''' Возвращает положение (широта, долгота), в котором автомобиль запросит следующий наряд
+             - None, если оно пока неизвестно
+        '''
+        if self.route is None:
+            return self.latitude, self.longitude
+        if self.phase in ("unload_garbage", "garage"):
+            return Trajectory(self.route).end or (self.latitude, self.longitude)
+        return None
+
     def on_movement(self, event):
+        ''' Сохраняет состояния автомобиля на пройденном участке
+             - записываемые точки определяются политикой записи положения (env.telemetry)
+        '''
+        telemetry = self.env.telemetry
+        timestamps, latitudes, longitudes = telemetry.sample(self.segment, self.segment_start)
+        if telemetry.buffered:
+            self.trace.extend(zip(timestamps, latitudes, longitudes))
+        else:
+            self.record_trace(timestamps, latitudes, longitudes)
+
+    def record_trace(self, timestamps, latitudes, longitudes):
+        ''' Сохраняет состояния автомобиля в точках трека
         '''
+        state = self.state
+        for timestamp, latitude, longitude in zip(timestamps, latitudes, longitudes):
+            self.env.set_vehicle_state(dict(
+                state,
+                timestamp=timestamp,
+                latitude=latitude,
+                longitude=longitude
+            ))
+
+    def flush_trace(self):
+        ''' Упрощает и сохраняет накопленный трек
         '''
-        if self.env.now % 10 == 0:
-            self.env.set_vehicle_state(self.state)
+        if not self.trace:
+            return
+        timestamps, latitudes, longitudes = zip(*self.trace)
+        self.trace = list()
+        keep = self.env.telemetry.simplify(timestamps, latitudes, longitudes)
+        self.record_trace(
+            [timestamps[n] for n in keep],
+            [latitudes[n] for n in keep],
+            [longitudes[n] for n in keep]
+        )
 
-    def move_to_route(self, route, after_step_handler=None):
+    def move_to_route(self, route, after_step_handler=None, progress=None):
         ''' Выполняет движение по маршруту
+             - на каждый шаг маршрута приходится одно событие
+             - progress: (плечо, шаг, время начала шага) для продолжения прерванного движения
         '''
-        # print(self.route, flush=True)
-        try:
-            legs = route["trips"][0]["legs"]
-        except KeyError:
-            legs = route["routes"][0]["legs"]
-        
-        for leg in legs:
-            for step in leg["steps"]:
-                geometry = step["geometry"]
-                path = shape(geometry)
-                duration = int(round(step["duration"] * 2))
-                for n in range(duration):
-                    distance = float(n) / duration
-                    point = path.interpolate(distance=distance, normalized=True)
-                    self.latitude = round(point.y, 6)
-                    self.longitude = round(point.x, 6)
-                    timeout = self.env.timeout(1)
-                    timeout.callbacks.append(self.on_movement)
-                    yield timeout
-
-                # coords = step["geometry"]["coordinates"][-1]
-                # self.longitude, self.latitude = coords
+        trajectory = Trajectory(route)
+        first_leg, first_step, started = progress if progress else (0, 0, None)
+        self.route = route
+        for leg_index, leg in enumerate(trajectory.legs):
+            if leg_index < first_leg:
+                continue
+            for step_index, segment in enumerate(leg):
+                if leg_index == first_leg and step_index < first_step:
+                    continue
+                if not segment.duration:
+                    continue
+                self.leg_index, self.step_index = leg_index, step_index
+                if started is None:
+                    started = self.env.now
+                self.segment = segment
+                self.segment_start = started
+                finish = started + segment.duration
+                self.activity = ("move", finish, None)
+                timeout = self.env.timeout(finish - self.env.now)
+                timeout.callbacks.append(self.on_movement)
+                yield timeout
+                self.latitude, self.longitude = segment.position(segment.duration - 1)
+                self.distance += segment.distance
+                self.segment = None
+                started = None
+
+            self.flush_trace()
             if after_step_handler:
+                self.leg_index, self.step_index = leg_index + 1, 0
                 yield from after_step_handler()
+        self.route = None
 
     def movement_for_load_dumpsters(self):
         ''' Движение через контейнерные площадки
@@ -136,21 +242,14 @@ class Vehicle():
         coordinates = [(self.longitude, self.latitude)]
         for dumpster_uid, dumpster in self.order.dumpsters.items():
             coordinates.append([dumpster.longitude, dumpster.latitude])
-        coordinates = ";".join([f"{point[0]},{point[1]}" for point in coordinates])
-        url = f"http://osrm.vehicle:5000/trip/v1/car/{coordinates}"
-        params = dict(
-            steps="true",
-            geometries="geojson",
-            # overview="full"
-        )
-        response = requests.get(url, params=params)
-        route = response.json()
+        route = self.env.routes.trip(coordinates)
         status = route["code"]
         if status != "Ok":
             print(route, flush=True)
             return
 
         # Движение по маршруту
+        self.phase = "load_dumpsters"
         yield from self.move_to_route(
             route,
             after_step_handler=self.load_dumpster
@@ -163,34 +262,27 @@ class Vehicle():
         target = self.order.target
         target_latitude = target["latitude"]
         target_longitude = target["longitude"]
-        
+
         # Формирование маршрута из текущей точки
         points = [
             (self.longitude, self.latitude),
             (target_longitude, target_latitude)
         ]
-        coordinates = ";".join([f"{p[0]},{p[1]}" for p in points])
-        url = f"http://osrm.vehicle:5000/route/v1/car/{coordinates}"
-        params = dict(steps="true", geometries="geojson")
-        response = requests.get(url, params=params)
-        route = response.json()
+        route = self.env.routes.route(points)
         status = route["code"]
         if status != "Ok":
             print(route, flush=True)
             return
 
         # Следование по маршруту
+        self.phase = "unload_garbage"
         yield from self.move_to_route(
             route,
             after_step_handler=None
         )
 
         # Выгрузка мусора на полигоне
-        p = self.env.process(
-            self.unload_garbage(duration=20 * 60)
-        )
-        p.callbacks.append(self.callback)
-        yield p
+        yield from self.unload()
 
     def movement_to_garage(self):
         ''' Движение в гараж
@@ -200,17 +292,14 @@ class Vehicle():
             (self.longitude, self.latitude),
             (self.garage['longitude'], self.garage['latitude'])
         ]
-        coordinates = ";".join([f"{p[0]},{p[1]}" for p in coordinates])
-        url = f"http://osrm.vehicle:5000/route/v1/car/{coordinates}"
-        params = dict(steps="true", geometries="geojson")
-        response = requests.get(url, params=params)
-        route = response.json()
+        route = self.env.routes.route(coordinates)
         status = route["code"]
         if status != "Ok":
             print(route, flush=True)
             return
 
         # Следование по маршруту
+        self.phase = "garage"
         yield from self.move_to_route(
             route,
             after_step_handler=None
@@ -228,47 +317,120 @@ class Vehicle():
 
                 # Текущая загруженность контейнера
                 current_value = dumpster.value
-                
+
                 # Загрузка мусора на контейнерной площадке
+                self.activity = ("load", self.env.now + 120, dumpster_uid)
                 p = self.env.process(
                     self.load_garbage(value=current_value, duration=120)
                 )
                 p.callbacks.append(self.callback)
                 yield p
 
-                dumpster.clear()
+                yield from dumpster.clear()
                 break
         except KeyError:
             print(f"Container '{dumpster_uid}' not found", flush=True)
 
+    def unload(self):
+        ''' Выгружает мусор на полигоне
+        '''
+        duration = 20 * 60
+        self.activity = ("unload", self.env.now + duration, None)
+        p = self.env.process(
+            self.unload_garbage(duration=duration)
+        )
+        p.callbacks.append(self.callback)
+        yield p
+
+    def close_order(self):
+        ''' Завершает выполнение наряда
+        '''
+        print(f"Close order", flush=True)
+        self.orders_served += 1
+        self.env.complete_order(self.order)
+        self.order = None
+        # Маршрут в гараж понадобится, если свободных нарядов не окажется
+        self.env.routes.prefetch_route([
+            (self.longitude, self.latitude),
+            (self.garage['longitude'], self.garage['latitude'])
+        ])
+
+    def wait(self, duration):
+        ''' Ожидание
+        '''
+        self.activity = ("wait", self.env.now + duration, None)
+        yield self.env.timeout(duration)
+
+    def resume(self, activity):
+        ''' Продолжает действие, прерванное контрольной точкой
+        '''
+        kind, finish, dumpster_uid = activity
+        if kind == "wait":
+            yield self.env.timeout(finish - self.env.now)
+            return
+
+        if kind == "move":
+            progress = (self.leg_index, self.step_index, finish - self.segment.duration)
+            if self.phase == "garage":
+                yield from self.move_to_route(self.route, progress=progress)
+                self.order = self.env.request_order(self)
+                if self.order:
+                    return
+            elif self.phase == "unload_garbage":
+                yield from self.move_to_route(self.route, progress=progress)
+                yield from self.unload()
+                self.close_order()
+            else:
+                yield from self.move_to_route(self.route, self.load_dumpster, progress=progress)
+                yield from self.movement_for_unload_garbage()
+                self.close_order()
+        elif kind == "load":
+            # Выгрузка мусора в автомобиль уже учтена, остаётся дождаться окончания загрузки
+            yield self.env.timeout(finish - self.env.now)
+            dumpster = self.env.get_dumpster(dumpster_uid)
+            yield from dumpster.clear()
+            progress = (self.leg_index, 0, None)
+            yield from self.move_to_route(self.route, self.load_dumpster, progress=progress)
+            yield from self.movement_for_unload_garbage()
+            self.close_order()
+        elif kind == "unload":
+            yield self.env.timeout(finish - self.env.now)
+            self.close_order()
+        yield from self.wait(60)
+
     def run(self):
         '''
         '''
-        route = None
+        if self.resume_activity is not None:
+            activity, self.resume_activity = self.resume_activity, None
+            yield from self.resume(activity)
+
         while True:
-            # Формирование наряда на вывоз мусора
+            # Получение наряда на вывоз мусора (наряд может быть назначен и во время ожидания)
             if self.order is None:
-                self.order = self.env.dispatchers[0].get_order(
-                    self.uid,
-                    self.latitude,
-                    self.longitude
-                )
+                self.order = self.env.request_order(self)
             # Выполнение наряда
             if self.order:
                 print(f"Begin order", flush=True)
                 yield from self.movement_for_load_dumpsters()
                 yield from self.movement_for_unload_garbage()
-                print(f"Close order", flush=True)
-                self.order = None
+                self.close_order()
             else:
+                # Наряд назначается только автомобилю в гараже: наряд, назначенный в пути,
+                # начался бы лишь после возвращения в гараж
+                self.env.release_vehicle(self)
                 yield from self.movement_to_garage()
+                self.order = self.env.request_order(self)
+                if self.order:
+                    continue
 
-            yield self.env.timeout(60)
+            yield from self.wait(60)
 
     def load_garbage(self, value, duration):
         ''' Загружает мусор из контейнера в машину
         '''
         self.value += value
+        self.env.update_vehicle_load(value)
         if self.env.debug:
             print(f"[{self.env.now}] Loading garbage {value}. Current value: {self.value}", flush=True)
         yield self.env.timeout(duration)
@@ -276,5 +438,47 @@ class Vehicle():
     def unload_garbage(self, duration):
         ''' Выгружает мусор из машины
         '''
+        self.env.update_vehicle_load(-self.value)
         self.value = 0
         yield self.env.timeout(duration)
+
+    def snapshot(self):
+        ''' Возвращает состояние для контрольной точки
+        '''
+        return dict(
+            latitude=self.latitude,
+            longitude=self.longitude,
+            value=self.value,
+            distance=self.distance,
+            orders_served=self.orders_served,
+            order_uid=str(self.order.uid) if self.order else None,
+            route=self.route,
+            phase=self.phase,
+            leg_index=self.leg_index,
+            step_index=self.step_index,
+            activity=self.activity,
+            trace=list(self.trace)
+        )
+
+    def restore(self, snapshot, orders):
+        ''' Восстанавливает состояние из контрольной точки
+        '''
+        self.latitude = snapshot["latitude"]
+        self.longitude = snapshot["longitude"]
+        self.env.update_vehicle_load(snapshot["value"] - self.value)
+        self.value = snapshot["value"]
+        self.distance = snapshot["distance"]
+        self.orders_served = snapshot["orders_served"]
+        order_uid = snapshot["order_uid"]
+        self.order = orders[order_uid] if order_uid else None
+        self.route = snapshot["route"]
+        self.phase = snapshot["phase"]
+        self.leg_index = snapshot["leg_index"]
+        self.step_index = snapshot["step_index"]
+        self.trace = list(snapshot["trace"])
+        activity = snapshot["activity"]
+        if activity is not None and activity[0] == "move":
+            segment = Trajectory(self.route).legs[self.leg_index][self.step_index]
+            self.segment = segment
+            self.segment_start = activity[1] - segment.duration
+        self.resume_activity = activity
@@ -7,6 +7,11 @@ import json
 import errno
 from pathlib import Path
 
+from .store import StateStore  # noqa
+from .sink import StreamingSink, all_row  # noqa
+from .columnar import FORMATS, save_columns, load_columns  # noqa
+from .scenario import ScenarioBundle, load_bundle  # noqa
+
 
 def make_sure_directory_exists(filename):
     ''' Создает каталог для заданного файла, если он не существует
@@ -52,9 +57,17 @@ def save_to_csv(filename, data, fields=None, encoding='utf-8'):
             _write_data(f, data, fieldnames)
 
 
+def save_to_json(filename, data, encoding='utf-8'):
+    ''' Сохраняет данные в JSON-файл
+    '''
+    assert isinstance(data, (dict, list))
+    make_sure_directory_exists(filename)
+    Path(filename).write_text(json.dumps(data, ensure_ascii=False, indent=4), encoding=encoding)
+
+
 def load_from_json(filename):
     ''' Загружает данные из JSON-файла
     '''
     data = json.loads(Path(filename).read_text())
     assert isinstance(data, (dict, list))
-    return data
\ No newline at end of file
+    return data
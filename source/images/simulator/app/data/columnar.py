@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import json
+from pathlib import Path
+
+import numpy as np
+
+
+# Каталоги и файлы результатов по типам агентов
+DIRECTORIES = {
+    "vehicle": "vehicles",
+    "house": "houses",
+    "dumpster": "dumpster",
+}
+
+# Форматы сохранения результатов
+FORMATS = ("csv", "npy", "parquet")
+
+
+def _import_pyarrow():
+    ''' Импортирует pyarrow (необязательная зависимость)
+    '''
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise RuntimeError("Parquet output requires the 'pyarrow' package")
+    return pyarrow, pyarrow.parquet
+
+
+def _dtype(kind):
+    ''' Тип NumPy колонки (строковые поля хранятся кодами)
+    '''
+    return np.dtype(np.int32) if kind == "U" else np.dtype(kind)
+
+
+def save_npy(path, kind, store):
+    ''' Сохраняет состояния агентов в каталог файлов NumPy (.npy), по файлу на колонку
+         - строковые поля: коды (<поле>.npy) и таблица строк (<поле>.strings.npy)
+         - колонки заполняются блоками хранилища без промежуточного объединения
+    '''
+    directory = Path(path) / DIRECTORIES[kind]
+    directory.mkdir(parents=True, exist_ok=True)
+    count = len(store)
+    for name, field_kind in store.schema:
+        column = np.lib.format.open_memmap(
+            str(directory / f"{name}.npy"), mode="w+", dtype=_dtype(field_kind), shape=(count,))
+        offset = 0
+        for block in store.batches():
+            values = block[name]
+            column[offset:offset + len(values)] = values
+            offset += len(values)
+        column.flush()
+        del column
+        if field_kind == "U":
+            np.save(directory / f"{name}.strings.npy", np.array(store.strings(name), dtype=str))
+    manifest = {"count": count, "schema": [list(field) for field in store.schema]}
+    (directory / "schema.json").write_text(json.dumps(manifest, indent=4))
+
+
+def save_parquet(path, kind, store):
+    ''' Сохраняет состояния агентов в файл Parquet
+         - строковые поля сохраняются со словарным кодированием
+    '''
+    pa, pq = _import_pyarrow()
+    filename = Path(path) / f"{DIRECTORIES[kind]}.parquet"
+    filename.parent.mkdir(parents=True, exist_ok=True)
+    dictionaries = dict()
+    fields = list()
+    for name, field_kind in store.schema:
+        if field_kind == "U":
+            dictionaries[name] = pa.array(store.strings(name), type=pa.string())
+            fields.append(pa.field(name, pa.dictionary(pa.int32(), pa.string())))
+        else:
+            fields.append(pa.field(name, pa.from_numpy_dtype(np.dtype(field_kind))))
+    schema = pa.schema(fields)
+    with pq.ParquetWriter(str(filename), schema) as writer:
+        for block in store.batches():
+            arrays = list()
+            for name, field_kind in store.schema:
+                if field_kind == "U":
+                    arrays.append(pa.DictionaryArray.from_arrays(pa.array(block[name]), dictionaries[name]))
+                else:
+                    arrays.append(pa.array(block[name]))
+            writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=schema))
+
+
+def save_columns(path, kind, store, format="npy"):
+    ''' Сохраняет состояния агентов в колоночном формате (npy или parquet)
+    '''
+    if format == "parquet":
+        save_parquet(path, kind, store)
+    else:
+        save_npy(path, kind, store)
+
+
+def load_npy(path, kind, mmap=True):
+    ''' Загружает состояния агентов из каталога файлов NumPy
+    '''
+    directory = Path(path) / DIRECTORIES[kind]
+    manifest = json.loads((directory / "schema.json").read_text())
+    mode = "r" if mmap else None
+    columns, strings = dict(), dict()
+    for name, field_kind in manifest["schema"]:
+        columns[name] = np.load(directory / f"{name}.npy", mmap_mode=mode)
+        if field_kind == "U":
+            strings[name] = np.load(directory / f"{name}.strings.npy", mmap_mode=mode)
+    return columns, strings
+
+
+def load_parquet(path, kind, mmap=True):
+    ''' Загружает состояния агентов из файла Parquet
+    '''
+    pa, pq = _import_pyarrow()
+    table = pq.read_table(str(Path(path) / f"{DIRECTORIES[kind]}.parquet"), memory_map=mmap)
+    table = table.unify_dictionaries()
+    columns, strings = dict(), dict()
+    for name in table.column_names:
+        column = table.column(name)
+        if pa.types.is_dictionary(column.type):
+            column = column.combine_chunks()
+            columns[name] = column.indices.to_numpy()
+            strings[name] = np.array(column.dictionary.to_pylist(), dtype=str)
+        else:
+            columns[name] = column.to_numpy()
+    return columns, strings
+
+
+def load_columns(path, kind, mmap=True):
+    ''' Загружает состояния агентов, сохранённые save_columns
+         - возвращает колонки и таблицы строк, как StateStore.to_numpy
+         - значения строкового поля: strings[name][columns[name]]
+    '''
+    path = Path(path)
+    if (path / f"{DIRECTORIES[kind]}.parquet").exists():
+        return load_parquet(path, kind, mmap=mmap)
+    return load_npy(path, kind, mmap=mmap)
@@ -0,0 +1,339 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import json
+import shutil
+import hashlib
+from pathlib import Path
+
+import numpy as np
+
+
+# Версия формата пакета сценария (изменение формата делает пакеты недействительными)
+BUNDLE_VERSION = 1
+
+# Реестры, из которых собирается сценарий
+REGISTRIES = {
+    "dumpsters": "Реестр контейнерных площадок.json",
+    "houses": "Реестр жилых домов.json",
+    "coordinates": "Координаты жилых домов.json",
+    "nearest": "Ближайшие контейнерные площадки.json",
+}
+
+# Колонки пакета: (набор, поле, тип NumPy)
+COLUMNS = (
+    ("dumpsters", "uid", np.int32),
+    ("dumpsters", "district", np.int32),
+    ("dumpsters", "latitude", np.float64),
+    ("dumpsters", "longitude", np.float64),
+    ("dumpsters", "capacity", np.int64),
+    ("dumpsters", "count", np.int64),
+    ("houses", "uid", np.int32),
+    ("houses", "dumpster", np.int32),
+    ("houses", "latitude", np.float64),
+    ("houses", "longitude", np.float64),
+    ("houses", "daily_emission", np.int64),
+)
+
+
+def _read_json(filename):
+    ''' Загружает данные из JSON-файла
+    '''
+    return json.loads(Path(filename).read_text(encoding="utf-8"))
+
+
+def _file_hash(filename, block_size=1 << 20):
+    ''' Хеш SHA-256 содержимого файла
+    '''
+    digest = hashlib.sha256()
+    with open(filename, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _parse_area(value):
+    ''' Площадь из строки вида "123.4 м2"
+    '''
+    if not value:
+        return None
+    try:
+        return float(str(value).replace("м2", "").strip())
+    except ValueError:
+        print(f"Неверный формат {value}", flush=True)
+        return None
+
+
+def _dumpster_record(dumpster_uid, dumpster):
+    ''' Проверяет и преобразует запись реестра контейнерных площадок
+    '''
+    try:
+        longitude, latitude = dumpster["Расположение"][0]["location"]
+    except (KeyError, IndexError, TypeError, ValueError):
+        print(f"Нет данных о расположении контейнерной площадки '{dumpster_uid}'", flush=True)
+        return None
+
+    capacity = dumpster.get("Вместимомть")
+    try:
+        capacity = round(float(capacity) * 1000) if capacity else None
+    except ValueError:
+        capacity = None
+    if not capacity:
+        print(f"Нет данных о вместимости контейнерной площадки '{dumpster_uid}': "
+              f"{dumpster.get('Вместимомть')}", flush=True)
+        return None
+
+    count = dumpster.get("Количество")
+    if not count:
+        print(f"Нет данных о количестве контейнеров на площадке'{dumpster_uid}': {count}", flush=True)
+        return None
+
+    return (float(latitude), float(longitude), capacity, int(count), dumpster.get("Округ") or "")
+
+
+def _daily_emission(house):
+    ''' Ежедневная норма генерации мусора дома по площади
+    '''
+    total_area = _parse_area(house.get("Общая площадь здания", "0"))
+    living_area = _parse_area(house.get("Общая площадь жилых помещений", "0"))
+    if living_area:
+        return round(living_area * 0.1 * 1000 / 365.0)
+    if total_area:
+        return round(total_area * 0.6 * 0.1 * 1000 / 365.0)
+    return 0
+
+
+class StringTable():
+    ''' Таблица строк: строки в кодировке UTF-8 подряд и смещения их начала
+    '''
+
+    def __init__(self, data, offsets):
+        self.data = data
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        return bytes(self.data[self.offsets[index]:self.offsets[index + 1]]).decode("utf-8")
+
+    def decode(self, indexes):
+        ''' Строки по массиву номеров
+        '''
+        return [self[index] for index in np.asarray(indexes).tolist()]
+
+    @classmethod
+    def build(cls, values):
+        ''' Строит таблицу по списку строк
+        '''
+        encoded = [value.encode("utf-8") for value in values]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(value) for value in encoded], out=offsets[1:])
+        data = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+        return cls(data, offsets)
+
+    def save(self, directory):
+        '''
+        '''
+        np.save(directory / "strings.data.npy", self.data)
+        np.save(directory / "strings.offsets.npy", self.offsets)
+
+    @classmethod
+    def load(cls, directory, mmap_mode="r"):
+        '''
+        '''
+        return cls(np.load(directory / "strings.data.npy", mmap_mode=mmap_mode),
+                   np.load(directory / "strings.offsets.npy", mmap_mode=mmap_mode))
+
+
+class ScenarioBundle():
+    ''' Скомпилированные реестры сценария: колонки NumPy и таблица строк
+         - строковые поля хранятся номерами в таблице строк
+         - houses["dumpster"] - номер контейнерной площадки в колонках dumpsters
+    '''
+
+    def __init__(self, columns, strings, manifest=None):
+        # Колонки по наборам: {"dumpsters": {поле: массив}, "houses": {...}}
+        self.columns = columns
+        self.strings = strings
+        self.manifest = manifest or dict()
+
+    @property
+    def hash(self):
+        return self.manifest.get("hash")
+
+    def district_mask(self, district=None):
+        ''' Маска контейнерных площадок, название округа которых содержит district
+        '''
+        codes = self.columns["dumpsters"]["district"]
+        if district is None:
+            return np.ones(len(codes), dtype=bool)
+        matches = [code for code in np.unique(codes).tolist() if district in self.strings[code]]
+        return np.isin(codes, matches)
+
+    def dumpsters(self, district=None):
+        ''' Контейнерные площадки округа в виде словарей для City.add_dumpster
+        '''
+        columns = self.columns["dumpsters"]
+        indexes = np.flatnonzero(self.district_mask(district))
+        return [
+            dict(uid=uid, latitude=latitude, longitude=longitude, capacity=capacity, count=count)
+            for uid, latitude, longitude, capacity, count in zip(
+                self.strings.decode(columns["uid"][indexes]),
+                columns["latitude"][indexes].tolist(),
+                columns["longitude"][indexes].tolist(),
+                columns["capacity"][indexes].tolist(),
+                columns["count"][indexes].tolist())
+        ]
+
+    def houses(self, district=None):
+        ''' Дома, относящиеся к контейнерным площадкам округа, в виде словарей для City.add_house
+        '''
+        columns = self.columns["houses"]
+        indexes = np.flatnonzero(self.district_mask(district)[columns["dumpster"]])
+        dumpster_uids = self.columns["dumpsters"]["uid"][columns["dumpster"][indexes]]
+        return [
+            dict(uid=uid, latitude=latitude, longitude=longitude, dumpster_uid=dumpster_uid,
+                 daily_emission=daily_emission)
+            for uid, latitude, longitude, dumpster_uid, daily_emission in zip(
+                self.strings.decode(columns["uid"][indexes]),
+                columns["latitude"][indexes].tolist(),
+                columns["longitude"][indexes].tolist(),
+                self.strings.decode(dumpster_uids),
+                columns["daily_emission"][indexes].tolist())
+        ]
+
+    @classmethod
+    def compile(cls, directory):
+        ''' Проверяет и объединяет реестры из каталога directory
+        '''
+        directory = Path(directory)
+        strings = list()
+        codes = dict()
+
+        def intern(value):
+            code = codes.get(value)
+            if code is None:
+                code = codes[value] = len(strings)
+                strings.append(value)
+            return code
+
+        # Контейнерные площадки
+        dumpsters = list()
+        dumpster_indexes = dict()
+        for dumpster_uid, dumpster in _read_json(directory / REGISTRIES["dumpsters"]).items():
+            record = _dumpster_record(dumpster_uid, dumpster)
+            if record is None:
+                continue
+            latitude, longitude, capacity, count, district = record
+            dumpster_indexes[dumpster_uid] = len(dumpsters)
+            dumpsters.append((intern(dumpster_uid), intern(district), latitude, longitude, capacity, count))
+
+        # Жилые дома с координатами и ближайшей контейнерной площадкой
+        coordinates = _read_json(directory / REGISTRIES["coordinates"])
+        nearest = _read_json(directory / REGISTRIES["nearest"])
+        houses = list()
+        for house in _read_json(directory / REGISTRIES["houses"]):
+            address = house["address"]["fullname"]
+            coords = coordinates.get(address)
+            dumpster = nearest.get(address)
+            if coords is None or dumpster is None:
+                continue
+            index = dumpster_indexes.get(dumpster["uid"])
+            if index is None:
+                continue
+            houses.append((intern(address), index, float(coords["lat"]), float(coords["lng"]),
+                           _daily_emission(house)))
+
+        columns = {"dumpsters": dict(), "houses": dict()}
+        for rows, name in ((dumpsters, "dumpsters"), (houses, "houses")):
+            fields = [(field, dtype) for kind, field, dtype in COLUMNS if kind == name]
+            values = list(zip(*rows)) if rows else [()] * len(fields)
+            for (field, dtype), column in zip(fields, values):
+                columns[name][field] = np.array(column, dtype=dtype)
+        return cls(columns, StringTable.build(strings))
+
+    def save(self, directory):
+        ''' Сохраняет пакет в каталог (манифест записывается последним)
+        '''
+        directory = Path(directory)
+        if directory.exists():
+            shutil.rmtree(directory)
+        directory.mkdir(parents=True)
+        for kind, field, dtype in COLUMNS:
+            np.save(directory / f"{kind}.{field}.npy", self.columns[kind][field])
+        self.strings.save(directory)
+        (directory / "manifest.json").write_text(json.dumps(self.manifest, ensure_ascii=False, indent=4),
+                                                 encoding="utf-8")
+
+    @classmethod
+    def load(cls, directory, mmap=True):
+        ''' Загружает пакет из каталога с отображением файлов в память
+        '''
+        directory = Path(directory)
+        manifest = json.loads((directory / "manifest.json").read_text(encoding="utf-8"))
+        mmap_mode = "r" if mmap else None
+        columns = {"dumpsters": dict(), "houses": dict()}
+        for kind, field, dtype in COLUMNS:
+            columns[kind][field] = np.load(directory / f"{kind}.{field}.npy", mmap_mode=mmap_mode)
+        return cls(columns, StringTable.load(directory, mmap_mode=mmap_mode), manifest)
+
+
+def source_fingerprints(directory, known=None):
+    ''' Отпечатки файлов реестров: {реестр: [размер, время изменения, SHA-256]}
+         - хеш пересчитывается только для файлов, размер или время изменения которых не совпадают с known
+    '''
+    known = known or dict()
+    fingerprints = dict()
+    for name, filename in REGISTRIES.items():
+        stat = (Path(directory) / filename).stat()
+        previous = known.get(name)
+        if previous and previous[:2] == [stat.st_size, stat.st_mtime_ns]:
+            fingerprints[name] = list(previous)
+        else:
+            fingerprints[name] = [stat.st_size, stat.st_mtime_ns, _file_hash(Path(directory) / filename)]
+    return fingerprints
+
+
+def bundle_hash(fingerprints):
+    ''' Хеш пакета по содержимому реестров и версии формата
+    '''
+    digest = hashlib.sha256(str(BUNDLE_VERSION).encode())
+    for name in sorted(fingerprints):
+        digest.update(f"{name}:{fingerprints[name][2]}".encode())
+    return digest.hexdigest()
+
+
+def load_bundle(directory, cache):
+    ''' Загружает пакет сценария из кеша, при изменении реестров пакет компилируется заново
+         - directory: каталог реестров
+         - cache: каталог пакета
+    '''
+    cache = Path(cache)
+    manifest = None
+    if (cache / "manifest.json").exists():
+        manifest = json.loads((cache / "manifest.json").read_text(encoding="utf-8"))
+
+    known = manifest.get("sources") if manifest else None
+    fingerprints = source_fingerprints(directory, known)
+    current = bundle_hash(fingerprints)
+    if manifest and manifest.get("hash") == current:
+        if fingerprints != known:
+            # Содержимое не изменилось, обновляются только размеры и время изменения файлов
+            manifest["sources"] = fingerprints
+            (cache / "manifest.json").write_text(json.dumps(manifest, ensure_ascii=False, indent=4),
+                                                 encoding="utf-8")
+        return ScenarioBundle.load(cache)
+
+    print(f"Compiling scenario bundle to {cache}", flush=True)
+    bundle = ScenarioBundle.compile(directory)
+    bundle.manifest = dict(
+        version=BUNDLE_VERSION,
+        hash=current,
+        sources=fingerprints,
+        dumpsters=len(bundle.columns["dumpsters"]["uid"]),
+        houses=len(bundle.columns["houses"]["uid"]),
+        strings=len(bundle.strings)
+    )
+    bundle.save(cache)
+    return ScenarioBundle.load(cache)
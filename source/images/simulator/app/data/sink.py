@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import csv
+import gzip
+import queue
+import threading
+from pathlib import Path
+
+
+# Файлы результатов по типам агентов
+FILENAMES = {
+    "vehicle": "vehicles.csv",
+    "house": "houses.csv",
+    "dumpster": "dumpster.csv",
+    "all": "all.csv",
+}
+
+# Радиус отображения агентов на карте
+RADIUSES = {
+    "vehicle": 2,
+    "dumpster": 10,
+}
+
+
+def all_row(kind, state):
+    ''' Формирует строку сводного файла all.csv по состоянию агента
+    '''
+    return {
+        "timestamp": state["timestamp"],
+        "uid": state["uid"],
+        "type": kind,
+        "latitude": state["latitude"],
+        "longitude": state["longitude"],
+        "radius": RADIUSES[kind],
+        "capacity": state["capacity"],
+        "value": state["value"],
+        "percent_level": state["percent_level"]
+    }
+
+
+class StreamingSink():
+    ''' Потоковая запись состояний в CSV-файлы
+         - состояния передаются блоками через ограниченную очередь
+         - запись выполняется в отдельном потоке во время симуляции
+    '''
+
+    def __init__(self, path, compress=False, chunk_size=4096, queue_size=16, encoding="utf-8"):
+        # Каталог результатов
+        self.path = Path(path)
+        # Сжатие файлов gzip
+        self.compress = compress
+        # Количество состояний в блоке
+        self.chunk_size = chunk_size
+        self.encoding = encoding
+        # Количество записанных состояний по типам агентов
+        self.counters = dict()
+        # Ошибка потока записи
+        self.error = None
+
+        self._buffers = dict()
+        self._files = dict()
+        self._writers = dict()
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = threading.Thread(target=self._run, name="sink", daemon=True)
+        self._thread.start()
+
+    def put(self, kind, state):
+        ''' Добавляет состояние агента
+        '''
+        buffer = self._buffers.setdefault(kind, list())
+        buffer.append(state)
+        if len(buffer) >= self.chunk_size:
+            self._flush(kind)
+
+    def _flush(self, kind):
+        ''' Передаёт накопленный блок в поток записи
+        '''
+        buffer = self._buffers.pop(kind, None)
+        if buffer:
+            self._queue.put((kind, buffer))
+
+    def close(self, raise_error=True):
+        ''' Дописывает оставшиеся состояния и закрывает файлы
+             - raise_error: повторно выбрасывает ошибку потока записи; если False
+               (закрытие во время обработки другого исключения), ошибка только выводится
+        '''
+        for kind in list(self._buffers):
+            self._flush(kind)
+        self._queue.put(None)
+        self._thread.join()
+        if self.error is not None:
+            if raise_error:
+                raise self.error
+            print(f"Streaming sink error: {self.error!r}", flush=True)
+
+    def _open(self, filename):
+        ''' Открывает файл результатов
+        '''
+        self.path.mkdir(parents=True, exist_ok=True)
+        if self.compress:
+            return gzip.open(self.path / f"{filename}.gz", mode="wt", encoding=self.encoding, newline="")
+        return open(self.path / filename, mode="wt", encoding=self.encoding, newline="")
+
+    def _write(self, kind, rows):
+        ''' Записывает блок строк в файл
+        '''
+        writer = self._writers.get(kind)
+        if writer is None:
+            f = self._files[kind] = self._open(FILENAMES[kind])
+            writer = self._writers[kind] = csv.DictWriter(f, fieldnames=list(rows[0].keys()))
+            writer.writeheader()
+        writer.writerows(rows)
+        self.counters[kind] = self.counters.get(kind, 0) + len(rows)
+
+    def _run(self):
+        ''' Поток записи
+        '''
+        try:
+            while True:
+                item = self._queue.get()
+                if item is None:
+                    break
+                if self.error is not None:
+                    # После ошибки очередь только освобождается
+                    continue
+                kind, states = item
+                try:
+                    if kind not in FILENAMES:
+                        continue
+                    self._write(kind, states)
+                    if kind in RADIUSES:
+                        self._write("all", [all_row(kind, state) for state in states])
+                except Exception as err:
+                    self.error = err
+        finally:
+            for f in self._files.values():
+                f.close()
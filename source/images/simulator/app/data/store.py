@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import numpy as np
+
+
+class StateStore():
+    ''' Колоночное хранилище состояний агентов
+         - схема задаётся списком пар (имя поля, тип NumPy)
+         - строковые поля (тип "U") хранятся как коды в таблице строк
+         - колонки растут блоками по chunk_size записей
+    '''
+
+    def __init__(self, schema, chunk_size=65536):
+        self.schema = tuple(schema)
+        self.chunk_size = chunk_size
+        # Таблицы строк: значение -> код и код -> значение
+        self._codes = {name: dict() for name, kind in self.schema if kind == "U"}
+        self._strings = {name: list() for name, kind in self.schema if kind == "U"}
+        # Блоки колонок
+        self._chunks = list()
+        # Количество записей в последнем блоке
+        self._size = self.chunk_size
+
+    def __len__(self):
+        if not self._chunks:
+            return 0
+        return (len(self._chunks) - 1) * self.chunk_size + self._size
+
+    def _new_chunk(self):
+        ''' Создаёт новый блок колонок
+        '''
+        chunk = dict()
+        for name, kind in self.schema:
+            dtype = np.int32 if kind == "U" else np.dtype(kind)
+            chunk[name] = np.empty(self.chunk_size, dtype=dtype)
+        return chunk
+
+    def intern(self, name, value):
+        ''' Возвращает код строкового значения
+        '''
+        codes = self._codes[name]
+        code = codes.get(value)
+        if code is None:
+            code = codes[value] = len(codes)
+            self._strings[name].append(value)
+        return code
+
+    def append(self, state):
+        ''' Добавляет состояние
+        '''
+        if self._size == self.chunk_size:
+            self._chunks.append(self._new_chunk())
+            self._size = 0
+        chunk = self._chunks[-1]
+        index = self._size
+        for name, kind in self.schema:
+            value = state[name]
+            if kind == "U":
+                value = self.intern(name, value)
+            chunk[name][index] = value
+        self._size += 1
+
+    def _blocks(self):
+        ''' Перебирает заполненные части блоков
+        '''
+        for n, chunk in enumerate(self._chunks, 1):
+            size = self._size if n == len(self._chunks) else self.chunk_size
+            yield {name: column[:size] for name, column in chunk.items()}
+
+    def batches(self):
+        ''' Перебирает колонки блоками (строковые поля — кодами)
+        '''
+        return self._blocks()
+
+    def strings(self, name):
+        ''' Таблица строк поля
+        '''
+        return list(self._strings[name])
+
+    def _mask(self, block, uid=None, timestamp_after=None, timestamp_before=None):
+        ''' Формирует маску записей блока по условиям отбора
+        '''
+        mask = np.ones(len(block["timestamp"]), dtype=bool)
+        if uid is not None:
+            code = self._codes["uid"].get(uid)
+            if code is None:
+                return None
+            mask &= block["uid"] == code
+        if timestamp_after is not None:
+            mask &= block["timestamp"] > timestamp_after
+        if timestamp_before is not None:
+            mask &= block["timestamp"] < timestamp_before
+        return mask
+
+    def iterate(self, uid=None, timestamp_after=None, timestamp_before=None):
+        ''' Перебирает состояния в виде словарей
+        '''
+        names = [name for name, _ in self.schema]
+        for block in self._blocks():
+            mask = self._mask(block, uid, timestamp_after, timestamp_before)
+            if mask is None:
+                return
+            columns = list()
+            for name, kind in self.schema:
+                values = block[name][mask].tolist()
+                if kind == "U":
+                    strings = self._strings[name]
+                    values = [strings[code] for code in values]
+                columns.append(values)
+            for row in zip(*columns):
+                yield dict(zip(names, row))
+
+    def __iter__(self):
+        return self.iterate()
+
+    def to_numpy(self):
+        ''' Возвращает колонки в виде массивов NumPy
+             - строковые поля возвращаются кодами, таблицы строк — отдельно
+        '''
+        columns = dict()
+        for name, kind in self.schema:
+            parts = [block[name] for block in self._blocks()]
+            if parts:
+                columns[name] = np.concatenate(parts)
+            else:
+                dtype = np.int32 if kind == "U" else np.dtype(kind)
+                columns[name] = np.empty(0, dtype=dtype)
+        strings = {name: np.array(values, dtype=str) for name, values in self._strings.items()}
+        return columns, strings
@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import math
+import multiprocessing
+
+import numpy as np
+
+from main import simulate
+from routing import RouteCache
+
+
+# Сценарий и параметры прогона, общие для всех процессов серии
+# (передаются дочерним процессам при fork без копирования)
+_scenario = None
+_options = None
+
+
+def collect_metrics(city):
+    ''' Возвращает показатели прогона
+    '''
+    if city.emission is not None:
+        total_emission = float(city.emission.total_emission.sum())
+    else:
+        total_emission = sum([house.total_emission for house in city._houses.values()])
+
+    return dict(
+        total_emission=total_emission,
+        overflow_minutes={
+            uid: dumpster.overflow_duration / 60.0
+            for uid, dumpster in city._dumpsters.items()
+        },
+        distance_km=sum([vehicle.distance for vehicle in city.vehicles]) / 1000.0,
+        orders_served=sum([vehicle.orders_served for vehicle in city.vehicles]),
+    )
+
+
+def _init_worker(quiet):
+    ''' Инициализирует процесс серии
+    '''
+    if quiet:
+        sys.stdout = open(os.devnull, "w")
+
+
+def _replicate(seed):
+    ''' Выполняет один прогон сценария
+    '''
+    # Каталог кэша маршрутов общий для всех процессов серии: прогоны одного сценария
+    # запрашивают одни и те же маршруты, а RouteCache сохраняет их через уникальные
+    # временные файлы и не прерывает прогон при ошибке записи
+    routes = RouteCache(**_options.get("routes", dict()))
+    city = simulate(
+        routes=routes,
+        emission=_options.get("emission", "house"),
+        seed=seed,
+        keep_states=False,
+        clock=None,
+        **_scenario
+    )
+    return collect_metrics(city)
+
+
+class Summary():
+    ''' Накопление статистики по прогонам (алгоритм Уэлфорда)
+    '''
+
+    def __init__(self):
+        self.count = 0
+        self.mean = None
+        self.m2 = None
+        self.min = None
+        self.max = None
+
+    def add(self, value):
+        '''
+        '''
+        value = np.asarray(value, dtype=float)
+        self.count += 1
+        if self.count == 1:
+            self.mean = value.copy()
+            self.m2 = np.zeros_like(value)
+            self.min = value.copy()
+            self.max = value.copy()
+            return
+        delta = value - self.mean
+        self.mean = self.mean + delta / self.count
+        self.m2 = self.m2 + delta * (value - self.mean)
+        self.min = np.minimum(self.min, value)
+        self.max = np.maximum(self.max, value)
+
+    def result(self):
+        ''' Среднее, стандартное отклонение, 95% доверительный интервал и размах
+        '''
+        if self.count > 1:
+            std = np.sqrt(self.m2 / (self.count - 1))
+        else:
+            std = np.zeros_like(self.mean)
+        half_width = 1.96 * std / math.sqrt(self.count)
+        return dict(
+            mean=self.mean.tolist(),
+            std=std.tolist(),
+            ci95=[(self.mean - half_width).tolist(), (self.mean + half_width).tolist()],
+            min=self.min.tolist(),
+            max=self.max.tolist(),
+        )
+
+
+def run_ensemble(scenario, replicates, processes=None, seed=None, routes=None, emission="house", quiet=True):
+    ''' Выполняет серию независимых прогонов сценария в пуле процессов
+         - каждый прогон получает собственное зерно генератора случайных чисел
+         - сохраняются только сводные показатели, состояния агентов не накапливаются
+    '''
+    global _scenario, _options
+    _scenario = scenario
+    _options = dict(routes=routes or dict(), emission=emission)
+
+    # Независимые зёрна прогонов
+    seeds = [
+        int(child.generate_state(2, dtype=np.uint64)[0])
+        for child in np.random.SeedSequence(seed).spawn(replicates)
+    ]
+
+    scalars = ("total_emission", "distance_km", "orders_served")
+    summaries = {name: Summary() for name in scalars}
+    overflow = Summary()
+    dumpster_uids = None
+
+    context = multiprocessing.get_context("fork")
+    with context.Pool(processes, initializer=_init_worker, initargs=(quiet, )) as pool:
+        for n, metrics in enumerate(pool.imap_unordered(_replicate, seeds), 1):
+            for name in scalars:
+                summaries[name].add(metrics[name])
+            if dumpster_uids is None:
+                dumpster_uids = list(metrics["overflow_minutes"].keys())
+            overflow.add([metrics["overflow_minutes"][uid] for uid in dumpster_uids])
+            print(f"Replicate {n}/{replicates} finished", flush=True)
+
+    result = dict(
+        replicates=replicates,
+        seed=seed,
+        seeds=seeds,
+    )
+    for name in scalars:
+        result[name] = summaries[name].result()
+
+    # Время переполнения по контейнерным площадкам, минут
+    per_dumpster = overflow.result()
+    result["overflow_minutes"] = {
+        uid: dict(mean=per_dumpster["mean"][n], std=per_dumpster["std"][n])
+        for n, uid in enumerate(dumpster_uids or list())
+    }
+    total = np.asarray(per_dumpster["mean"]) if dumpster_uids else np.zeros(0)
+    result["total_overflow_minutes"] = float(total.sum())
+    return result
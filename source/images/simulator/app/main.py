@@ -1,14 +1,20 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import os
+import random
 from datetime import datetime
 from pathlib import Path
 
 import simpy
 
-from agents import Clock, Dispatcher, Vehicle, House
+from agents import Clock, Checkpoint, Dispatcher, Vehicle, House, HouseEmission, EmissionCalendar
+from agents import latest_snapshot, load_snapshot, FixedInterval, POLICIES
 from resources import Dumpster
-from data import save_to_csv, load_from_json
+from data import StateStore, StreamingSink, all_row, save_to_csv, save_to_json
+from data import FORMATS, save_columns, load_bundle
+from routing import RouteCache, Trajectory
+from profiling import Profiler
 
 
 class City(simpy.Environment):
@@ -16,33 +22,82 @@ class City(simpy.Environment):
     '''
     debug = False
 
-    def __init__(self, **kwargs):
+    def __init__(self, routes=None, sink=None, emission="house", seed=None, keep_states=True, clock=600,
+                 profile=False, profile_filename=None, checkpoint_directory=None, checkpoint_interval=3600,
+                 calendar=None, telemetry=None, house_sample=0.0, **kwargs):
         super(City, self).__init__(**kwargs)
 
-        self._clock = Clock(self, timeout=600)
+        # Учёт событий и времени обработки по агентам
+        self.profiler = Profiler(self) if profile else None
+
+        # Генератор случайных чисел симуляции
+        self.random = random.Random(seed)
+        # Сохранение состояний агентов
+        self.keep_states = keep_states
+
+        # Потоковая запись состояний (если не задана, состояния хранятся в памяти)
+        self.sink = sink
+
+        # Кэш маршрутов OSRM, общий для всех автомобилей
+        self.routes = routes if routes is not None else RouteCache()
+
+        self._clock = Clock(self, timeout=clock, profile_filename=profile_filename) if clock else None
+
+        # Периодическое сохранение контрольных точек
+        self._checkpoint = None
+        if checkpoint_directory is not None:
+            self._checkpoint = Checkpoint(self, checkpoint_directory, interval=checkpoint_interval)
 
         self.dispatchers = list()
-        self._dispatcher_states = list()
+        self._dispatcher_states = StateStore(Dispatcher.state_schema)
 
         self.vehicles = list()
-        self._vehicle_states = list()
+        self._vehicle_states = StateStore(Vehicle.state_schema)
+        # Политика записи положения автомобилей (по умолчанию - каждые 10 секунд)
+        self.telemetry = telemetry if telemetry is not None else FixedInterval(10)
+        # Свободные автомобили, ожидающие назначения наряда
+        self._idle = dict()
+
+        # Календарь генерации мусора (по умолчанию - вероятности по часам суток)
+        self.calendar = calendar if calendar is not None else EmissionCalendar(House.emission_probabilty_by_hours)
 
         self._houses = dict()
-        self._house_states = list()
+        self._house_states = StateStore(House.state_schema)
+        # Модель генерации мусора: "house" - процесс на каждый дом,
+        # "aggregated" - общий процесс для всех домов (house_sample - доля домов,
+        # состояние которых сохраняется на каждом такте)
+        assert emission in ("house", "aggregated"), f"emission: {emission}"
+        self.emission = HouseEmission(self, sample=house_sample) if emission == "aggregated" else None
 
         self._dumpsters = dict()
-        self._dumpster_states = list()
+        self._dumpster_states = StateStore(Dumpster.state_schema)
+
+        # Пороговый уровень заполненности контейнерной площадки для сводных показателей
+        self.dumpster_threshold = 0.7
+        # Последние учтённые уровень, превышение порога и переполнение площадок
+        self._dumpster_levels = dict()
+        # Сводные показатели, обновляемые по событиям агентов
+        self.totals = dict(
+            dumpster_load=0.0,
+            dumpsters_over_threshold=0,
+            dumpsters_overflowing=0,
+            vehicle_load=0.0,
+            orders_open=0
+        )
 
     @property
     def status(self):
         '''
         '''
-        # Текущая загрузка всех мусорных контейнеров
-        total_dumpster_load = 0
-        for _, dumpster in self._dumpsters.items():
-            total_dumpster_load += dumpster.state["value"]
-
-        return {"total_dumpster_load": round(total_dumpster_load, 1)}
+        totals = self.totals
+        return {
+            "total_dumpster_load": round(totals["dumpster_load"], 1),
+            "dumpsters_over_threshold": totals["dumpsters_over_threshold"],
+            "dumpsters_overflowing": totals["dumpsters_overflowing"],
+            "total_vehicle_load": round(totals["vehicle_load"], 1),
+            "orders_open": totals["orders_open"],
+            "routes": self.routes.stats
+        }
 
     def add_dispatcher(self, **kwargs):
         '''
@@ -53,74 +108,278 @@ class City(simpy.Environment):
         '''
         '''
         # assert isinstance(vehicle, Vehicle)
-        self.vehicles.append(Vehicle(self, **kwargs))
+        vehicle = Vehicle(self, **kwargs)
+        self.vehicles.append(vehicle)
+        self.update_vehicle_load(vehicle.value)
 
     def add_house(self, **kwargs):
         '''
         '''
         # assert isinstance(vehicle, Vehicle)
+        if self.emission is not None:
+            self.emission.add(**kwargs)
+            return
         uid = kwargs["uid"]
         self._houses[uid] = House(self, **kwargs)
 
     def add_dumpster(self, uid, latitude, longitude, capacity, count=1):
         ''' Добавляет контейнерную площадку
         '''
-        self._dumpsters[uid] = Dumpster(self, uid, latitude, longitude, capacity=capacity, count=count)
+        dumpster = Dumpster(self, uid, latitude, longitude, capacity=capacity, count=count)
+        self._dumpsters[uid] = dumpster
+        self._dumpster_levels[uid] = (0, False, False)
+        self.update_dumpster(dumpster)
+
+    def update_dumpster(self, dumpster):
+        ''' Учитывает изменение состояния контейнерной площадки в сводных показателях
+             и передаёт его диспетчерам
+        '''
+        level = dumpster.resource.level
+        percent_level = dumpster.percent_level
+        over_threshold = percent_level > self.dumpster_threshold
+        overflowing = percent_level > 1.0
+
+        previous_level, previous_over_threshold, previous_overflowing = self._dumpster_levels[dumpster.uid]
+        self._dumpster_levels[dumpster.uid] = (level, over_threshold, overflowing)
+
+        totals = self.totals
+        totals["dumpster_load"] += level - previous_level
+        totals["dumpsters_over_threshold"] += over_threshold - previous_over_threshold
+        totals["dumpsters_overflowing"] += overflowing - previous_overflowing
+
+        for dispatcher in self.dispatchers:
+            dispatcher.update_dumpster(dumpster)
+
+    def update_vehicle_load(self, value):
+        ''' Учитывает изменение загрузки мусорного автомобиля
+        '''
+        self.totals["vehicle_load"] += value
+
+    def update_orders(self, count):
+        ''' Учитывает изменение количества открытых нарядов
+        '''
+        self.totals["orders_open"] += count
 
     def get_dumpster(self, uid):
         '''
         '''
         return self._dumpsters[uid]
 
+    def get_dispatcher(self, uid):
+        ''' Возвращает диспетчера по идентификатору
+        '''
+        for dispatcher in self.dispatchers:
+            if dispatcher.uid == uid:
+                return dispatcher
+        raise KeyError(uid)
+
+    @property
+    def idle_vehicles(self):
+        ''' Свободные автомобили, ожидающие назначения наряда
+        '''
+        return list(self._idle.values())
+
+    def request_order(self, vehicle):
+        ''' Регистрирует свободный автомобиль и возвращает назначенный ему наряд (или None)
+        '''
+        self._idle[vehicle.uid] = vehicle
+        self.assign_orders()
+        return vehicle.order
+
+    def release_vehicle(self, vehicle):
+        ''' Исключает автомобиль из свободных (например, на время движения в гараж)
+        '''
+        self._idle.pop(vehicle.uid, None)
+
+    def complete_order(self, order):
+        ''' Отмечает наряд выполненным
+        '''
+        self.get_dispatcher(order.dispatcher_uid).complete(order)
+
+    def assign_orders(self):
+        ''' Назначает ожидающие наряды свободным автомобилям
+             - наряды всех диспетчеров назначаются в порядке создания
+             - наряд получает ближайший по времени движения автомобиль
+        '''
+        while self._idle:
+            orders = [dispatcher.next_order for dispatcher in self.dispatchers if dispatcher.pending]
+            if not orders:
+                return
+            order = min(orders, key=lambda order: order.created_at)
+            vehicle = self.nearest_vehicle(order)
+            self.get_dispatcher(order.dispatcher_uid).assign(order, vehicle.uid)
+            vehicle.order = order
+            del self._idle[vehicle.uid]
+            self.prefetch_order(order, vehicle)
+
+    def prefetch_order(self, order, vehicle):
+        ''' Заранее запрашивает маршруты наряда для назначенного автомобиля
+             - маршрут через контейнерные площадки из следующего положения автомобиля
+             - маршрут на полигон из конечной точки этого маршрута
+             - маршрут объезда выигрывает только у наряда, назначенного автомобилю в гараже
+               (автомобиль начнёт его после ожидания); автомобиль, сам запросивший наряд,
+               сразу запрашивает этот маршрут синхронно, и опережает движение лишь маршрут на полигон
+        '''
+        position = vehicle.next_position
+        if position is None:
+            return
+        latitude, longitude = position
+        start = (longitude, latitude)
+        points = [(dumpster.longitude, dumpster.latitude) for dumpster in order.dumpsters.values()]
+        target = (order.target["longitude"], order.target["latitude"])
+        future = self.routes.prefetch_trip([start] + points)
+        future.add_done_callback(lambda future: self._prefetch_unload(future, start, target))
+
+    def _prefetch_unload(self, future, start, target):
+        ''' Заранее запрашивает маршрут на полигон после объезда контейнерных площадок
+        '''
+        try:
+            route = future.result()
+        except Exception:
+            return
+        if route is None or route.get("code") != "Ok":
+            return
+        end = Trajectory(route).end
+        if end is not None:
+            latitude, longitude = end
+            start = (longitude, latitude)
+        self.routes.prefetch_route([start, target])
+
+    def nearest_vehicle(self, order):
+        ''' Возвращает свободный автомобиль, ближайший по времени движения к первой площадке наряда
+             - время движения берётся из кэша маршрутов (сервис table)
+        '''
+        vehicles = list(self._idle.values())
+        if len(vehicles) == 1:
+            return vehicles[0]
+        coordinates = list()
+        for vehicle in vehicles:
+            latitude, longitude = vehicle.next_position or vehicle.position
+            coordinates.append((longitude, latitude))
+        dumpster = next(iter(order.dumpsters.values()))
+        coordinates.append((dumpster.longitude, dumpster.latitude))
+        # Положения автомобилей редко повторяются: результат не сохраняется на диск
+        result = self.routes.table(coordinates, range(len(vehicles)), [len(vehicles)], persist=False)
+        if result.get("code") != "Ok":
+            return vehicles[0]
+        durations = [row[0] if row[0] is not None else float("inf") for row in result["durations"]]
+        return vehicles[durations.index(min(durations))]
+
+    def snapshot(self):
+        ''' Возвращает состояние симуляции для контрольной точки
+             - история состояний агентов в контрольную точку не входит
+        '''
+        if self.emission is not None:
+            houses = self.emission.snapshot()
+        else:
+            houses = {uid: house.snapshot() for uid, house in self._houses.items()}
+        return dict(
+            now=self.now,
+            random=self.random.getstate(),
+            orders_open=self.totals["orders_open"],
+            idle=list(self._idle),
+            dumpsters={uid: dumpster.snapshot() for uid, dumpster in self._dumpsters.items()},
+            dispatchers={dispatcher.uid: dispatcher.snapshot() for dispatcher in self.dispatchers},
+            vehicles={vehicle.uid: vehicle.snapshot() for vehicle in self.vehicles},
+            houses=houses
+        )
+
+    def restore(self, snapshot):
+        ''' Восстанавливает состояние симуляции из контрольной точки
+             - вызывается до запуска симуляции, агенты должны быть добавлены заранее
+        '''
+        assert self.now == snapshot["now"], f"now: {self.now}, snapshot: {snapshot['now']}"
+        self.random.setstate(snapshot["random"])
+        for uid, dumpster in snapshot["dumpsters"].items():
+            self._dumpsters[uid].restore(dumpster)
+
+        orders = dict()
+        for dispatcher in self.dispatchers:
+            dispatcher.restore(snapshot["dispatchers"][dispatcher.uid])
+            for order_uid, order in dispatcher.orders.items():
+                orders[str(order_uid)] = order
+        self.totals["orders_open"] = snapshot["orders_open"]
+
+        for vehicle in self.vehicles:
+            vehicle.restore(snapshot["vehicles"][vehicle.uid], orders)
+        vehicles = {vehicle.uid: vehicle for vehicle in self.vehicles}
+        self._idle = {uid: vehicles[uid] for uid in snapshot["idle"]}
+
+        if self.emission is not None:
+            self.emission.restore(snapshot["houses"])
+        else:
+            for uid, house in self._houses.items():
+                house.restore(snapshot["houses"][uid])
+
     def set_house_state(self, state):
         ''' Сохраняет состояние дома
         '''
-        self._house_states.append(state)
+        if not self.keep_states:
+            return
+        if self.sink is not None:
+            self.sink.put("house", state)
+        else:
+            self._house_states.append(state)
 
     def house_states(self, uid=None, timestamp_after=None, timestamp_before=None):
         '''
         '''
-        for state in self._house_states:
-            yield state
+        yield from self._house_states.iterate(uid, timestamp_after, timestamp_before)
 
     def set_dumpster_state(self, state):
         ''' Сохраняет состояние мусорного контейнера
         '''
-        self._dumpster_states.append(state)
+        if not self.keep_states:
+            return
+        if self.sink is not None:
+            self.sink.put("dumpster", state)
+        else:
+            self._dumpster_states.append(state)
 
     def dumpster_states(self, uid=None, timestamp_after=None, timestamp_before=None):
         '''
         '''
-        for state in self._dumpster_states:
-            yield state
+        yield from self._dumpster_states.iterate(uid, timestamp_after, timestamp_before)
 
     def set_dispatcher_state(self, state):
         ''' Сохраняет состояние диспетчера
         '''
-        self._vehicle_states.append(state)
+        self._dispatcher_states.append(state)
 
     def dispatcher_states(self, uid=None, timestamp_after=None, timestamp_before=None):
         '''
         '''
-        for state in self._dispatcher_states:
-            yield state
+        yield from self._dispatcher_states.iterate(uid, timestamp_after, timestamp_before)
 
     def set_vehicle_state(self, state):
         ''' Сохраняет состояние мусорного автомобиля
         '''
-        self._vehicle_states.append(state)
+        if not self.keep_states:
+            return
+        if self.sink is not None:
+            self.sink.put("vehicle", state)
+        else:
+            self._vehicle_states.append(state)
 
     def vehicle_states(self, uid=None, timestamp_after=None, timestamp_before=None):
         '''
         '''
-        for state in self._vehicle_states:
-            yield state
+        yield from self._vehicle_states.iterate(uid, timestamp_after, timestamp_before)
 
+    def state_stores(self):
+        ''' Хранилища состояний агентов по типам
+        '''
+        return {
+            "vehicle": self._vehicle_states,
+            "house": self._house_states,
+            "dumpster": self._dumpster_states,
+        }
 
-def simulate(dispatchers, dumpsters, houses, vehicles, start_time=0, finish_time=None):
-    '''
+
+def create_city(dispatchers, dumpsters, houses, vehicles, start_time=0, **kwargs):
+    ''' Создаёт город с агентами сценария
     '''
-    city = City(initial_time=start_time)
+    city = City(initial_time=start_time, **kwargs)
 
     for dispatcher in dispatchers:
         assert isinstance(dispatcher, dict)
@@ -134,13 +393,59 @@ def simulate(dispatchers, dumpsters, houses, vehicles, start_time=0, finish_time
     for vehicle in vehicles:
         assert isinstance(vehicle, dict)
         city.add_vehicle(**vehicle)
+    return city
 
+
+def simulate(dispatchers, dumpsters, houses, vehicles, start_time=0, finish_time=None, routes=None, sink=None,
+             emission="house", seed=None, keep_states=True, clock=600, profile=False, profile_filename=None,
+             checkpoint_directory=None, checkpoint_interval=3600, calendar=None, telemetry=None, house_sample=0.0):
+    '''
+    '''
+    city = create_city(
+        dispatchers,
+        dumpsters,
+        houses,
+        vehicles,
+        start_time=start_time,
+        routes=routes,
+        sink=sink,
+        emission=emission,
+        seed=seed,
+        keep_states=keep_states,
+        clock=clock,
+        profile=profile,
+        profile_filename=profile_filename,
+        checkpoint_directory=checkpoint_directory,
+        checkpoint_interval=checkpoint_interval,
+        calendar=calendar,
+        telemetry=telemetry,
+        house_sample=house_sample
+    )
     city.run(until=finish_time)
     return city
 
 
-def main():
+def resume(filename, dispatchers, dumpsters, houses, vehicles, start_time=0, finish_time=None, **kwargs):
+    ''' Продолжает симуляцию с контрольной точки
+         - сценарий должен совпадать со сценарием прерванной симуляции
     '''
+    snapshot = load_snapshot(filename)
+    print(f"Resuming simulation from {filename}", flush=True)
+    city = create_city(
+        dispatchers,
+        dumpsters,
+        houses,
+        vehicles,
+        start_time=snapshot["now"],
+        **kwargs
+    )
+    city.restore(snapshot)
+    city.run(until=finish_time)
+    return city
+
+
+def load_scenario():
+    ''' Загружает сценарий симуляции из реестров
     '''
     start_time = 1555534800
     finish_time = 1555621200
@@ -150,103 +455,14 @@ def main():
     dispatchers.append(dict(uid="1", name="Нижэкология-НН", timeout=600))
     dispatchers.append(dict(uid="2", name="Управление отходами-НН", timeout=600))
 
-    # Мусорные контейнеры
-    dumpsters = list()
-    dumpsters_uids = list()
-    dumpsters_info = load_from_json("/data/Реестр контейнерных площадок.json")
-    for dumpster_uid, dumpster in dumpsters_info.items():
-        try:
-            location = dumpster["Расположение"][0]["location"]
-            longitude, latitude = location
-        except:
-            print(f"Нет данных о расположении контейнерной площадки '{dumpster_uid}'", flush=True)
-            continue
-
-        area = dumpster.get("Округ", "")
-        if area is None:
-            area = ""
-        # if "Советский" not in area:
-        #     continue
-        if "Нижегородский" not in area:
-            continue
-
-        capacity = dumpster["Вместимомть"]
-        try:
-            if capacity:
-                capacity = float(capacity)
-                capacity = round(float(capacity) * 1000)
-            else:
-                print(f"Нет данных о вместимости контейнерной площадки '{dumpster_uid}': {capacity}", flush=True)
-                continue
-        except ValueError:
-            print(f"Нет данных о вместимости контейнерной площадки '{dumpster_uid}': {capacity}", flush=True)
-            continue
-            
-        count = dumpster["Количество"]
-        if count:
-            count = int(count)
-        else:
-            print(f"Нет данных о количестве контейнеров на площадке'{dumpster_uid}': {count}", flush=True)
-            continue
-        dumpsters.append(dict(
-            uid=dumpster_uid,
-            latitude=latitude,
-            longitude=longitude,
-            capacity=capacity,
-            count=count
-        ))
-        dumpsters_uids.append(dumpster_uid)
-
-    # Жилые дома
-    houses_info = load_from_json("/data/Реестр жилых домов.json")
-    houses_coords = load_from_json("/data/Координаты жилых домов.json")
-    houses_dumpsters = load_from_json("/data/Ближайшие контейнерные площадки.json")
-    houses = list()
-    for house in houses_info:
-        address = house["address"]["fullname"]
-        
-        total_area = house.get("Общая площадь здания", "0")
-        try:
-            total_area = float(total_area.replace("м2", "").strip())
-        except ValueError:
-            if not total_area:
-                total_area = None
-            else:
-                print(f"Неверный формат {total_area}", flush=True)
-
-        living_area = house.get("Общая площадь жилых помещений", "0")
-        try:
-            living_area = float(living_area.replace("м2", "").strip())
-        except ValueError:
-            if not living_area:
-                living_area = None
-            else:
-                print(f"Неверный формат {living_area}", flush=True)
-
-        daily_emission = 0
-        if living_area:
-            daily_emission = round(living_area * 0.1 * 1000 / 365.0)
-        elif total_area:
-            daily_emission = round(total_area * 0.6 * 0.1 * 1000 / 365.0)
-
-        coords = houses_coords.get(address)
-        dumpster = houses_dumpsters.get(address)
-        if coords is None:
-            continue
-        if dumpster is None:
-            continue
-        dumpster_uid = dumpster["uid"]
-        if dumpster_uid not in dumpsters_uids:
-            continue
-        latitude = coords["lat"]
-        longitude = coords["lng"]
-        houses.append(dict(
-            uid=address,
-            latitude=latitude,
-            longitude=longitude,
-            dumpster_uid=dumpster_uid,
-            daily_emission=daily_emission
-        ))
+    # Контейнерные площадки и жилые дома округа из скомпилированных реестров
+    bundle = load_bundle(
+        os.getenv("SCENARIO_DATA", "/data"),
+        os.getenv("SCENARIO_CACHE", "/data/cache/scenario")
+    )
+    district = os.getenv("DISTRICT", "Нижегородский") or None
+    dumpsters = bundle.dumpsters(district)
+    houses = bundle.houses(district)
 
     # Мусороуборочные автомобили
     vehicles = list()
@@ -273,46 +489,134 @@ def main():
     ))
     # vehicles.append(dict(uid="2", number="515", owner="ДЭП", capacity=20, value=8.5))
 
-    result = simulate(
-        dispatchers,
-        dumpsters,
-        houses,
-        vehicles,
+    return dict(
+        dispatchers=dispatchers,
+        dumpsters=dumpsters,
+        houses=houses,
+        vehicles=vehicles,
         start_time=start_time,
         finish_time=finish_time
     )
 
-    # Сохранение результатов симуляции
+
+def routing_options():
+    ''' Возвращает параметры кэша маршрутов
+         - ROUTING_BACKEND=local: встроенный маршрутизатор по выгрузке OSM (OSM_FILE) вместо OSRM
+    '''
+    if os.getenv("ROUTING_BACKEND", "osrm") != "local":
+        return dict(directory="/data/cache/routes")
+    from osmrouting import Router
+    filename = os.getenv("OSM_FILE", "/data/osm/nn-latest.osm.pbf")
+    print(f"Loading road graph from {filename}", flush=True)
+    router = Router.from_osm(filename, "car", cache="/data/cache/graphs")
+    return dict(directory="/data/cache/routes/local", backend=router)
+
+
+def main():
+    '''
+    '''
+    scenario = load_scenario()
+    routes = routing_options()
+    emission = os.getenv("EMISSION_MODEL", "house")
+
+    # Каталог результатов симуляции
     dt = datetime.now()
     path = Path(f"/data/result/{dt:%Y-%m-%d-%H-%M-%S}")
+
+    # Серия независимых прогонов сценария
+    replicates = int(os.getenv("REPLICATES", "0"))
+    if replicates:
+        from ensemble import run_ensemble
+        summary = run_ensemble(
+            scenario,
+            replicates,
+            processes=int(os.getenv("PROCESSES", "0")) or None,
+            seed=int(os.getenv("SEED", "0")) or None,
+            routes=routes,
+            emission=emission
+        )
+        print(f"Saving ensemble summary to {path}", flush=True)
+        save_to_json(path / "ensemble.json", summary)
+        return
+
+    # Профилирование симуляции
+    profile = os.getenv("PROFILE", "") == "1"
+    profile_filename = path / "profile.json" if profile else None
+
+    # Формат результатов: csv, npy (каталог файлов NumPy) или parquet
+    output_format = os.getenv("OUTPUT_FORMAT", "csv")
+    assert output_format in FORMATS, f"OUTPUT_FORMAT: {output_format}"
+
+    # Потоковая запись результатов во время симуляции (только CSV)
+    sink = None
+    if os.getenv("OUTPUT_MODE", "memory") == "stream":
+        assert output_format == "csv", f"OUTPUT_MODE=stream requires OUTPUT_FORMAT=csv, got {output_format}"
+        sink = StreamingSink(path, compress=os.getenv("OUTPUT_COMPRESS", "") == "1")
+        print(f"Streaming simulation result to {path}", flush=True)
+
+    # Политика записи положения автомобилей: interval, step или tolerance
+    telemetry = os.getenv("TELEMETRY", "interval")
+    if telemetry == "interval":
+        telemetry = POLICIES[telemetry](int(os.getenv("TELEMETRY_INTERVAL", "10")))
+    elif telemetry == "tolerance":
+        telemetry = POLICIES[telemetry](float(os.getenv("TELEMETRY_TOLERANCE", "10")))
+    else:
+        telemetry = POLICIES[telemetry]()
+
+    # Контрольные точки и продолжение прерванной симуляции
+    checkpoint_directory = os.getenv("CHECKPOINT_DIR") or None
+    checkpoint_interval = int(os.getenv("CHECKPOINT_INTERVAL", "3600"))
+    snapshot = None
+    if checkpoint_directory and os.getenv("RESUME", "") == "1":
+        snapshot = latest_snapshot(checkpoint_directory)
+        if snapshot is None:
+            print(f"No checkpoint found in {checkpoint_directory}", flush=True)
+
+    try:
+        options = dict(
+            routes=RouteCache(**routes),
+            sink=sink,
+            emission=emission,
+            profile=profile,
+            profile_filename=profile_filename,
+            checkpoint_directory=checkpoint_directory,
+            checkpoint_interval=checkpoint_interval,
+            telemetry=telemetry,
+            house_sample=float(os.getenv("HOUSE_SAMPLE", "0"))
+        )
+        if snapshot is not None:
+            result = resume(snapshot, **options, **scenario)
+        else:
+            result = simulate(**options, **scenario)
+    except BaseException:
+        # Ошибка записи не должна заменять исключение симуляции
+        if sink is not None:
+            sink.close(raise_error=False)
+        raise
+    if sink is not None:
+        sink.close()
+    print(f"Route cache: {result.routes.stats}", flush=True)
+    if result.profiler is not None:
+        print(f"Saving profile report to {profile_filename}", flush=True)
+        result.profiler.save(profile_filename)
+    if sink is not None:
+        print(f"Saved states: {sink.counters}", flush=True)
+        return
+
+    # Сохранение результатов симуляции
     print(f"Saving simulation result to {path}", flush=True)
+    if output_format != "csv":
+        for kind, store in result.state_stores().items():
+            save_columns(path, kind, store, format=output_format)
+        return
+
     save_to_csv(path / "vehicles.csv", list(result.vehicle_states()))
     save_to_csv(path / "houses.csv", list(result.house_states()))
     save_to_csv(path / "dumpster.csv", list(result.dumpster_states()))
 
     all_data = list()
     for vehicle in result.vehicle_states():
-        all_data.append({
-            "timestamp": vehicle["timestamp"],
-            "uid": vehicle["uid"],
-            "type":"vehicle",
-            "latitude": vehicle["latitude"],
-            "longitude": vehicle["longitude"],
-            "radius": 2,
-            "capacity": vehicle["capacity"],
-            "value": vehicle["value"],
-            "percent_level": vehicle["percent_level"]
-        })
+        all_data.append(all_row("vehicle", vehicle))
     for dumpster in result.dumpster_states():
-        all_data.append({
-            "timestamp": dumpster["timestamp"],
-            "uid": dumpster["uid"],
-            "type":"dumpster",
-            "latitude": dumpster["latitude"],
-            "longitude": dumpster["longitude"],
-            "radius": 10,
-            "capacity": dumpster["capacity"],
-            "value": dumpster["value"],
-            "percent_level": dumpster["percent_level"]
-        })
+        all_data.append(all_row("dumpster", dumpster))
     save_to_csv(path / "all.csv", all_data)
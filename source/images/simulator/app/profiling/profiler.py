@@ -0,0 +1,143 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import json
+import time
+from heapq import heappop
+from pathlib import Path
+
+from simpy.core import EmptySchedule
+
+
+def process_name(process):
+    ''' Возвращает имя генератора процесса SimPy (например, "House.run")
+    '''
+    generator = getattr(process, "_generator", None)
+    if generator is None:
+        return None
+    return generator.__qualname__
+
+
+def callback_name(callback):
+    ''' Возвращает имя обработчика события
+         - для возобновления процесса используется имя его генератора
+    '''
+    owner = getattr(callback, "__self__", None)
+    name = process_name(owner)
+    if name is not None:
+        return name
+    return getattr(callback, "__qualname__", type(callback).__name__)
+
+
+class Profiler():
+    ''' Учёт событий и времени обработки по агентам симуляции
+         - количество запланированных событий по процессам
+         - количество вызовов и время работы обработчиков событий
+         - время ожидания ответов OSRM: блокирующее симуляцию (синхронные запросы и ожидание
+           предварительных) и общее время запросов, включая выполненные в пуле потоков
+    '''
+
+    def __init__(self, env):
+        self.env = env
+        # Запланированные события по процессам
+        self.scheduled = dict()
+        # Вызовы обработчиков: имя -> [количество, секунды]
+        self.callbacks = dict()
+        # Количество обработанных событий
+        self.events = 0
+        # Время начала учёта
+        self.started = time.perf_counter()
+
+        # Замена методов окружения на методы с учётом событий
+        self._schedule = env.schedule
+        env.schedule = self.schedule
+        env.step = self.step
+
+    def schedule(self, event, priority=1, delay=0):
+        ''' Планирует событие с учётом процесса, который его создал
+        '''
+        name = process_name(self.env.active_process) or "Environment"
+        self.scheduled[name] = self.scheduled.get(name, 0) + 1
+        self._schedule(event, priority, delay)
+
+    def step(self):
+        ''' Обрабатывает следующее событие (аналог simpy.Environment.step)
+        '''
+        env = self.env
+        try:
+            env._now, _, _, event = heappop(env._queue)
+        except IndexError:
+            raise EmptySchedule()
+
+        callbacks, event.callbacks = event.callbacks, None
+        for callback in callbacks:
+            started = time.perf_counter()
+            callback(event)
+            elapsed = time.perf_counter() - started
+            name = callback_name(callback)
+            stats = self.callbacks.get(name)
+            if stats is None:
+                stats = self.callbacks[name] = [0, 0.0]
+            stats[0] += 1
+            stats[1] += elapsed
+        self.events += 1
+
+        if not event._ok and not hasattr(event, '_defused'):
+            exc = type(event._value)(*event._value.args)
+            exc.__cause__ = event._value
+            raise exc
+
+    @property
+    def agents(self):
+        ''' Количество вызовов и время обработки по типам агентов
+        '''
+        agents = dict()
+        for name, (count, seconds) in self.callbacks.items():
+            agent = name.split(".")[0]
+            stats = agents.setdefault(agent, dict(calls=0, seconds=0.0))
+            stats["calls"] += count
+            stats["seconds"] += seconds
+        return agents
+
+    def report(self):
+        ''' Возвращает отчёт
+        '''
+        wall_time = time.perf_counter() - self.started
+        routes = self.env.routes.stats
+        return dict(
+            now=self.env.now,
+            wall_time=wall_time,
+            events=self.events,
+            events_per_second=self.events / wall_time if wall_time else None,
+            scheduled=dict(self.scheduled),
+            callbacks={
+                name: dict(calls=count, seconds=seconds)
+                for name, (count, seconds) in sorted(
+                    self.callbacks.items(), key=lambda item: item[1][1], reverse=True)
+            },
+            agents=self.agents,
+            osrm=dict(
+                requests=routes["requests"],
+                seconds=routes["request_time"],
+                blocked=routes["fetch_time"] + routes["prefetch_wait"]
+            )
+        )
+
+    def summary(self):
+        ''' Возвращает краткую строку для вывода в консоль
+        '''
+        report = self.report()
+        agents = ", ".join([
+            f"{name}: {stats['seconds']:.1f}s"
+            for name, stats in sorted(report["agents"].items(), key=lambda item: item[1]["seconds"], reverse=True)
+        ])
+        return (f"events: {report['events']} ({report['events_per_second'] or 0:.0f}/s), "
+                f"osrm: {report['osrm']['requests']} requests {report['osrm']['seconds']:.1f}s "
+                f"(blocked {report['osrm']['blocked']:.1f}s), {agents}")
+
+    def save(self, filename):
+        ''' Сохраняет отчёт в JSON-файл
+        '''
+        path = Path(filename)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(self.report(), ensure_ascii=False, indent=4), encoding="utf-8")
@@ -1,6 +1,8 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import uuid
+
 import simpy
 
 
@@ -8,6 +10,25 @@ class Dumpster():
     ''' Площадка с мусорными контейнерами
     '''
 
+    # Атрибуты экземпляра (без словаря атрибутов)
+    __slots__ = (
+        "env", "uid", "latitude", "longitude", "count", "capacity",
+        "order_uid", "overflow_time", "overflow_since", "resource"
+    )
+
+    # Схема состояния контейнерной площадки
+    state_schema = (
+        ("timestamp", "i8"),
+        ("uid", "U"),
+        ("latitude", "f8"),
+        ("longitude", "f8"),
+        ("count", "i8"),
+        ("capacity", "i8"),
+        ("value", "f8"),
+        ("percent_level", "f8"),
+        ("overflow", "?"),
+    )
+
     def __init__(self, env, uid, latitude, longitude, capacity, count=1, init=0.1):
         '''
         '''
@@ -27,6 +48,9 @@ class Dumpster():
         self.capacity = capacity * self.count
         # Наряд на вывоз мусора
         self.order_uid = None
+        # Суммарное время переполнения, секунд, и момент начала текущего переполнения
+        self.overflow_time = 0
+        self.overflow_since = None
         self.resource = simpy.Container(
             self.env,
             capacity=self.capacity * 10,
@@ -61,11 +85,29 @@ class Dumpster():
         ''' Устанавливает наряд на вывоз мусора
         '''
         self.order_uid = order_uid
+        self.env.update_dumpster(self)
+
+    @property
+    def overflow_duration(self):
+        ''' Суммарное время переполнения с учётом текущего, секунд
+        '''
+        if self.overflow_since is None:
+            return self.overflow_time
+        return self.overflow_time + self.env.now - self.overflow_since
 
     def callback(self, event):
         '''
         '''
+        # Учёт времени переполнения
+        overflow = self.resource.level > self.capacity
+        if overflow and self.overflow_since is None:
+            self.overflow_since = self.env.now
+        elif not overflow and self.overflow_since is not None:
+            self.overflow_time += self.env.now - self.overflow_since
+            self.overflow_since = None
+
         self.env.set_dumpster_state(self.state)
+        self.env.update_dumpster(self)
 
     @property
     def value(self):
@@ -74,9 +116,12 @@ class Dumpster():
     def clear(self):
         ''' Очищает мусорный контейнер
         '''
+        self.order_uid = None
+        if not self.value:
+            self.env.update_dumpster(self)
+            return
         p = self.resource.get(self.value)
         p.callbacks.append(self.callback)
-        self.order_uid = None
         yield p
 
     def add(self, value):
@@ -88,3 +133,27 @@ class Dumpster():
             yield p
         except ValueError:
             print(f"Container '{self.uid}' is overflow", flush=True)
+
+    def snapshot(self):
+        ''' Возвращает состояние для контрольной точки
+        '''
+        return dict(
+            level=self.resource.level,
+            order_uid=str(self.order_uid) if self.order_uid else None,
+            overflow_time=self.overflow_time,
+            overflow_since=self.overflow_since
+        )
+
+    def restore(self, snapshot):
+        ''' Восстанавливает состояние из контрольной точки
+        '''
+        self.resource = simpy.Container(
+            self.env,
+            capacity=self.resource.capacity,
+            init=snapshot["level"]
+        )
+        order_uid = snapshot["order_uid"]
+        self.order_uid = uuid.UUID(order_uid) if order_uid else None
+        self.overflow_time = snapshot["overflow_time"]
+        self.overflow_since = snapshot["overflow_since"]
+        self.env.update_dumpster(self)
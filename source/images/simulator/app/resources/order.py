@@ -7,7 +7,14 @@ import simpy
 class Order():
     ''' Наряд на вывоз мусора
     '''
-    def __init__(self, env, uid, dumpsters, target):
+
+    # Атрибуты экземпляра (без словаря атрибутов)
+    __slots__ = (
+        "env", "uid", "dumpsters", "target", "dispatcher_uid", "vehicle_uid",
+        "status", "created_at", "assigned_at", "completed_at", "resource"
+    )
+
+    def __init__(self, env, uid, dumpsters, target, dispatcher_uid=None):
         '''
         '''
         self.env = env
@@ -17,8 +24,16 @@ class Order():
         self.dumpsters = dumpsters
         # Полигон, на который вывозится мусор
         self.target = target
+        # Диспетчер, сформировавший наряд
+        self.dispatcher_uid = dispatcher_uid
         # Идентификатор автомобиля, который выполняет наряд
         self.vehicle_uid = None
+        # Состояние наряда: pending, assigned, completed
+        self.status = "pending"
+        # Время создания, назначения и выполнения наряда
+        self.created_at = env.now
+        self.assigned_at = None
+        self.completed_at = None
         self.resource = simpy.Resource(self.env)
 
     @property
@@ -35,3 +50,27 @@ class Order():
         '''
         assert vehicle_uid
         self.vehicle_uid = vehicle_uid
+        self.status = "assigned"
+        self.assigned_at = self.env.now
+
+    def complete(self):
+        ''' Отмечает наряд выполненным
+        '''
+        self.status = "completed"
+        self.completed_at = self.env.now
+
+    @property
+    def record(self):
+        ''' Краткая запись о наряде
+        '''
+        return dict(
+            uid=str(self.uid),
+            dispatcher_uid=self.dispatcher_uid,
+            vehicle_uid=self.vehicle_uid,
+            status=self.status,
+            dumpsters=list(self.dumpsters),
+            target=self.target,
+            created_at=self.created_at,
+            assigned_at=self.assigned_at,
+            completed_at=self.completed_at
+        )
@@ -0,0 +1,5 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from .cache import RouteCache  # noqa
+from .trajectory import Segment, Trajectory  # noqa
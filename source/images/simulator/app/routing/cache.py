@@ -0,0 +1,301 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import time
+import tempfile
+import hashlib
+import threading
+from pathlib import Path
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class RouteCache():
+    ''' Кэш маршрутов OSRM
+         - в памяти (LRU) и на диске, общий для всех автомобилей
+         - ключ: профиль, сервис, параметры и округлённые координаты
+         - маршруты могут запрашиваться заранее в пуле потоков (prefetch),
+           fetch в этом случае ожидает уже выполняющийся запрос
+         - вместо сервиса OSRM может использоваться встроенный маршрутизатор (backend)
+           с методом query(service, coordinates, params), например osmrouting.Router
+    '''
+
+    def __init__(self, url="http://osrm.vehicle:5000", profile="car",
+                 directory=None, size=4096, precision=6, pool_size=8, workers=4, backend=None, timeout=60):
+        # Адрес сервиса OSRM
+        self.url = url.rstrip("/")
+        # Профиль маршрутизации
+        self.profile = profile
+        # Встроенный маршрутизатор (если не задан, используется сервис OSRM)
+        self.backend = backend
+        # Каталог для хранения маршрутов на диске
+        self.directory = Path(directory) if directory else None
+        # Максимальное количество маршрутов в памяти
+        self.size = size
+        # Количество знаков после запятой в координатах
+        self.precision = precision
+        # Пул HTTP-соединений
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        # Время ожидания ответа OSRM, секунд
+        self.timeout = timeout
+        self._memory = OrderedDict()
+        # Количество потоков для предварительных запросов и сам пул (создаётся по требованию)
+        self.workers = workers
+        self._executor = None
+        # Выполняющиеся предварительные запросы по ключам маршрутов
+        self._pending = dict()
+        self._lock = threading.Lock()
+        # Счётчики обращений к кэшу
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        # Количество запросов к OSRM и время ожидания ответов, секунд (включая запросы в пуле потоков)
+        self.requests = 0
+        self.request_time = 0.0
+        # Время синхронного получения маршрутов в fetch (диск или OSRM), секунд
+        self.fetch_time = 0.0
+        # Предварительные запросы, обращения к ним и время ожидания их завершения, секунд
+        self.prefetched = 0
+        self.prefetch_hits = 0
+        self.prefetch_wait = 0.0
+
+    @property
+    def stats(self):
+        ''' Возвращает счётчики попаданий и промахов
+        '''
+        return dict(
+            hits=self.hits,
+            disk_hits=self.disk_hits,
+            misses=self.misses,
+            size=len(self._memory),
+            requests=self.requests,
+            request_time=round(self.request_time, 3),
+            fetch_time=round(self.fetch_time, 3),
+            prefetched=self.prefetched,
+            prefetch_hits=self.prefetch_hits,
+            prefetch_wait=round(self.prefetch_wait, 3)
+        )
+
+    def round_coordinates(self, coordinates):
+        ''' Округляет координаты точек маршрута
+        '''
+        return [(round(float(longitude), self.precision),
+                 round(float(latitude), self.precision))
+                for longitude, latitude in coordinates]
+
+    def key(self, service, coordinates, params):
+        ''' Формирует ключ маршрута
+        '''
+        points = ";".join([f"{p[0]},{p[1]}" for p in coordinates])
+        query = "&".join([f"{k}={v}" for k, v in sorted(params.items())])
+        return f"{self.profile}/{service}/{points}?{query}"
+
+    def _path(self, service, key):
+        ''' Возвращает путь к файлу маршрута на диске
+        '''
+        digest = hashlib.sha1(key.encode("utf-8")).hexdigest()
+        return self.directory / self.profile / service / digest[:2] / f"{digest}.json"
+
+    def _remember(self, key, route):
+        ''' Сохраняет маршрут в памяти
+        '''
+        with self._lock:
+            self._memory[key] = route
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.size:
+                self._memory.popitem(last=False)
+
+    def _load(self, service, key):
+        ''' Загружает маршрут с диска
+        '''
+        if self.directory is None:
+            return None
+        path = self._path(service, key)
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+        if data.get("key") != key:
+            return None
+        return data.get("route")
+
+    def _save(self, service, key, route):
+        ''' Сохраняет маршрут на диск
+        '''
+        if self.directory is None:
+            return
+        path = self._path(service, key)
+        data = json.dumps(dict(key=key, route=route), ensure_ascii=False)
+        # Уникальный временный файл: один маршрут могут одновременно сохранять
+        # несколько потоков и процессов
+        tmp_name = None
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with tempfile.NamedTemporaryFile("w", encoding="utf-8", dir=path.parent,
+                                             prefix=path.stem, suffix=".tmp", delete=False) as f:
+                tmp_name = f.name
+                f.write(data)
+            os.replace(tmp_name, path)
+        except OSError as e:
+            # Ошибка записи кэша не должна прерывать моделирование
+            print(f"Route cache save failed: {e}", flush=True)
+            if tmp_name is not None and os.path.exists(tmp_name):
+                try:
+                    os.unlink(tmp_name)
+                except OSError:
+                    pass
+
+    def request(self, service, coordinates, params):
+        ''' Выполняет запрос к сервису OSRM или встроенному маршрутизатору
+        '''
+        started = time.perf_counter()
+        try:
+            if self.backend is not None:
+                return self.backend.query(service, coordinates, params)
+            points = ";".join([f"{p[0]},{p[1]}" for p in coordinates])
+            url = f"{self.url}/{service}/v1/{self.profile}/{points}"
+            response = self.session.get(url, params=params, timeout=self.timeout)
+            return response.json()
+        finally:
+            with self._lock:
+                self.requests += 1
+                self.request_time += time.perf_counter() - started
+
+    def _resolve(self, service, coordinates, params, key, persist=True):
+        ''' Загружает маршрут с диска или запрашивает его у OSRM
+             - persist: маршрут хранится на диске (иначе только в памяти)
+        '''
+        route = self._load(service, key) if persist else None
+        if route is not None:
+            self._remember(key, route)
+            with self._lock:
+                self.disk_hits += 1
+            return route
+
+        with self._lock:
+            self.misses += 1
+        route = self.request(service, coordinates, params)
+        # Кэшируются только успешно построенные маршруты
+        if route.get("code") == "Ok":
+            self._remember(key, route)
+            if persist:
+                self._save(service, key, route)
+        return route
+
+    def _prefetch_done(self, key, future):
+        ''' Исключает завершённый предварительный запрос из списка выполняющихся
+        '''
+        with self._lock:
+            if self._pending.get(key) is future:
+                del self._pending[key]
+
+    def fetch(self, service, coordinates, persist=True, **params):
+        ''' Возвращает маршрут из кэша или запрашивает его у OSRM
+             - persist: маршрут хранится на диске (иначе только в памяти)
+        '''
+        coordinates = self.round_coordinates(coordinates)
+        key = self.key(service, coordinates, params)
+
+        with self._lock:
+            route = self._memory.get(key)
+            if route is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return route
+            future = self._pending.get(key)
+
+        # Маршрут уже запрошен заранее
+        if future is not None:
+            started = time.perf_counter()
+            try:
+                route = future.result()
+            except Exception:
+                route = None
+            with self._lock:
+                self.prefetch_hits += 1
+                self.prefetch_wait += time.perf_counter() - started
+            if route is not None:
+                return route
+
+        started = time.perf_counter()
+        try:
+            return self._resolve(service, coordinates, params, key, persist)
+        finally:
+            with self._lock:
+                self.fetch_time += time.perf_counter() - started
+
+    def prefetch(self, service, coordinates, **params):
+        ''' Запрашивает маршрут заранее в пуле потоков
+             - возвращает Future с маршрутом
+        '''
+        coordinates = self.round_coordinates(coordinates)
+        key = self.key(service, coordinates, params)
+
+        with self._lock:
+            route = self._memory.get(key)
+            future = self._pending.get(key)
+            if route is None and future is None:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.workers,
+                        thread_name_prefix="routes"
+                    )
+                try:
+                    future = self._executor.submit(self._resolve, service, coordinates, params, key)
+                except RuntimeError:
+                    # Пул уже завершён (остановка интерпретатора), маршрут будет запрошен при обращении
+                    future = None
+                else:
+                    self._pending[key] = future
+                    self.prefetched += 1
+                    future.add_done_callback(lambda future: self._prefetch_done(key, future))
+        if future is None:
+            future = Future()
+            future.set_result(route)
+        return future
+
+    def close(self):
+        ''' Завершает пул потоков предварительных запросов
+        '''
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def trip(self, coordinates):
+        ''' Маршрут через все точки (задача коммивояжёра)
+        '''
+        return self.fetch("trip", coordinates, steps="true", geometries="geojson")
+
+    def route(self, coordinates):
+        ''' Маршрут между точками в заданном порядке
+        '''
+        return self.fetch("route", coordinates, steps="true", geometries="geojson")
+
+    def table(self, coordinates, sources, destinations, persist=True):
+        ''' Матрица времени движения между точками
+        '''
+        return self.fetch(
+            "table",
+            coordinates,
+            persist=persist,
+            sources=";".join([str(n) for n in sources]),
+            destinations=";".join([str(n) for n in destinations])
+        )
+
+    def prefetch_trip(self, coordinates):
+        ''' Заранее запрашивает маршрут через все точки
+        '''
+        return self.prefetch("trip", coordinates, steps="true", geometries="geojson")
+
+    def prefetch_route(self, coordinates):
+        ''' Заранее запрашивает маршрут между точками в заданном порядке
+        '''
+        return self.prefetch("route", coordinates, steps="true", geometries="geojson")
@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import numpy as np
+
+
+def _round(values, digits=6):
+    ''' Округляет значения массива, возвращая список чисел
+    '''
+    return [round(value, digits) for value in values.tolist()]
+
+
+class Segment():
+    ''' Участок траектории, соответствующий шагу маршрута OSRM
+         - накопленное расстояние вдоль ломаной вычисляется один раз
+         - положение на любой секунде движения вычисляется по запросу
+    '''
+
+    def __init__(self, coordinates, duration, distance=0):
+        points = np.asarray(coordinates, dtype=float).reshape(-1, 2)
+        # Долготы и широты вершин ломаной
+        self.longitudes = points[:, 0]
+        self.latitudes = points[:, 1]
+        # Длины отрезков и накопленное расстояние вдоль ломаной
+        dx, dy = np.diff(self.longitudes), np.diff(self.latitudes)
+        self.lengths = np.sqrt(dx * dx + dy * dy)
+        self.distances = np.concatenate(([0.0], np.cumsum(self.lengths)))
+        # Длительность движения по участку, секунд
+        self.duration = int(round(duration * 2))
+        # Протяжённость участка, метров
+        self.distance = distance
+
+    @property
+    def length(self):
+        ''' Длина ломаной в градусах
+        '''
+        return self.distances[-1]
+
+    def positions(self, ticks):
+        ''' Возвращает широты и долготы на заданных секундах движения
+             - координаты округляются так же, как встроенной функцией round
+        '''
+        ticks = np.asarray(ticks, dtype=float)
+        if not self.duration or not self.length:
+            latitudes = np.full(ticks.shape, self.latitudes[0])
+            longitudes = np.full(ticks.shape, self.longitudes[0])
+            return _round(latitudes), _round(longitudes)
+        distance = ticks / self.duration * self.length
+
+        # Интерполяция в том же порядке операций, что и LineString.interpolate
+        index = np.searchsorted(self.distances[1:], distance, side="right")
+        index = np.minimum(index, len(self.lengths) - 1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            fraction = (distance - self.distances[index]) / self.lengths[index]
+        fraction = np.clip(np.nan_to_num(fraction, nan=1.0), 0.0, 1.0)
+
+        latitudes = (self.latitudes[index + 1] - self.latitudes[index]) * fraction + self.latitudes[index]
+        longitudes = (self.longitudes[index + 1] - self.longitudes[index]) * fraction + self.longitudes[index]
+        return _round(latitudes), _round(longitudes)
+
+    def position(self, tick):
+        ''' Возвращает широту и долготу на заданной секунде движения
+        '''
+        latitudes, longitudes = self.positions([tick])
+        return latitudes[0], longitudes[0]
+
+
+class Trajectory():
+    ''' Траектория движения по маршруту OSRM
+    '''
+
+    def __init__(self, route):
+        try:
+            legs = route["trips"][0]["legs"]
+        except KeyError:
+            legs = route["routes"][0]["legs"]
+
+        # Участки траектории по плечам маршрута
+        self.legs = list()
+        for leg in legs:
+            self.legs.append([
+                Segment(
+                    step["geometry"]["coordinates"],
+                    step["duration"],
+                    step.get("distance", 0)
+                )
+                for step in leg["steps"]
+            ])
+
+    @property
+    def duration(self):
+        ''' Полная длительность движения, секунд
+        '''
+        return sum([segment.duration for leg in self.legs for segment in leg])
+
+    @property
+    def end(self):
+        ''' Положение (широта, долгота) в конце движения по траектории
+             - None, если траектория не содержит движения
+        '''
+        for leg in reversed(self.legs):
+            for segment in reversed(leg):
+                if segment.duration:
+                    return segment.position(segment.duration - 1)
+        return None
@@ -0,0 +1,16 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import sys
+from pathlib import Path
+
+
+def run():
+    ''' Запускает набор сценариев (модули симулятора подключаются из каталога app)
+    '''
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "app"))
+    from benchmark import main
+    main()
+
+
+run()
@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import io
+import json
+import time
+import argparse
+import platform
+import resource
+import tracemalloc
+import subprocess
+import contextlib
+import multiprocessing
+from datetime import datetime
+from pathlib import Path
+
+from main import City  # noqa: модуль симулятора
+from routing import RouteCache
+
+from osrm_stub import OSRMStub
+from synthetic import synthetic_scenario
+
+
+# Набор сценариев по умолчанию
+CASES = {
+    "small": dict(houses=1000, dumpsters=100, vehicles=3, hours=24),
+    "medium": dict(houses=10000, dumpsters=1000, vehicles=10, hours=24),
+    "large": dict(houses=50000, dumpsters=5000, vehicles=30, hours=24),
+}
+
+
+def run_case(name, case, url, emission, seed, clock=600):
+    ''' Выполняет сценарий и возвращает показатели производительности
+    '''
+    scenario = synthetic_scenario(seed=seed, **case)
+    routes = RouteCache(url=url)
+
+    city = City(
+        initial_time=scenario["start_time"],
+        routes=routes,
+        emission=emission,
+        seed=seed,
+        clock=clock or None,
+        profile=True
+    )
+    # Память, занимаемая агентами и их процессами после создания, по типам агентов
+    agent_memory = dict()
+    tracemalloc.start()
+    for kind, add in (("dispatchers", city.add_dispatcher), ("dumpsters", city.add_dumpster),
+                      ("houses", city.add_house), ("vehicles", city.add_vehicle)):
+        before = tracemalloc.get_traced_memory()[0]
+        for agent in scenario[kind]:
+            add(**agent)
+        agent_memory[kind] = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        city.run(until=scenario["finish_time"])
+    wall_time = time.perf_counter() - started
+
+    hours = (scenario["finish_time"] - scenario["start_time"]) / 3600.0
+    profile = city.profiler.report()
+    return dict(
+        name=name,
+        case=case,
+        emission=emission,
+        clock=clock,
+        # Время периодического вывода состояния (Clock), секунд
+        clock_time=profile["agents"].get("Clock", dict(seconds=0.0))["seconds"],
+        events=profile["events"],
+        wall_time=wall_time,
+        events_per_second=profile["events"] / wall_time if wall_time else None,
+        wall_time_per_hour=wall_time / hours,
+        peak_rss_kb=resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        agent_memory_kb={kind: size // 1024 for kind, size in agent_memory.items()},
+        agent_memory_per_agent={kind: size // len(scenario[kind]) if scenario[kind] else 0
+                                for kind, size in agent_memory.items()},
+        agents=profile["agents"],
+        callbacks=profile["callbacks"],
+        scheduled=profile["scheduled"],
+        routes=routes.stats,
+        states=dict(
+            houses=len(city._house_states),
+            dumpsters=len(city._dumpster_states),
+            vehicles=len(city._vehicle_states)
+        )
+    )
+
+
+def git_revision():
+    ''' Возвращает текущий коммит репозитория
+    '''
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "HEAD"],
+            cwd=Path(__file__).parent,
+            stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    '''
+    '''
+    parser = argparse.ArgumentParser(description="Simulator benchmark on synthetic cities")
+    parser.add_argument("cases", nargs="*", default=["small"], help=f"Cases: {', '.join(CASES)}")
+    parser.add_argument("--houses", type=int)
+    parser.add_argument("--dumpsters", type=int)
+    parser.add_argument("--vehicles", type=int)
+    parser.add_argument("--hours", type=int)
+    parser.add_argument("--emission", default="house", choices=("house", "aggregated"))
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--clock", type=int, default=600, help="Status output interval, s (0 - disabled)")
+    parser.add_argument("--speed", type=float, default=10.0, help="Stub OSRM speed, m/s")
+    parser.add_argument("--latency", type=float, default=0.0, help="Stub OSRM response delay, s")
+    parser.add_argument("--output", default="benchmark.json")
+    args = parser.parse_args()
+
+    stub = OSRMStub(speed=args.speed, latency=args.latency).start()
+    context = multiprocessing.get_context("fork")
+    results = list()
+    try:
+        for name in args.cases:
+            case = dict(CASES[name])
+            for key in ("houses", "dumpsters", "vehicles", "hours"):
+                if getattr(args, key) is not None:
+                    case[key] = getattr(args, key)
+            # Каждый сценарий выполняется в отдельном процессе для учёта пикового потребления памяти
+            with context.Pool(1) as pool:
+                result = pool.apply(run_case, (name, case, stub.url, args.emission, args.seed, args.clock))
+            print(f"[{name}] {result['events']} events, {result['wall_time']:.2f} s, "
+                  f"{result['events_per_second']:.0f} events/s, "
+                  f"{result['wall_time_per_hour']:.3f} s per simulated hour, "
+                  f"clock {result['clock_time']:.2f} s, "
+                  f"peak RSS {result['peak_rss_kb']} KB, "
+                  f"agents {sum(result['agent_memory_kb'].values())} KB", flush=True)
+            results.append(result)
+    finally:
+        stub.stop()
+
+    report = dict(
+        timestamp=datetime.now().isoformat(),
+        revision=git_revision(),
+        python=platform.python_version(),
+        platform=platform.platform(),
+        latency=args.latency,
+        results=results
+    )
+    Path(args.output).write_text(json.dumps(report, ensure_ascii=False, indent=4), encoding="utf-8")
+    print(f"Saved benchmark report to {args.output}", flush=True)
@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import json
+import math
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+
+
+def distance(a, b):
+    ''' Расстояние по дуге большого круга между точками (долгота, широта), метров
+    '''
+    longitude1, latitude1 = map(math.radians, a)
+    longitude2, latitude2 = map(math.radians, b)
+    h = (math.sin((latitude2 - latitude1) / 2) ** 2 +
+         math.cos(latitude1) * math.cos(latitude2) * math.sin((longitude2 - longitude1) / 2) ** 2)
+    return 2 * 6371000 * math.asin(math.sqrt(h))
+
+
+class OSRMStub():
+    ''' Заглушка сервиса OSRM
+         - маршруты строятся по прямым между точками с постоянной скоростью
+         - поддерживаются сервисы route, trip, table и nearest
+    '''
+
+    def __init__(self, speed=10.0, latency=0.0, host="127.0.0.1", port=0):
+        # Скорость движения, м/с
+        self.speed = speed
+        # Задержка ответа, секунд (имитация сетевого сервиса)
+        self.latency = latency
+        # Количество обработанных запросов
+        self.requests = 0
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                stub.requests += 1
+                if stub.latency:
+                    time.sleep(stub.latency)
+                body = json.dumps(stub.handle(self.path)).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        ''' Запускает сервер в отдельном потоке
+        '''
+        self.thread = threading.Thread(target=self.server.serve_forever, name="osrm-stub", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        ''' Останавливает сервер
+        '''
+        self.server.shutdown()
+        self.server.server_close()
+
+    def leg(self, a, b):
+        ''' Плечо маршрута между двумя точками
+        '''
+        length = distance(a, b)
+        duration = length / self.speed
+        return dict(
+            distance=length,
+            duration=duration,
+            steps=[
+                dict(
+                    distance=length,
+                    duration=duration,
+                    geometry=dict(type="LineString", coordinates=[list(a), list(b)])
+                ),
+                dict(
+                    distance=0,
+                    duration=0,
+                    geometry=dict(type="LineString", coordinates=[list(b), list(b)])
+                )
+            ]
+        )
+
+    def handle(self, path):
+        ''' Формирует ответ на запрос
+        '''
+        parts = urlsplit(path)
+        service, _, _, coordinates = parts.path.strip("/").split("/", 3)
+        points = [tuple(map(float, point.split(","))) for point in coordinates.split(";")]
+        params = {key: values[0] for key, values in parse_qs(parts.query).items()}
+        waypoints = [dict(location=list(point), name="", distance=0) for point in points]
+
+        if service == "route":
+            legs = [self.leg(a, b) for a, b in zip(points, points[1:])]
+            route = dict(
+                legs=legs,
+                distance=sum([leg["distance"] for leg in legs]),
+                duration=sum([leg["duration"] for leg in legs])
+            )
+            return dict(code="Ok", routes=[route], waypoints=waypoints)
+        if service == "trip":
+            # Точки посещаются в заданном порядке с возвратом в начальную
+            sequence = points + points[:1]
+            legs = [self.leg(a, b) for a, b in zip(sequence, sequence[1:])]
+            trip = dict(
+                legs=legs,
+                distance=sum([leg["distance"] for leg in legs]),
+                duration=sum([leg["duration"] for leg in legs])
+            )
+            return dict(code="Ok", trips=[trip], waypoints=waypoints)
+        if service == "table":
+            sources = params.get("sources", "all")
+            destinations = params.get("destinations", "all")
+            sources = range(len(points)) if sources == "all" else map(int, sources.split(";"))
+            destinations = range(len(points)) if destinations == "all" else map(int, destinations.split(";"))
+            destinations = list(destinations)
+            durations = [
+                [distance(points[i], points[j]) / self.speed for j in destinations]
+                for i in sources
+            ]
+            return dict(code="Ok", durations=durations)
+        if service == "nearest":
+            return dict(code="Ok", waypoints=waypoints[:1])
+        return dict(code="InvalidService", message=f"Service '{service}' not supported")
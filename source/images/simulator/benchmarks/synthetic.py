@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import random
+
+import numpy as np
+
+
+def synthetic_scenario(houses=1000, dumpsters=100, vehicles=3, hours=24,
+                       start_time=1555534800, seed=1,
+                       latitude=56.3, longitude=44.0, size=0.05):
+    ''' Формирует сценарий симуляции для синтетического города
+         - дома и контейнерные площадки равномерно распределены в квадрате size x size градусов
+         - каждый дом привязан к ближайшей площадке
+    '''
+    rnd = random.Random(seed)
+
+    def point():
+        return (round(latitude + rnd.random() * size, 6),
+                round(longitude + rnd.random() * size, 6))
+
+    # Контейнерные площадки
+    dumpster_list = list()
+    for n in range(dumpsters):
+        dumpster_latitude, dumpster_longitude = point()
+        dumpster_list.append(dict(
+            uid=f"dumpster-{n}",
+            latitude=dumpster_latitude,
+            longitude=dumpster_longitude,
+            capacity=rnd.choice((750, 800, 1100)),
+            count=rnd.randint(1, 4)
+        ))
+
+    dumpster_latitudes = np.array([d["latitude"] for d in dumpster_list])
+    dumpster_longitudes = np.array([d["longitude"] for d in dumpster_list])
+
+    # Жилые дома
+    house_list = list()
+    for n in range(houses):
+        house_latitude, house_longitude = point()
+        squares = (dumpster_latitudes - house_latitude) ** 2 + (dumpster_longitudes - house_longitude) ** 2
+        nearest = dumpster_list[int(np.argmin(squares))]
+        house_list.append(dict(
+            uid=f"house-{n}",
+            latitude=house_latitude,
+            longitude=house_longitude,
+            dumpster_uid=nearest["uid"],
+            daily_emission=rnd.randint(500, 5000)
+        ))
+
+    # Мусороуборочные автомобили
+    vehicle_list = list()
+    for n in range(vehicles):
+        vehicle_list.append(dict(
+            uid=str(n + 1),
+            number=str(500 + n),
+            owner="Benchmark",
+            capacity=20000,
+            value=0
+        ))
+
+    return dict(
+        dispatchers=[dict(uid="1", name="Benchmark", timeout=600)],
+        dumpsters=dumpster_list,
+        houses=house_list,
+        vehicles=vehicle_list,
+        start_time=start_time,
+        finish_time=start_time + hours * 3600
+    )
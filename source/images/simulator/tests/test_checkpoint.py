@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import io
+import sys
+import random
+import tempfile
+import unittest
+import contextlib
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "app"))
+sys.path.insert(0, str(ROOT / "benchmarks"))
+
+import main  # noqa: E402
+from agents import load_snapshot  # noqa: E402
+from agents.checkpoint import snapshots  # noqa: E402
+from routing import RouteCache  # noqa: E402
+from osrm_stub import OSRMStub  # noqa: E402
+
+
+def scenario(seed=1):
+    ''' Небольшой сценарий: 60 площадок, 600 домов, 3 автомобиля, одни сутки
+    '''
+    generator = random.Random(seed)
+    dumpsters = [
+        dict(uid=f"d{n}", latitude=round(56.30 + generator.random() * 0.03, 6),
+             longitude=round(44.0 + generator.random() * 0.05, 6), capacity=800, count=2)
+        for n in range(60)
+    ]
+    houses = [
+        dict(uid=f"h{n}", latitude=56.3, longitude=44.0, dumpster_uid=f"d{n % 60}",
+             daily_emission=generator.randint(500, 3000))
+        for n in range(600)
+    ]
+    vehicles = [dict(uid=str(n), number="5", owner="x", capacity=20000, value=200) for n in range(3)]
+    dispatchers = [dict(uid="1", name="a", timeout=600), dict(uid="2", name="b", timeout=600)]
+    return dict(dispatchers=dispatchers, dumpsters=dumpsters, houses=houses, vehicles=vehicles,
+                start_time=1555534800, finish_time=1555534800 + 86400)
+
+
+def summary(city):
+    ''' Итоговое состояние симуляции для сравнения прогонов
+    '''
+    return dict(
+        totals={name: round(value, 3) for name, value in city.totals.items()},
+        vehicles=[(vehicle.uid, vehicle.orders_served, round(vehicle.distance, 3), round(vehicle.value, 3))
+                  for vehicle in city.vehicles],
+        dumpsters={uid: round(dumpster.value, 3) for uid, dumpster in city._dumpsters.items()},
+        dispatchers=[(dispatcher.uid, dispatcher.summary) for dispatcher in city.dispatchers],
+    )
+
+
+class ResumeTest(unittest.TestCase):
+    ''' Продолжение симуляции с контрольной точки (модель генерации "aggregated")
+    '''
+
+    @classmethod
+    def setUpClass(cls):
+        cls.stub = OSRMStub().start()
+        cls.scenario = scenario()
+        cls.directory = tempfile.TemporaryDirectory()
+        finish_time = cls.scenario["finish_time"]
+        options = {name: value for name, value in cls.scenario.items() if name != "finish_time"}
+        cls.city = main.create_city(
+            routes=RouteCache(url=cls.stub.url), seed=1, emission="aggregated", clock=None,
+            checkpoint_directory=cls.directory.name, checkpoint_interval=3600, **options
+        )
+        # Сохраняются все контрольные точки прогона (по умолчанию - только последние)
+        cls.city._checkpoint.keep = 1000
+        with contextlib.redirect_stdout(io.StringIO()):
+            cls.city.run(until=finish_time)
+        cls.snapshots = snapshots(cls.directory.name)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.stub.stop()
+        cls.directory.cleanup()
+
+    def test_resume_matches_uninterrupted_run(self):
+        expected = summary(self.city)
+        for filename in self.snapshots:
+            with self.subTest(checkpoint=filename.name):
+                with contextlib.redirect_stdout(io.StringIO()):
+                    city = main.resume(filename, routes=RouteCache(url=self.stub.url), seed=1,
+                                       emission="aggregated", clock=None, **self.scenario)
+                self.assertEqual(summary(city), expected)
+
+    def test_checkpoints_cover_vehicle_activities(self):
+        # Продолжение прерванных перемещения, загрузки и разгрузки
+        kinds = set()
+        for filename in self.snapshots:
+            for vehicle in load_snapshot(filename)["vehicles"].values():
+                if vehicle["activity"] is not None:
+                    kinds.add(vehicle["activity"][0])
+        self.assertLessEqual({"move", "load", "unload"}, kinds)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,7 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from .profiles import Profile, CAR, FOOT, PROFILES  # noqa
+from .osm import read_osm  # noqa
+from .graph import Graph, haversine  # noqa
+from .router import Router, dijkstra  # noqa
@@ -0,0 +1,202 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from collections import deque
+
+import numpy as np
+
+
+EARTH_RADIUS = 6371000.0
+
+
+def haversine(longitude1, latitude1, longitude2, latitude2):
+    ''' Расстояние по дуге большого круга, метров (поддерживает массивы NumPy)
+    '''
+    longitude1, latitude1, longitude2, latitude2 = map(
+        np.radians, (longitude1, latitude1, longitude2, latitude2))
+    h = (np.sin((latitude2 - latitude1) / 2) ** 2 +
+         np.cos(latitude1) * np.cos(latitude2) * np.sin((longitude2 - longitude1) / 2) ** 2)
+    return 2 * EARTH_RADIUS * np.arcsin(np.sqrt(h))
+
+
+class Graph():
+    ''' Дорожный граф в формате CSR
+         - вершины: точки дорог OSM, рёбра: отрезки дорог с учётом направления движения
+         - рёбра вершины v: targets[indptr[v]:indptr[v + 1]]
+    '''
+
+    def __init__(self, profile, longitudes, latitudes, node_ids, indptr, targets, durations, distances,
+                 name_indexes, names, component=None):
+        # Название профиля маршрутизации
+        self.profile = profile
+        # Координаты и идентификаторы OSM вершин
+        self.longitudes = longitudes
+        self.latitudes = latitudes
+        self.node_ids = node_ids
+        # Смежность вершин
+        self.indptr = indptr
+        self.targets = targets
+        # Длительность движения, секунд, и длина рёбер, метров
+        self.durations = durations
+        self.distances = distances
+        # Названия дорог рёбер
+        self.name_indexes = name_indexes
+        self.names = names
+        # Вершины сильно связной компоненты, к которым привязываются точки запросов
+        if component is None:
+            component = self.largest_component()
+        self.component = component
+
+    def __len__(self):
+        return len(self.longitudes)
+
+    @property
+    def edge_count(self):
+        return len(self.targets)
+
+    @classmethod
+    def build(cls, nodes, ways, profile):
+        ''' Строит граф по дорогам OSM для профиля маршрутизации
+        '''
+        index = dict()
+        node_ids = list()
+        sources, targets, speeds, name_indexes = list(), list(), list(), list()
+        names = [""]
+        name_index = {"": 0}
+        for refs, tags in ways:
+            speed = profile.speed(tags)
+            if speed is None:
+                continue
+            forward, backward = profile.direction(tags)
+            name = tags.get("name", "")
+            n = name_index.get(name)
+            if n is None:
+                n = name_index[name] = len(names)
+                names.append(name)
+
+            vertices = list()
+            for ref in refs:
+                if ref not in nodes:
+                    continue
+                v = index.get(ref)
+                if v is None:
+                    v = index[ref] = len(node_ids)
+                    node_ids.append(ref)
+                vertices.append(v)
+            for a, b in zip(vertices[:-1], vertices[1:]):
+                if a == b:
+                    continue
+                if forward:
+                    sources.append(a)
+                    targets.append(b)
+                    speeds.append(speed)
+                    name_indexes.append(n)
+                if backward:
+                    sources.append(b)
+                    targets.append(a)
+                    speeds.append(speed)
+                    name_indexes.append(n)
+
+        points = np.array([nodes[ref] for ref in node_ids], dtype=float).reshape(-1, 2)
+        longitudes, latitudes = points[:, 0].copy(), points[:, 1].copy()
+        sources = np.array(sources, dtype=np.int64)
+        targets = np.array(targets, dtype=np.int64)
+        distances = haversine(longitudes[sources], latitudes[sources], longitudes[targets], latitudes[targets])
+        durations = distances / (np.array(speeds, dtype=float) / 3.6)
+
+        # Упорядочение рёбер по начальной вершине
+        order = np.argsort(sources, kind="stable")
+        indptr = np.zeros(len(node_ids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(sources, minlength=len(node_ids)), out=indptr[1:])
+        return cls(
+            profile.name,
+            longitudes,
+            latitudes,
+            np.array(node_ids, dtype=np.int64),
+            indptr,
+            targets[order].astype(np.int32),
+            durations[order].astype(np.float32),
+            distances[order].astype(np.float32),
+            np.array(name_indexes, dtype=np.int32)[order],
+            names
+        )
+
+    def reversed(self):
+        ''' Возвращает смежность обратного графа (indptr, sources, номера рёбер прямого графа)
+        '''
+        sources = np.repeat(np.arange(len(self), dtype=np.int64), np.diff(self.indptr))
+        order = np.argsort(self.targets, kind="stable")
+        indptr = np.zeros(len(self) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(self.targets, minlength=len(self)), out=indptr[1:])
+        return indptr, sources[order].astype(np.int32), order
+
+    def _reachable(self, start, indptr, targets):
+        ''' Вершины, достижимые из start
+        '''
+        seen = np.zeros(len(self), dtype=bool)
+        seen[start] = True
+        queue = deque([start])
+        while queue:
+            v = queue.popleft()
+            for u in targets[indptr[v]:indptr[v + 1]]:
+                if not seen[u]:
+                    seen[u] = True
+                    queue.append(u)
+        return seen
+
+    def largest_component(self, attempts=5, seed=0):
+        ''' Приближённо находит наибольшую сильно связную компоненту
+             - пересечение множеств достижимости в прямом и обратном графе из нескольких вершин
+        '''
+        if not len(self):
+            return np.zeros(0, dtype=bool)
+        indptr, targets = self.indptr.tolist(), self.targets.tolist()
+        reverse_indptr, reverse_targets, _ = self.reversed()
+        reverse_indptr, reverse_targets = reverse_indptr.tolist(), reverse_targets.tolist()
+        random = np.random.default_rng(seed)
+        best = np.zeros(len(self), dtype=bool)
+        for start in random.choice(len(self), size=min(attempts, len(self)), replace=False).tolist():
+            if best[start]:
+                continue
+            component = (self._reachable(start, indptr, targets) &
+                         self._reachable(start, reverse_indptr, reverse_targets))
+            if component.sum() > best.sum():
+                best = component
+        return best
+
+    def save(self, filename):
+        ''' Сохраняет граф в файл NumPy (.npz)
+        '''
+        np.savez(
+            filename,
+            profile=np.array(self.profile),
+            longitudes=self.longitudes,
+            latitudes=self.latitudes,
+            node_ids=self.node_ids,
+            indptr=self.indptr,
+            targets=self.targets,
+            durations=self.durations,
+            distances=self.distances,
+            name_indexes=self.name_indexes,
+            names=np.array(self.names, dtype=str),
+            component=self.component
+        )
+
+    @classmethod
+    def load(cls, filename):
+        ''' Загружает граф из файла NumPy (.npz)
+        '''
+        with np.load(filename) as data:
+            return cls(
+                str(data["profile"]),
+                data["longitudes"],
+                data["latitudes"],
+                data["node_ids"],
+                data["indptr"],
+                data["targets"],
+                data["durations"],
+                data["distances"],
+                data["name_indexes"],
+                data["names"].tolist(),
+                component=data["component"]
+            )
@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import bz2
+import gzip
+from pathlib import Path
+from xml.etree.ElementTree import iterparse
+
+
+# Теги линий, необходимые для маршрутизации
+WAY_TAGS = (
+    "highway", "name", "oneway", "junction", "area",
+    "access", "vehicle", "motor_vehicle", "motorcar", "foot"
+)
+
+
+def _open(filename):
+    ''' Открывает файл OSM XML (в том числе сжатый)
+    '''
+    filename = str(filename)
+    if filename.endswith(".bz2"):
+        return bz2.open(filename, "rb")
+    if filename.endswith(".gz"):
+        return gzip.open(filename, "rb")
+    return open(filename, "rb")
+
+
+def _read_xml(filename):
+    ''' Читает дороги из файла OSM XML
+         - первый проход: линии с тегом highway
+         - второй проход: координаты только тех точек, которые входят в дороги
+    '''
+    ways = list()
+    used = set()
+    with _open(filename) as f:
+        refs, tags = list(), dict()
+        for event, element in iterparse(f, events=("end",)):
+            tag = element.tag
+            if tag == "nd":
+                refs.append(int(element.get("ref")))
+            elif tag == "tag":
+                key = element.get("k")
+                if key in WAY_TAGS:
+                    tags[key] = element.get("v")
+            elif tag == "way":
+                if "highway" in tags and len(refs) > 1:
+                    ways.append((refs, tags))
+                    used.update(refs)
+                refs, tags = list(), dict()
+                element.clear()
+            elif tag in ("node", "relation"):
+                refs, tags = list(), dict()
+                element.clear()
+
+    nodes = dict()
+    with _open(filename) as f:
+        for event, element in iterparse(f, events=("end",)):
+            if element.tag == "node":
+                uid = int(element.get("id"))
+                if uid in used:
+                    nodes[uid] = (float(element.get("lon")), float(element.get("lat")))
+                element.clear()
+            elif element.tag == "way":
+                # Точки в файле OSM предшествуют линиям
+                break
+    return nodes, ways
+
+
+def _read_pbf(filename):
+    ''' Читает дороги из файла OSM PBF (требуется пакет osmium)
+    '''
+    try:
+        import osmium
+    except ImportError:
+        raise RuntimeError("Reading .osm.pbf files requires the 'osmium' package")
+
+    nodes = dict()
+    ways = list()
+
+    class Handler(osmium.SimpleHandler):
+        def way(self, way):
+            if "highway" not in way.tags:
+                return
+            tags = {key: way.tags[key] for key in WAY_TAGS if key in way.tags}
+            refs = list()
+            for node in way.nodes:
+                if not node.location.valid():
+                    continue
+                nodes[node.ref] = (node.location.lon, node.location.lat)
+                refs.append(node.ref)
+            if len(refs) > 1:
+                ways.append((refs, tags))
+
+    Handler().apply_file(str(filename), locations=True)
+    return nodes, ways
+
+
+def read_osm(filename):
+    ''' Читает дороги из выгрузки OpenStreetMap
+         - возвращает координаты точек {id: (долгота, широта)} и линии [(точки, теги)]
+    '''
+    if Path(filename).name.endswith(".pbf"):
+        return _read_pbf(filename)
+    return _read_xml(filename)
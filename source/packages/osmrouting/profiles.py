@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+class Profile():
+    ''' Профиль маршрутизации
+         - скорость движения по типу дороги (highway), км/ч
+         - ограничения доступа и одностороннее движение
+    '''
+
+    def __init__(self, name, mode, speeds, access_tags, oneway=True):
+        # Название профиля (как в адресе запроса OSRM)
+        self.name = name
+        # Способ передвижения в шагах маршрута OSRM
+        self.mode = mode
+        # Скорость движения по типам дорог, км/ч
+        self.speeds = dict(speeds)
+        # Теги ограничения доступа в порядке убывания приоритета
+        self.access_tags = tuple(access_tags)
+        # Учитывать одностороннее движение
+        self.oneway = oneway
+
+    @property
+    def max_speed(self):
+        ''' Максимальная скорость движения, м/с
+        '''
+        return max(self.speeds.values()) / 3.6
+
+    def speed(self, tags):
+        ''' Возвращает скорость движения по дороге, км/ч (None, если дорога недоступна)
+        '''
+        if tags.get("area") == "yes":
+            return None
+        speed = self.speeds.get(tags.get("highway"))
+        if speed is None:
+            return None
+        for tag in self.access_tags:
+            value = tags.get(tag)
+            if value is None:
+                continue
+            if value in ("no", "private", "agricultural", "forestry", "delivery"):
+                return None
+            break
+        return speed
+
+    def direction(self, tags):
+        ''' Возвращает допустимые направления движения по линии (прямое, обратное)
+        '''
+        if not self.oneway:
+            return True, True
+        oneway = tags.get("oneway")
+        if oneway in ("yes", "true", "1"):
+            return True, False
+        if oneway == "-1":
+            return False, True
+        if oneway is None and (tags.get("junction") in ("roundabout", "circular") or
+                               tags.get("highway") == "motorway"):
+            return True, False
+        return True, True
+
+
+CAR = Profile(
+    name="car",
+    mode="driving",
+    speeds={
+        "motorway": 90, "motorway_link": 45,
+        "trunk": 85, "trunk_link": 40,
+        "primary": 65, "primary_link": 30,
+        "secondary": 55, "secondary_link": 25,
+        "tertiary": 40, "tertiary_link": 20,
+        "unclassified": 25, "residential": 25,
+        "living_street": 10, "service": 15
+    },
+    access_tags=("motorcar", "motor_vehicle", "vehicle", "access")
+)
+
+
+FOOT = Profile(
+    name="foot",
+    mode="walking",
+    speeds={
+        highway: 5 for highway in (
+            "primary", "primary_link", "secondary", "secondary_link",
+            "tertiary", "tertiary_link", "unclassified", "residential",
+            "living_street", "service", "road", "track", "path",
+            "footway", "pedestrian", "steps", "cycleway", "bridleway"
+        )
+    },
+    access_tags=("foot", "access"),
+    oneway=False
+)
+
+
+# Профили по названиям, используемым в запросах OSRM
+PROFILES = {
+    "car": CAR,
+    "driving": CAR,
+    "foot": FOOT,
+    "walking": FOOT
+}
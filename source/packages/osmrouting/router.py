@@ -0,0 +1,552 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import math
+import hashlib
+from heapq import heappush, heappop
+from pathlib import Path
+
+import numpy as np
+
+from .graph import EARTH_RADIUS, Graph, haversine
+from .osm import read_osm
+from .profiles import PROFILES
+
+
+INFINITY = float("inf")
+# Замена бесконечных расстояний от ориентиров и до них в оценках вершин (разность двух таких
+# значений равна нулю, а не nan; оценка не меньше UNREACHABLE / 2 означает недостижимость)
+UNREACHABLE = 1e15
+
+
+def dijkstra(indptr, targets, weights, source, stop=None):
+    ''' Кратчайшие расстояния от вершины source
+         - indptr, targets, weights: смежность графа в виде списков Python
+         - stop: множество вершин, после фиксации которых поиск прекращается
+         - возвращает словари расстояний и рёбер, по которым достигнуты вершины
+    '''
+    distances = {source: 0.0}
+    predecessors = {source: -1}
+    settled = set()
+    remaining = set(stop) if stop is not None else None
+    heap = [(0.0, source)]
+    while heap:
+        d, v = heappop(heap)
+        if v in settled:
+            continue
+        settled.add(v)
+        if remaining is not None:
+            remaining.discard(v)
+            if not remaining:
+                break
+        for e in range(indptr[v], indptr[v + 1]):
+            u = targets[e]
+            nd = d + weights[e]
+            if nd < distances.get(u, INFINITY):
+                distances[u] = nd
+                predecessors[u] = e
+                heappush(heap, (nd, u))
+    return distances, predecessors
+
+
+class Router():
+    ''' Маршрутизатор по дорожному графу OSM
+         - ответы совместимы с сервисами route, trip, table и nearest OSRM (геометрия GeoJSON)
+         - поиск маршрута: A* с нижними оценками по ориентирам (ALT), вычисляемыми один раз
+    '''
+
+    # Размер ячейки сетки для поиска ближайшей вершины, градусов
+    cell = 0.005
+    # Количество ориентиров, используемых в оценках одного запроса
+    active_landmarks = 4
+
+    def __init__(self, graph, landmarks=None, landmark_count=8):
+        self.graph = graph
+        self.profile = PROFILES[graph.profile]
+        # Смежность прямого графа в виде списков для быстрого обхода
+        self._indptr = graph.indptr.tolist()
+        self._targets = graph.targets.tolist()
+        self._durations = graph.durations.astype(float).tolist()
+        self._sources = np.repeat(np.arange(len(graph), dtype=np.int64), np.diff(graph.indptr)).tolist()
+        # Расстояния от ориентиров и до ориентиров по времени движения (ориентир x вершина)
+        if landmarks is None:
+            landmarks = self.build_landmarks(landmark_count)
+        # Расстояния по вершинам (вершина x ориентир) для вычисления оценок отдельных вершин
+        self.from_landmarks, self.to_landmarks = landmarks
+        rows_from, rows_to = [
+            np.ascontiguousarray(np.minimum(np.asarray(values, dtype=float).T, UNREACHABLE))
+            for values in landmarks
+        ]
+        self._landmark_count = rows_from.shape[1]
+        self._rows_from = memoryview(rows_from.ravel())
+        self._rows_to = memoryview(rows_to.ravel())
+        # Координаты вершин, радиан, и косинусы широт для оценки по расстоянию
+        self._longitudes = memoryview(np.radians(graph.longitudes).astype(float))
+        self._latitudes = memoryview(np.radians(graph.latitudes).astype(float))
+        self._cos_latitudes = memoryview(np.cos(np.radians(graph.latitudes)).astype(float))
+        self._build_grid()
+
+    @classmethod
+    def from_osm(cls, filename, profile="car", cache=None, landmark_count=8):
+        ''' Создаёт маршрутизатор по выгрузке OSM
+             - граф и ориентиры сохраняются в каталоге cache и используются повторно;
+               ключ кеша: путь, размер и время изменения выгрузки, профиль и количество ориентиров
+        '''
+        filename = Path(filename)
+        profile = PROFILES[profile]
+        path = landmarks_path = None
+        if cache is not None:
+            stat = filename.stat()
+            key = f"{filename.resolve()}:{stat.st_size}:{stat.st_mtime_ns}:{profile.name}:{landmark_count}"
+            digest = hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+            stem = filename.name.split(".")[0]
+            path = Path(cache) / f"{stem}.{profile.name}.{digest}.npz"
+            landmarks_path = path.with_suffix(".landmarks.npz")
+            if path.exists() and landmarks_path.exists():
+                graph = Graph.load(path)
+                with np.load(landmarks_path) as data:
+                    landmarks = (data["from_landmarks"], data["to_landmarks"])
+                return cls(graph, landmarks=landmarks)
+
+        nodes, ways = read_osm(filename)
+        graph = Graph.build(nodes, ways, profile)
+        router = cls(graph, landmark_count=landmark_count)
+        if path is not None:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            np.savez(
+                landmarks_path,
+                from_landmarks=router.from_landmarks,
+                to_landmarks=router.to_landmarks
+            )
+            graph.save(path)
+        return router
+
+    def build_landmarks(self, count):
+        ''' Выбирает ориентиры (наиболее удалённые друг от друга вершины) и вычисляет
+             расстояния от них и до них по времени движения
+        '''
+        graph = self.graph
+        nodes = np.flatnonzero(graph.component)
+        size = len(graph)
+        from_landmarks = np.zeros((0, size))
+        to_landmarks = np.zeros((0, size))
+        if not len(nodes):
+            return from_landmarks, to_landmarks
+
+        reverse_indptr, reverse_targets, order = graph.reversed()
+        reverse = (reverse_indptr.tolist(), reverse_targets.tolist(),
+                   graph.durations[order].astype(float).tolist())
+        forward = (self._indptr, self._targets, self._durations)
+
+        def distances(adjacency, source):
+            values = np.full(size, INFINITY)
+            found, _ = dijkstra(*adjacency, source)
+            values[list(found)] = list(found.values())
+            return values
+
+        # Первый ориентир - самая удалённая вершина от произвольной вершины компоненты
+        spread = distances(forward, int(nodes[0]))
+        rows_from, rows_to = list(), list()
+        for _ in range(min(count, len(nodes))):
+            candidates = np.where(graph.component & np.isfinite(spread), spread, -1)
+            landmark = int(np.argmax(candidates))
+            rows_from.append(distances(forward, landmark))
+            rows_to.append(distances(reverse, landmark))
+            spread = np.minimum(spread, rows_from[-1]) if len(rows_from) > 1 else rows_from[-1]
+        return np.array(rows_from), np.array(rows_to)
+
+    def _build_grid(self):
+        ''' Строит сетку для поиска ближайших вершин компоненты
+        '''
+        graph = self.graph
+        nodes = np.flatnonzero(graph.component)
+        ix = np.floor(graph.longitudes[nodes] / self.cell).astype(np.int64)
+        iy = np.floor(graph.latitudes[nodes] / self.cell).astype(np.int64)
+        order = np.lexsort((iy, ix))
+        ix, iy, nodes = ix[order], iy[order], nodes[order]
+        self._grid = dict()
+        if not len(nodes):
+            return
+        starts = np.flatnonzero(np.r_[True, (np.diff(ix) != 0) | (np.diff(iy) != 0)])
+        ends = np.r_[starts[1:], len(nodes)]
+        for start, end in zip(starts.tolist(), ends.tolist()):
+            self._grid[(int(ix[start]), int(iy[start]))] = nodes[start:end]
+
+    def nearest(self, longitude, latitude, number=1, max_rings=200):
+        ''' Возвращает ближайшие вершины и расстояния до них, метров
+        '''
+        graph = self.graph
+        cx = math.floor(longitude / self.cell)
+        cy = math.floor(latitude / self.cell)
+        # Наименьший размер ячейки, метров: точки кольца ring не ближе (ring - 1) размеров ячейки
+        size = math.radians(self.cell) * EARTH_RADIUS * max(math.cos(math.radians(latitude)), 0.01)
+        candidates = list()
+        found = None
+        for ring in range(max_rings):
+            for x in range(cx - ring, cx + ring + 1):
+                for y in range(cy - ring, cy + ring + 1):
+                    if max(abs(x - cx), abs(y - cy)) != ring:
+                        continue
+                    nodes = self._grid.get((x, y))
+                    if nodes is not None:
+                        candidates.append(nodes)
+            if candidates and sum(len(nodes) for nodes in candidates) >= number:
+                nodes = np.concatenate(candidates)
+                distances = haversine(longitude, latitude, graph.longitudes[nodes], graph.latitudes[nodes])
+                order = np.argsort(distances, kind="stable")[:number]
+                found = list(zip(nodes[order].tolist(), distances[order].tolist()))
+                # Следующие кольца не могут содержать более близких вершин
+                if ring * size > found[-1][1]:
+                    break
+        return found or list()
+
+    def _heuristic(self, source, target):
+        ''' Функция нижней оценки времени движения от вершины до target
+             - оценка вычисляется только для вершин, которых достиг поиск
+             - наибольшая из оценок по расстоянию большого круга и по active_landmarks ориентирам (ALT),
+               дающим наибольшую оценку для source
+        '''
+        longitudes, latitudes, cos_latitudes = self._longitudes, self._latitudes, self._cos_latitudes
+        target_longitude, target_latitude = longitudes[target], latitudes[target]
+        target_cos = cos_latitudes[target]
+        scale = 2 * EARTH_RADIUS / self.profile.max_speed
+        count = self._landmark_count
+        rows_from, rows_to = self._rows_from, self._rows_to
+        from_target = rows_from[target * count:(target + 1) * count].tolist()
+        to_target = rows_to[target * count:(target + 1) * count].tolist()
+        from_source = rows_from[source * count:(source + 1) * count].tolist()
+        to_source = rows_to[source * count:(source + 1) * count].tolist()
+        scores = [max(from_target[n] - from_source[n], to_source[n] - to_target[n]) for n in range(count)]
+        active = sorted(range(count), key=lambda n: scores[n], reverse=True)[:self.active_landmarks]
+        landmarks = [(n, from_target[n], to_target[n]) for n in active]
+
+        def bound(v):
+            h = (math.sin((target_latitude - latitudes[v]) / 2) ** 2 +
+                 target_cos * cos_latitudes[v] * math.sin((target_longitude - longitudes[v]) / 2) ** 2)
+            best = scale * math.asin(math.sqrt(min(h, 1.0)))
+            start = v * count
+            for n, from_value, to_value in landmarks:
+                ahead = from_value - rows_from[start + n]
+                behind = rows_to[start + n] - to_value
+                if ahead > best:
+                    best = ahead
+                if behind > best:
+                    best = behind
+            if best >= UNREACHABLE / 2:
+                return INFINITY
+            return best
+
+        return bound
+
+    def shortest_path(self, source, target):
+        ''' Рёбра кратчайшего по времени пути (A*) или None, если путь не найден
+        '''
+        if source == target:
+            return list()
+        indptr, targets, durations = self._indptr, self._targets, self._durations
+        bound = self._heuristic(source, target)
+        estimates = {source: bound(source)}
+        distances = {source: 0.0}
+        predecessors = {source: -1}
+        heap = [(estimates[source], 0.0, source)]
+        while heap:
+            _, d, v = heappop(heap)
+            if v == target:
+                return self._edges(predecessors, target)
+            if d > distances[v]:
+                continue
+            for e in range(indptr[v], indptr[v + 1]):
+                u = targets[e]
+                nd = d + durations[e]
+                if nd >= distances.get(u, INFINITY):
+                    continue
+                h = estimates.get(u)
+                if h is None:
+                    h = estimates[u] = bound(u)
+                if h < INFINITY:
+                    distances[u] = nd
+                    predecessors[u] = e
+                    heappush(heap, (nd + h, nd, u))
+        return None
+
+    def _edges(self, predecessors, target):
+        ''' Восстанавливает рёбра пути по словарю предшествующих рёбер
+        '''
+        edges = list()
+        e = predecessors[target]
+        while e != -1:
+            edges.append(e)
+            e = predecessors[self._sources[e]]
+        edges.reverse()
+        return edges
+
+    def _waypoint(self, node, distance):
+        ''' Точка запроса, привязанная к вершине графа
+        '''
+        graph = self.graph
+        edge = self._indptr[node]
+        name = graph.names[graph.name_indexes[edge]] if edge < self._indptr[node + 1] else ""
+        return dict(
+            hint="",
+            distance=round(distance, 6),
+            name=name,
+            location=self._location(node)
+        )
+
+    def _location(self, node):
+        return [round(float(self.graph.longitudes[node]), 6), round(float(self.graph.latitudes[node]), 6)]
+
+    def _leg(self, source, edges, steps=True):
+        ''' Формирует плечо маршрута OSRM по рёбрам пути
+             - шаги маршрута объединяют последовательные рёбра одной дороги
+        '''
+        graph = self.graph
+        mode = self.profile.mode
+        groups = list()
+        for e in edges:
+            name_index = int(graph.name_indexes[e])
+            if not groups or groups[-1][0] != name_index:
+                groups.append((name_index, [e]))
+            else:
+                groups[-1][1].append(e)
+
+        leg_steps = list()
+        coordinates = [self._location(source)]
+        node = source
+        for n, (name_index, group) in enumerate(groups):
+            geometry = [self._location(node)]
+            for e in group:
+                node = self._targets[e]
+                geometry.append(self._location(node))
+            coordinates.extend(geometry[1:])
+            duration = float(sum(self._durations[e] for e in group))
+            distance = float(graph.distances[group].sum())
+            leg_steps.append(dict(
+                geometry=dict(type="LineString", coordinates=geometry),
+                maneuver=dict(type="depart" if n == 0 else "turn", location=geometry[0]),
+                mode=mode,
+                name=graph.names[name_index],
+                duration=round(duration, 1),
+                distance=round(distance, 1),
+                weight=round(duration, 1)
+            ))
+        if not leg_steps:
+            location = self._location(source)
+            leg_steps.append(dict(
+                geometry=dict(type="LineString", coordinates=[location, location]),
+                maneuver=dict(type="depart", location=location),
+                mode=mode, name="", duration=0.0, distance=0.0, weight=0.0
+            ))
+        location = self._location(node)
+        leg_steps.append(dict(
+            geometry=dict(type="LineString", coordinates=[location, location]),
+            maneuver=dict(type="arrive", location=location),
+            mode=mode, name=leg_steps[-1]["name"], duration=0.0, distance=0.0, weight=0.0
+        ))
+
+        duration = round(sum(step["duration"] for step in leg_steps), 1)
+        distance = round(sum(step["distance"] for step in leg_steps), 1)
+        leg = dict(summary="", duration=duration, distance=distance, weight=duration,
+                   steps=leg_steps if steps else list())
+        return leg, coordinates
+
+    def _route(self, nodes, paths, steps=True):
+        ''' Формирует маршрут OSRM из путей между последовательными вершинами
+        '''
+        legs = list()
+        coordinates = list()
+        for source, edges in zip(nodes, paths):
+            leg, leg_coordinates = self._leg(source, edges, steps)
+            legs.append(leg)
+            coordinates.extend(leg_coordinates if not coordinates else leg_coordinates[1:])
+        duration = round(sum(leg["duration"] for leg in legs), 1)
+        distance = round(sum(leg["distance"] for leg in legs), 1)
+        return dict(
+            geometry=dict(type="LineString", coordinates=coordinates),
+            legs=legs,
+            duration=duration,
+            distance=distance,
+            weight_name="duration",
+            weight=duration
+        )
+
+    def _snap(self, coordinates):
+        ''' Привязывает точки запроса к вершинам графа
+        '''
+        snapped = list()
+        for longitude, latitude in coordinates:
+            found = self.nearest(float(longitude), float(latitude))
+            if not found:
+                return None
+            snapped.append(found[0])
+        return snapped
+
+    def route(self, coordinates, steps=True):
+        ''' Маршрут между точками в заданном порядке (сервис route)
+        '''
+        snapped = self._snap(coordinates)
+        if snapped is None:
+            return dict(code="NoSegment", message="Could not find a matching segment for coordinate")
+        nodes = [node for node, _ in snapped]
+        paths = list()
+        for source, target in zip(nodes[:-1], nodes[1:]):
+            edges = self.shortest_path(source, target)
+            if edges is None:
+                return dict(code="NoRoute", message="Impossible route between points")
+            paths.append(edges)
+        return dict(
+            code="Ok",
+            routes=[self._route(nodes, paths, steps)],
+            waypoints=[self._waypoint(node, distance) for node, distance in snapped]
+        )
+
+    def _matrix(self, sources, destinations, with_paths=False):
+        ''' Матрица времени движения и расстояний между вершинами (Дейкстра от каждого источника)
+        '''
+        durations, distances, paths = list(), list(), list()
+        for source in sources:
+            found, predecessors = dijkstra(self._indptr, self._targets, self._durations, source,
+                                           stop=set(destinations))
+            row_durations, row_distances, row_paths = list(), list(), list()
+            for target in destinations:
+                if target not in found:
+                    row_durations.append(None)
+                    row_distances.append(None)
+                    row_paths.append(None)
+                    continue
+                edges = self._edges(predecessors, target)
+                row_durations.append(round(found[target], 1))
+                row_distances.append(round(float(self.graph.distances[edges].sum()), 1))
+                row_paths.append(edges if with_paths else None)
+            durations.append(row_durations)
+            distances.append(row_distances)
+            paths.append(row_paths)
+        return durations, distances, paths
+
+    def table(self, coordinates, sources=None, destinations=None, annotations=("duration",)):
+        ''' Матрица времени движения между точками (сервис table)
+        '''
+        snapped = self._snap(coordinates)
+        if snapped is None:
+            return dict(code="NoSegment", message="Could not find a matching segment for coordinate")
+        sources = list(range(len(snapped))) if sources is None else sources
+        destinations = list(range(len(snapped))) if destinations is None else destinations
+        durations, distances, _ = self._matrix(
+            [snapped[n][0] for n in sources],
+            [snapped[n][0] for n in destinations]
+        )
+        result = dict(
+            code="Ok",
+            sources=[self._waypoint(*snapped[n]) for n in sources],
+            destinations=[self._waypoint(*snapped[n]) for n in destinations]
+        )
+        if "duration" in annotations:
+            result["durations"] = durations
+        if "distance" in annotations:
+            result["distances"] = distances
+        return result
+
+    @staticmethod
+    def _tour(durations, roundtrip=True, last=None):
+        ''' Порядок обхода точек, начиная с первой (ближайший сосед и улучшение 2-opt)
+        '''
+        count = len(durations)
+        order = [0]
+        rest = [n for n in range(1, count) if n != last]
+        while rest:
+            current = order[-1]
+            n = min(rest, key=lambda n: durations[current][n])
+            rest.remove(n)
+            order.append(n)
+        if last is not None and last != 0:
+            order.append(last)
+
+        def cost(order):
+            stops = order + [order[0]] if roundtrip else order
+            return sum(durations[a][b] for a, b in zip(stops[:-1], stops[1:]))
+
+        best = cost(order)
+        end = count if last is None else count - 1
+        improved = True
+        while improved:
+            improved = False
+            for i in range(1, end - 1):
+                for j in range(i + 1, end):
+                    candidate = order[:i] + order[i:j + 1][::-1] + order[j + 1:]
+                    value = cost(candidate)
+                    if value < best - 1e-9:
+                        order, best, improved = candidate, value, True
+        return order
+
+    def trip(self, coordinates, roundtrip=True, destination_last=False, steps=True):
+        ''' Маршрут через все точки с началом в первой точке (сервис trip)
+        '''
+        snapped = self._snap(coordinates)
+        if snapped is None:
+            return dict(code="NoSegment", message="Could not find a matching segment for coordinate")
+        nodes = [node for node, _ in snapped]
+        durations, _, paths = self._matrix(nodes, nodes, with_paths=True)
+        if any(value is None for row in durations for value in row):
+            return dict(code="NoTrips", message="No trip visiting all destinations possible.")
+
+        last = len(nodes) - 1 if destination_last and not roundtrip else None
+        order = self._tour(durations, roundtrip=roundtrip, last=last)
+        stops = order + [order[0]] if roundtrip else order
+        trip = self._route(
+            [nodes[n] for n in stops[:-1]],
+            [paths[a][b] for a, b in zip(stops[:-1], stops[1:])],
+            steps
+        )
+        waypoints = list()
+        for n, (node, distance) in enumerate(snapped):
+            waypoint = self._waypoint(node, distance)
+            waypoint.update(waypoint_index=order.index(n), trips_index=0)
+            waypoints.append(waypoint)
+        return dict(code="Ok", trips=[trip], waypoints=waypoints)
+
+    def nearest_waypoints(self, longitude, latitude, number=1):
+        ''' Ближайшие к точке вершины графа (сервис nearest)
+        '''
+        found = self.nearest(float(longitude), float(latitude), number=number)
+        if not found:
+            return dict(code="NoSegment", message="Could not find a matching segment for coordinate")
+        waypoints = list()
+        for node, distance in found:
+            waypoint = self._waypoint(node, distance)
+            waypoint.update(nodes=[int(self.graph.node_ids[node]), 0])
+            waypoints.append(waypoint)
+        return dict(code="Ok", waypoints=waypoints)
+
+    def query(self, service, coordinates, params=None):
+        ''' Выполняет запрос в формате OSRM HTTP API
+             - service: route, trip, table или nearest
+             - params: параметры запроса в виде строк, как в адресе запроса OSRM
+        '''
+        params = params or dict()
+
+        def indexes(value):
+            if value is None or value == "all":
+                return None
+            return [int(n) for n in str(value).split(";")]
+
+        steps = str(params.get("steps", "false")) == "true"
+        if service == "route":
+            return self.route(coordinates, steps=steps)
+        if service == "trip":
+            return self.trip(
+                coordinates,
+                roundtrip=str(params.get("roundtrip", "true")) == "true",
+                destination_last=params.get("destination") == "last",
+                steps=steps
+            )
+        if service == "table":
+            return self.table(
+                coordinates,
+                sources=indexes(params.get("sources")),
+                destinations=indexes(params.get("destinations")),
+                annotations=str(params.get("annotations", "duration")).split(",")
+            )
+        if service == "nearest":
+            longitude, latitude = coordinates[0]
+            return self.nearest_waypoints(longitude, latitude, number=int(params.get("number", 1)))
+        return dict(code="InvalidService", message=f"Service '{service}' not found")
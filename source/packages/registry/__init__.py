@@ -0,0 +1,6 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from .xlsx import read_rows, row_fingerprint  # noqa
+from .ingest import RegistryCache, Ingestion, ingest  # noqa
+from .dumpsters import district_sheets, dumpster_record, ingest_dumpsters  # noqa
@@ -0,0 +1,50 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import re
+
+from .ingest import ingest
+
+
+# Листы реестра контейнерных площадок по районам: "4.1.1.1 Автозаводский", ...
+DISTRICT_SHEET = re.compile(r"^4\.1\.1\.\d+\s+\S")
+
+# Первая строка данных и количество столбцов листа района
+FIRST_ROW = 8
+COLUMNS = 14
+
+
+def district_sheets(sheetnames):
+    ''' Листы районов в книге реестра
+    '''
+    return [name for name in sheetnames if DISTRICT_SHEET.match(name)]
+
+
+def dumpster_record(sheet_name, row):
+    ''' Идентификатор и запись контейнерной площадки по строке листа района
+    '''
+    area_name = sheet_name.split()[-1]
+    row = tuple(row) + (None,) * (COLUMNS - len(row))
+    dumpster_number = row[0]
+    dumpster = {
+        "Округ": area_name,
+        "Номер контейнерной площадки": row[1],
+        "Адрес": row[3],
+        "Наименование": row[4],
+        "Владелец": row[5],
+        "Транспортировщик": row[6],
+        "Материал": row[7],
+        "Количество": row[8],
+        "Вместимомть": row[9],
+        "Покрытие": row[10],
+        "Навес": row[11],
+        "Координаты дома": row[13]
+    }
+    return f"{area_name}_{dumpster_number}", dumpster
+
+
+def ingest_dumpsters(filename, cache_filename=None):
+    ''' Читает реестр контейнерных площадок (все листы районов)
+    '''
+    return ingest(filename, dumpster_record, sheets=district_sheets, min_row=FIRST_ROW, max_col=COLUMNS,
+                  cache_filename=cache_filename)
@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import json
+from pathlib import Path
+
+from .xlsx import read_rows, row_fingerprint
+
+
+class RegistryCache():
+    ''' Кеш разобранных строк реестра
+         - файл реестра: размер и время изменения
+         - листы: {отпечаток строки: [идентификатор записи, запись]}
+    '''
+
+    def __init__(self, filename=None):
+        self.filename = Path(filename) if filename else None
+        self.source = None
+        self.sheets = dict()
+        if self.filename is not None and self.filename.exists():
+            data = json.loads(self.filename.read_text(encoding="utf-8"))
+            self.source = data.get("source")
+            self.sheets = data.get("sheets", dict())
+
+    def save(self):
+        ''' Сохраняет кеш в файл
+        '''
+        if self.filename is None:
+            return
+        self.filename.parent.mkdir(parents=True, exist_ok=True)
+        data = json.dumps(dict(source=self.source, sheets=self.sheets), ensure_ascii=False, default=str)
+        tmp_filename = self.filename.with_suffix(".tmp")
+        tmp_filename.write_text(data, encoding="utf-8")
+        tmp_filename.replace(self.filename)
+
+
+class Ingestion():
+    ''' Результат чтения реестра
+         - новые отпечатки строк сохраняются в кеш только вызовом commit(), после того
+           как записи обработаны: при сбое обработки строки снова считаются изменёнными
+    '''
+
+    def __init__(self, records, changed, removed, cache=None):
+        # Записи реестра {идентификатор: запись} в порядке строк
+        self.records = records
+        # Идентификаторы добавленных и изменённых записей
+        self.changed = changed
+        # Идентификаторы записей, удалённых из реестра
+        self.removed = removed
+        # Новое состояние кеша разобранных строк (None - кеш не изменился)
+        self._cache = cache
+
+    def commit(self):
+        ''' Сохраняет новое состояние кеша разобранных строк
+        '''
+        if self._cache is not None:
+            self._cache.save()
+            self._cache = None
+
+    def __repr__(self):
+        return f"<Ingestion records={len(self.records)} changed={len(self.changed)} removed={len(self.removed)}>"
+
+
+def _stat(filename):
+    stat = Path(filename).stat()
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def ingest(filename, parse_row, sheets=None, min_row=1, max_col=None, cache_filename=None):
+    ''' Читает реестр Excel с повторным использованием разобранных строк
+         - parse_row(название листа, значения ячеек) возвращает (идентификатор, запись) или None
+         - разбираются только строки, отпечатков которых нет в кеше
+         - если размер и время изменения файла не изменились, файл не читается
+         - кеш не сохраняется: после обработки записей вызывается Ingestion.commit()
+    '''
+    cache = RegistryCache(cache_filename)
+    source = _stat(filename)
+    previous = {uid for rows in cache.sheets.values() for uid, _ in rows.values()}
+
+    if cache.source == source:
+        records = dict()
+        for rows in cache.sheets.values():
+            for uid, record in rows.values():
+                records[uid] = record
+        return Ingestion(records, set(), set())
+
+    records = dict()
+    changed = set()
+    sheet_rows = dict()
+    for sheet_name, _, values in read_rows(filename, sheets=sheets, min_row=min_row, max_col=max_col):
+        fingerprint = row_fingerprint(sheet_name, values)
+        rows = sheet_rows.setdefault(sheet_name, dict())
+        item = cache.sheets.get(sheet_name, dict()).get(fingerprint)
+        if item is None:
+            parsed = parse_row(sheet_name, values)
+            if parsed is None:
+                continue
+            item = list(parsed)
+            changed.add(item[0])
+        rows[fingerprint] = item
+        records[item[0]] = item[1]
+
+    cache.source = source
+    cache.sheets = sheet_rows
+    return Ingestion(records, changed, previous - set(records), cache=cache)
@@ -0,0 +1,36 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import json
+import hashlib
+from contextlib import closing
+
+
+def row_fingerprint(sheet_name, values):
+    ''' Отпечаток строки листа: хеш названия листа и значений ячеек
+    '''
+    data = json.dumps([sheet_name, list(values)], ensure_ascii=False, default=str)
+    return hashlib.sha1(data.encode("utf-8")).hexdigest()
+
+
+def read_rows(filename, sheets=None, min_row=1, max_col=None):
+    ''' Построчно читает значения ячеек книги Excel в режиме только для чтения (без загрузки книги целиком)
+         - sheets: названия листов или функция выбора листов по списку названий
+         - возвращает тройки (название листа, номер строки, значения ячеек); пустые строки пропускаются
+    '''
+    from openpyxl import load_workbook
+
+    with closing(load_workbook(filename=str(filename), read_only=True, data_only=True)) as wb:
+        if sheets is None:
+            names = wb.sheetnames
+        elif callable(sheets):
+            names = sheets(wb.sheetnames)
+        else:
+            names = list(sheets)
+        for sheet_name in names:
+            ws = wb[sheet_name]
+            rows = ws.iter_rows(min_row=min_row, max_col=max_col, values_only=True)
+            for row_number, values in enumerate(rows, min_row):
+                if all(value is None for value in values):
+                    continue
+                yield sheet_name, row_number, values
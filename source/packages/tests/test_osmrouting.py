@@ -0,0 +1,218 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import random
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import numpy as np  # noqa: E402
+
+import osmrouting.router  # noqa: E402
+from osmrouting import Graph, Router, CAR, dijkstra, read_osm  # noqa: E402
+
+
+# Размер сетки улиц и шаг между перекрёстками, градусов
+SIZE = 8
+STEP = 0.002
+
+
+def grid(size=SIZE, oneway=(), island=False):
+    ''' Сетка улиц size x size
+         - oneway: номера строк с односторонним движением на восток
+         - island: отдельная дорога, не связанная с сеткой
+    '''
+    generator = random.Random(1)
+    nodes = {
+        1 + i * size + j: (44.0 + j * STEP + generator.uniform(-0.0003, 0.0003),
+                           56.3 + i * STEP + generator.uniform(-0.0003, 0.0003))
+        for i in range(size) for j in range(size)
+    }
+    ways = list()
+    for i in range(size):
+        tags = dict(highway="residential", name=f"Улица {i}")
+        if i in oneway:
+            tags["oneway"] = "yes"
+        ways.append(([1 + i * size + j for j in range(size)], tags))
+    for j in range(size):
+        ways.append(([1 + i * size + j for i in range(size)], dict(highway="primary", name=f"Проспект {j}")))
+    if island:
+        nodes[1000], nodes[1001] = (44.1, 56.4), (44.101, 56.4)
+        ways.append(([1000, 1001], dict(highway="residential", name="Остров")))
+    return nodes, ways
+
+
+def osm_xml(nodes, ways):
+    ''' Выгрузка OSM XML по точкам и линиям
+    '''
+    lines = ['<?xml version="1.0" encoding="UTF-8"?>', '<osm version="0.6">']
+    for ref, (longitude, latitude) in nodes.items():
+        lines.append(f'<node id="{ref}" lat="{latitude:.7f}" lon="{longitude:.7f}"/>')
+    for n, (refs, tags) in enumerate(ways):
+        lines.append(f'<way id="{n + 1}">')
+        lines.extend(f'<nd ref="{ref}"/>' for ref in refs)
+        lines.extend(f'<tag k="{key}" v="{value}"/>' for key, value in tags.items())
+        lines.append('</way>')
+    lines.append('</osm>')
+    return "\n".join(lines)
+
+
+class ShortestPathTest(unittest.TestCase):
+    ''' Поиск кратчайшего пути A* с оценками по ориентирам
+    '''
+
+    @classmethod
+    def setUpClass(cls):
+        cls.graph = Graph.build(*grid(oneway=(2, 5)), CAR)
+        cls.router = Router(cls.graph)
+
+    def duration(self, edges):
+        return sum(self.router._durations[e] for e in edges)
+
+    def test_matches_dijkstra(self):
+        router = self.router
+        generator = random.Random(2)
+        vertices = np.flatnonzero(self.graph.component).tolist()
+        for _ in range(100):
+            source, target = generator.choice(vertices), generator.choice(vertices)
+            edges = router.shortest_path(source, target)
+            distances, _ = dijkstra(router._indptr, router._targets, router._durations, source, stop={target})
+            self.assertAlmostEqual(self.duration(edges), distances[target], places=6)
+            if edges:
+                self.assertEqual(router._sources[edges[0]], source)
+                self.assertEqual(router._targets[edges[-1]], target)
+
+    def test_heuristic_is_admissible(self):
+        # Время движения от всех вершин до target (Дейкстра по обратному графу)
+        target = len(self.graph) - 1
+        indptr, sources, order = self.graph.reversed()
+        weights = self.graph.durations[order].astype(float).tolist()
+        distances, _ = dijkstra(indptr.tolist(), sources.tolist(), weights, target)
+        bound = self.router._heuristic(0, target)
+        for v, distance in distances.items():
+            self.assertLessEqual(bound(v), distance + 1e-6)
+
+    def test_oneway(self):
+        graph, size = self.graph, SIZE
+        index = {int(ref): v for v, ref in enumerate(self.graph.node_ids)}
+
+        def edge(a, b):
+            v, u = index[a], index[b]
+            return u in graph.targets[graph.indptr[v]:graph.indptr[v + 1]]
+
+        # Строка 2 - одностороннее движение на восток, строка 3 - двустороннее
+        west, east = 1 + 2 * size, 2 + 2 * size
+        self.assertTrue(edge(west, east))
+        self.assertFalse(edge(east, west))
+        self.assertTrue(edge(west + size, east + size))
+        self.assertTrue(edge(east + size, west + size))
+
+        # Путь на запад вдоль односторонней улицы идёт в объезд
+        forward = self.router.shortest_path(index[west], index[east])
+        backward = self.router.shortest_path(index[east], index[west])
+        self.assertEqual(len(forward), 1)
+        self.assertGreater(len(backward), 1)
+
+
+class UnreachableTest(unittest.TestCase):
+    ''' Точки, между которыми нет пути
+    '''
+
+    @classmethod
+    def setUpClass(cls):
+        graph = Graph.build(*grid(size=4, island=True), CAR)
+        # Точки запросов привязываются и к вершинам, не связанным с основной сеткой
+        graph.component[:] = True
+        cls.router = Router(graph)
+        cls.city = (44.0, 56.3)
+        cls.island = (44.1, 56.4)
+
+    def test_shortest_path(self):
+        router = self.router
+        source = router.nearest(*self.city)[0][0]
+        target = router.nearest(*self.island)[0][0]
+        self.assertIsNone(router.shortest_path(source, target))
+
+    def test_route(self):
+        self.assertEqual(self.router.route([self.city, self.island])["code"], "NoRoute")
+
+    def test_trip(self):
+        self.assertEqual(self.router.trip([self.city, self.island])["code"], "NoTrips")
+
+    def test_table(self):
+        table = self.router.table([self.city, self.island])
+        self.assertEqual(table["code"], "Ok")
+        self.assertIsNone(table["durations"][0][1])
+        self.assertIsNone(table["durations"][1][0])
+
+
+class TripTest(unittest.TestCase):
+    ''' Порядок обхода точек в сервисе trip
+    '''
+
+    def test_waypoint_index(self):
+        router = Router(Graph.build(*grid(), CAR))
+        # Точки на одной улице в перемешанном порядке: 0, 2, 3, 1 с запада на восток
+        latitude = 56.3 + 3 * STEP
+        columns = (0, 6, 7, 3)
+        coordinates = [(44.0 + column * STEP, latitude) for column in columns]
+        result = router.trip(coordinates, roundtrip=False)
+        self.assertEqual(result["code"], "Ok")
+        self.assertEqual([waypoint["waypoint_index"] for waypoint in result["waypoints"]], [0, 2, 3, 1])
+        self.assertEqual(len(result["trips"][0]["legs"]), len(coordinates) - 1)
+
+
+class CacheTest(unittest.TestCase):
+    ''' Повторное использование графа и ориентиров, сохранённых на диске
+    '''
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.osm = Path(self.directory.name) / "city.osm"
+        self.osm.write_text(osm_xml(*grid()), encoding="utf-8")
+        self.cache = Path(self.directory.name) / "cache"
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def load(self, **kwargs):
+        ''' Создаёт маршрутизатор, подсчитывая чтения выгрузки OSM
+        '''
+        with mock.patch.object(osmrouting.router, "read_osm", wraps=read_osm) as reader:
+            router = Router.from_osm(self.osm, cache=self.cache, **kwargs)
+        return router, reader.call_count
+
+    def test_reload(self):
+        first, reads = self.load()
+        self.assertEqual(reads, 1)
+        second, reads = self.load()
+        self.assertEqual(reads, 0)
+        self.assertEqual(len(second.graph), len(first.graph))
+        np.testing.assert_array_equal(second.graph.targets, first.graph.targets)
+        np.testing.assert_array_equal(second.from_landmarks, first.from_landmarks)
+        self.assertEqual(second.shortest_path(0, len(first.graph) - 1),
+                         first.shortest_path(0, len(first.graph) - 1))
+
+    def test_invalidation(self):
+        self.load()
+        # Другое количество ориентиров
+        router, reads = self.load(landmark_count=4)
+        self.assertEqual(reads, 1)
+        self.assertEqual(len(router.from_landmarks), 4)
+        # Изменённая выгрузка
+        stat = self.osm.stat()
+        os.utime(self.osm, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+        _, reads = self.load()
+        self.assertEqual(reads, 1)
+        _, reads = self.load()
+        self.assertEqual(reads, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()